@@ -0,0 +1,62 @@
+"""translation text stored once per message and language in message_translations
+
+Revision ID: 3b7d1e9c4a26
+Revises: f2c624b0ff53
+Create Date: 2024-04-02 11:30:12.418702
+
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "3b7d1e9c4a26"
+down_revision: Union[str, None] = "f2c624b0ff53"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        "message_translations",
+        sa.Column("id", sa.Integer(), nullable=False),
+        sa.Column("message_id", sa.Integer(), nullable=False),
+        sa.Column("language", sa.String(length=100), nullable=False),
+        sa.Column("translation", sa.Text(), nullable=False),
+        sa.ForeignKeyConstraint(
+            ["message_id"],
+            ["messages.id"],
+        ),
+        sa.PrimaryKeyConstraint("id"),
+        sa.UniqueConstraint(
+            "message_id", "language", name="uq_message_translations_message_language"
+        ),
+    )
+    # every recipient of a language holds the same text, keep one copy of it
+    op.execute(
+        """
+        INSERT INTO message_translations (message_id, language, translation)
+        SELECT DISTINCT ON (message_id, language) message_id, language, translation
+        FROM translations
+        ORDER BY message_id, language, id
+        """
+    )
+    op.drop_column("translations", "translation")
+
+
+def downgrade() -> None:
+    op.add_column("translations", sa.Column("translation", sa.Text(), nullable=True))
+    op.execute(
+        """
+        UPDATE translations
+        SET translation = message_translations.translation
+        FROM message_translations
+        WHERE message_translations.message_id = translations.message_id
+            AND message_translations.language = translations.language
+        """
+    )
+    op.alter_column("translations", "translation", nullable=False)
+    op.drop_table("message_translations")
@@ -0,0 +1,55 @@
+"""composite indexes for keyset pagination of messages and conversations
+
+Revision ID: 9d2e6f1a8c53
+Revises: 3b7d1e9c4a26
+Create Date: 2024-04-04 17:10:41.902315
+
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "9d2e6f1a8c53"
+down_revision: Union[str, None] = "3b7d1e9c4a26"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_index(
+        "idx_conversation_id_sent_at_id",
+        "messages",
+        ["conversation_id", sa.text("sent_at DESC"), sa.text("id DESC")],
+        unique=False,
+    )
+    op.drop_index("idx_conversation_id_sent_at", table_name="messages")
+    op.create_index(
+        "idx_latest_message_id_id",
+        "conversations",
+        ["latest_message_id", "id"],
+        unique=False,
+    )
+    op.drop_index(
+        op.f("ix_conversations_latest_message_id"), table_name="conversations"
+    )
+
+
+def downgrade() -> None:
+    op.create_index(
+        op.f("ix_conversations_latest_message_id"),
+        "conversations",
+        ["latest_message_id"],
+        unique=False,
+    )
+    op.drop_index("idx_latest_message_id_id", table_name="conversations")
+    op.create_index(
+        "idx_conversation_id_sent_at",
+        "messages",
+        ["conversation_id", sa.text("sent_at DESC")],
+        unique=False,
+    )
+    op.drop_index("idx_conversation_id_sent_at_id", table_name="messages")
@@ -0,0 +1,99 @@
+"""user_inbox table, one row per conversation member for loading inboxes
+
+Revision ID: c4f81a7e2b90
+Revises: 9d2e6f1a8c53
+Create Date: 2024-04-09 10:45:03.517268
+
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "c4f81a7e2b90"
+down_revision: Union[str, None] = "9d2e6f1a8c53"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        "user_inbox",
+        sa.Column("user_id", sa.Integer(), nullable=False),
+        sa.Column("conversation_id", sa.Integer(), nullable=False),
+        sa.Column("last_message_id", sa.Integer(), nullable=True),
+        sa.Column("last_message_snippet", sa.String(length=255), nullable=True),
+        sa.Column("unread_count", sa.Integer(), nullable=False),
+        sa.Column("last_activity_at", sa.DateTime(), nullable=False),
+        sa.ForeignKeyConstraint(
+            ["conversation_id"], ["conversations.id"], ondelete="CASCADE"
+        ),
+        sa.ForeignKeyConstraint(["user_id"], ["users.id"], ondelete="CASCADE"),
+        sa.PrimaryKeyConstraint("user_id", "conversation_id"),
+    )
+    op.create_index(
+        "idx_user_id_last_activity_at_conversation_id",
+        "user_inbox",
+        ["user_id", sa.text("last_activity_at DESC"), sa.text("conversation_id DESC")],
+        unique=False,
+    )
+    # conversations without messages yet are as recent as the member joined
+    op.execute(
+        """
+        INSERT INTO user_inbox (
+            user_id, conversation_id, last_message_id, last_message_snippet,
+            unread_count, last_activity_at
+        )
+        SELECT
+            group_member.user_id,
+            group_member.conversation_id,
+            conversations.latest_message_id,
+            (
+                SELECT left(message_translations.translation, 255)
+                FROM translations
+                JOIN message_translations
+                    ON message_translations.message_id = translations.message_id
+                    AND message_translations.language = translations.language
+                WHERE translations.message_id = conversations.latest_message_id
+                    AND translations.target_user_id = group_member.user_id
+            ),
+            (
+                SELECT count(*)
+                FROM translations
+                JOIN messages ON messages.id = translations.message_id
+                WHERE messages.conversation_id = group_member.conversation_id
+                    AND translations.target_user_id = group_member.user_id
+                    AND translations.is_read = 0
+            ),
+            coalesce(
+                (
+                    SELECT messages.sent_at
+                    FROM messages
+                    WHERE messages.id = conversations.latest_message_id
+                ),
+                group_member.joined_datetime,
+                now() at time zone 'utc'
+            )
+        FROM group_member
+        JOIN conversations ON conversations.id = group_member.conversation_id
+        """
+    )
+    # conversation lists are paged from user_inbox now, nothing orders
+    # conversations by their latest message any more
+    op.drop_index("idx_latest_message_id_id", table_name="conversations")
+
+
+def downgrade() -> None:
+    op.create_index(
+        "idx_latest_message_id_id",
+        "conversations",
+        ["latest_message_id", "id"],
+        unique=False,
+    )
+    op.drop_index(
+        "idx_user_id_last_activity_at_conversation_id", table_name="user_inbox"
+    )
+    op.drop_table("user_inbox")
@@ -0,0 +1,46 @@
+"""photo thumbnail flags on users and conversations
+
+Revision ID: e83b5d0c17f4
+Revises: c4f81a7e2b90
+Create Date: 2024-04-12 09:30:41.208113
+
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "e83b5d0c17f4"
+down_revision: Union[str, None] = "c4f81a7e2b90"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # existing photos have no thumbnails, lists keep showing them full size
+    op.add_column(
+        "users",
+        sa.Column(
+            "profile_photo_thumbnails",
+            sa.Boolean(),
+            server_default=sa.false(),
+            nullable=False,
+        ),
+    )
+    op.add_column(
+        "conversations",
+        sa.Column(
+            "conversation_photo_thumbnails",
+            sa.Boolean(),
+            server_default=sa.false(),
+            nullable=False,
+        ),
+    )
+
+
+def downgrade() -> None:
+    op.drop_column("conversations", "conversation_photo_thumbnails")
+    op.drop_column("users", "profile_photo_thumbnails")
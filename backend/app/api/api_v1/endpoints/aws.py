@@ -1,5 +1,6 @@
-import boto3
+import base64
 import json
+import uuid
 
 from fastapi import APIRouter, Depends, HTTPException, Request, status
 from typing import Annotated
@@ -8,15 +9,19 @@ from redis.asyncio import Redis
 
 from app import models, schemas, crud
 from app.api.dependencies import verify_current_user_w_cookie, DatabaseDep
+from app.storage import IMMUTABLE_CACHE_CONTROL, get_storage
 from app.utils.aws import (
-    generate_presigned_get_url,
     get_cached_presigned_obj,
+    resolve_presigned_get_urls,
     CacheMethod,
 )
 from app.core.config import settings
 
 router = APIRouter()
 
+# conversation_photo is a String(255), the prefix and hash take up to ~90
+MAX_KEY_FILENAME_CHARS = 128
+
 
 @router.post(
     "/s3/generate-presigned-post/{group}",
@@ -46,9 +51,27 @@ async def generate_presigned_post(
                 status_code=status.HTTP_401_UNAUTHORIZED,
                 detail="User is not authorized to this chat",
             )
-        pic_key = f"chat/{request.convo_id}/{request.filename}"
+        prefix = f"chat/{request.convo_id}"
     else:
-        pic_key = f"user/{current_user.id}/{request.filename}"
+        prefix = f"user/{current_user.id}"
+    # Keys only ever hold one photo, its urls can be cached for as long as they
+    # are valid. S3 rejects uploads that don't match the hash, clients that
+    # don't send it get a fresh key. The end of the filename keeps the extension
+    pic_key = (
+        f"{prefix}/{request.content_sha256 or uuid.uuid4().hex}/"
+        f"{request.filename[-MAX_KEY_FILENAME_CHARS:]}"
+    )
+    checksum_fields = (
+        {
+            "x-amz-checksum-algorithm": "SHA256",
+            "x-amz-checksum-sha256": base64.b64encode(
+                bytes.fromhex(request.content_sha256)
+            ).decode(),
+        }
+        if request.content_sha256
+        else {}
+    )
+    checksum_conditions = [{name: value} for name, value in checksum_fields.items()]
 
     cache_key, cached_post_response = await get_cached_presigned_obj(
         object_key=pic_key, redis_client=redis_client, method=CacheMethod.POST
@@ -60,51 +83,58 @@ async def generate_presigned_post(
         # serialization issues
         return json.loads(cached_post_response)  # type: ignore
 
-    session = boto3.Session()
-    s3_client = session.client("s3")
+    storage = get_storage()
 
     try:
         if group:
             # group chats
-            response = s3_client.generate_presigned_post(
-                Bucket=settings.S3_BUCKET_NAME,
-                Key=pic_key,
-                Fields={
+            response = await storage.presign_post(
+                bucket_name=settings.S3_BUCKET_NAME,
+                object_key=pic_key,
+                fields={
                     "Content-Type": "image/jpeg",
+                    "Cache-Control": IMMUTABLE_CACHE_CONTROL,
                     "x-amz-meta-about": f"{request.about}",
+                    **checksum_fields,
                 },
-                Conditions=[
+                conditions=[
                     [
                         "content-length-range",
                         1000,
                         5242880,
                     ],  # Optional: File size between 1000 Bytes - 5 MB
                     {"Content-Type": "image/jpeg"},
+                    {"Cache-Control": IMMUTABLE_CACHE_CONTROL},
                     ["starts-with", "$x-amz-meta-about", ""],
+                    *checksum_conditions,
                 ],
-                ExpiresIn=settings.S3_PRESIGNED_URL_POST_EXPIRE_SECS,  # URL expires in 1 hour
+                expire_in_secs=settings.S3_PRESIGNED_URL_POST_EXPIRE_SECS,  # URL expires in 1 hour
             )
         else:
             # users
-            response = s3_client.generate_presigned_post(
-                Bucket=settings.S3_BUCKET_NAME,
-                Key=pic_key,
-                Fields={
+            response = await storage.presign_post(
+                bucket_name=settings.S3_BUCKET_NAME,
+                object_key=pic_key,
+                fields={
                     "Content-Type": "image/jpeg",
+                    "Cache-Control": IMMUTABLE_CACHE_CONTROL,
                     "x-amz-meta-user": f"{current_user.first_name} {current_user.last_name}",
                     "x-amz-meta-about": f"{request.about}",
+                    **checksum_fields,
                 },
-                Conditions=[
+                conditions=[
                     [
                         "content-length-range",
                         1000,
                         5242880,
                     ],  # Optional: File size between 1000 Bytes - 5 MB
                     {"Content-Type": "image/jpeg"},
+                    {"Cache-Control": IMMUTABLE_CACHE_CONTROL},
                     ["starts-with", "$x-amz-meta-user", ""],
                     ["starts-with", "$x-amz-meta-about", ""],
+                    *checksum_conditions,
                 ],
-                ExpiresIn=settings.S3_PRESIGNED_URL_POST_EXPIRE_SECS,  # URL expires in 1 hour
+                expire_in_secs=settings.S3_PRESIGNED_URL_POST_EXPIRE_SECS,  # URL expires in 1 hour
             )
 
         # must serialize dictionary to JSON string bc dict can't be value in redis cache
@@ -115,7 +145,7 @@ async def generate_presigned_post(
             ex=(settings.S3_PRESIGNED_URL_POST_EXPIRE_SECS - 2),
         )
 
-        return response  # type: ignore
+        return response
     except TokenRetrievalError as e:
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail=str(e))
     except NoCredentialsError as e:
@@ -160,24 +190,14 @@ async def generate_presigned_get(
                 detail=f"Invalid request",
             )
 
+        presigned_urls = await resolve_presigned_get_urls(
+            bucket_name=settings.S3_BUCKET_NAME,
+            object_keys=result.values(),
+            expire_in_secs=settings.S3_PRESIGNED_URL_GET_EXPIRE_SECS,
+            redis_client=redis_client,
+        )
         for id in result:
-            _, cached_url = await get_cached_presigned_obj(
-                object_key=result[id],
-                redis_client=redis_client,
-                method=CacheMethod.GET,
-            )
-
-            if cached_url:
-                url = cached_url
-            else:
-                url = await generate_presigned_get_url(
-                    bucket_name=settings.S3_BUCKET_NAME,
-                    object_key=result[id],
-                    expire_in_secs=settings.S3_PRESIGNED_URL_GET_EXPIRE_SECS,
-                    redis_client=redis_client,
-                )
-
-            result[id] = url
+            result[id] = presigned_urls[result[id]]
 
         # {"user_id": "presigned_URL"} or {"convo_id": "presigned_URL"}
         return result
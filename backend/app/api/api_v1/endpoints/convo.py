@@ -1,26 +1,34 @@
 import asyncio
-import json
 
-from typing import Annotated, Sequence
-from app.crud import crud_association
+from typing import Annotated, Any, Sequence
+from app.crud import crud_association, crud_inbox
+from app.utils import envelope
 from app.utils.convo import (
     convo_latest_msg_processing,
     convo_name_url_processing,
     generate_convo_identifier,
+    hydrate_inbox,
+)
+from fastapi import (
+    APIRouter,
+    HTTPException,
+    Query,
+    Request,
+    status,
+    Response,
+    Depends,
 )
-from fastapi import APIRouter, HTTPException, Request, status, Response, Depends
 from sqlalchemy.exc import IntegrityError
 from redis.asyncio import Redis
 from botocore.exceptions import ClientError, TokenRetrievalError, NoCredentialsError
 
 from app import crud, models, schemas
 from app.api.dependencies import DatabaseDep, verify_current_user_w_cookie
-from app.utils.aws import (
-    generate_presigned_get_url,
-    get_cached_presigned_obj,
-    CacheMethod,
-)
+from app.storage.thumbnails import display_photo_key
+from app.utils.aws import delete_photo, resolve_presigned_get_urls
 from app.core.config import settings
+from app.utils.cursor import convo_cursor_key, encode_cursor
+from app.worker.storage_worker import enqueue_thumbnails
 
 router = APIRouter()
 
@@ -70,30 +78,32 @@ async def get_convo(
 async def get_convos(
     db: DatabaseDep,
     current_user: Annotated[models.User, Depends(verify_current_user_w_cookie)],
-    offset: int,
     limit: int,
     request: Request,
+    response: Response,
+    cursor: str | None = None,
+    offset: Annotated[int, Query(deprecated=True)] = 0,
 ) -> Sequence[models.Conversation]:
+    # the next page is requested with the X-Next-Cursor of this one
+    try:
+        after = convo_cursor_key(cursor) if cursor else None
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+
     convos = await crud.conversation.get_user_convos(
-        db=db, user_id=current_user.id, offset=offset, limit=limit
+        db=db, user_id=current_user.id, limit=limit, after=after, offset=offset
     )
+    if len(convos) == limit and convos:
+        # least recent first, so the page ends at the first one
+        response.headers["X-Next-Cursor"] = encode_cursor(
+            convos[0].last_activity_at, convos[0].id  # type: ignore
+        )
 
     redis_client: Redis = request.app.state.redis_client
 
-    for convo in convos:
-        if convo.latest_message_id:
-            convo_latest_msg = await crud.message.get(db=db, id=convo.latest_message_id)
-
-            await convo_latest_msg_processing(
-                db=db,
-                convo=convo,
-                curr_user_id=current_user.id,
-                convo_latest_msg=convo_latest_msg,  # type: ignore
-            )
-
-        await convo_name_url_processing(
-            convo=convo, curr_user_id=current_user.id, redis_client=redis_client
-        )
+    await hydrate_inbox(
+        db=db, convos=convos, curr_user_id=current_user.id, redis_client=redis_client
+    )
 
     return convos
 
@@ -121,67 +131,39 @@ async def get_members(
     members_dict = {}
 
     try:
-        gc_url = None
-
-        # GC with Conversation Photo
-        if convo.conversation_photo:
-            _, gc_url = await get_cached_presigned_obj(
-                object_key=convo.conversation_photo,
-                redis_client=redis_client,
-                method=CacheMethod.GET,
+        # thumbnails where they're made
+        photo_keys = {
+            member.id: display_photo_key(
+                member.profile_photo, member.profile_photo_thumbnails
             )
-
-            if not gc_url:
-                gc_url = await generate_presigned_get_url(
-                    bucket_name=settings.S3_BUCKET_NAME,
-                    object_key=convo.conversation_photo,
-                    expire_in_secs=settings.S3_PRESIGNED_URL_GET_EXPIRE_SECS,
-                    redis_client=redis_client,
-                )
-        elif not convo.is_group_chat:  # Not a GC
-            for member in await convo.awaitable_attrs.members:
+            for member in members
+        }
+        gc_photo = display_photo_key(
+            convo.conversation_photo, convo.conversation_photo_thumbnails
+        )
+        if not gc_photo and not convo.is_group_chat:  # Not a GC
+            for member in members:
                 if member.id != curr_user.id:
-                    obj_key = member.profile_photo  # type: ignore
-                    if obj_key:  # Other user has a profile photo. Use it as GC photo
-                        _, gc_url = await get_cached_presigned_obj(
-                            object_key=obj_key,
-                            redis_client=redis_client,
-                            method=CacheMethod.GET,
-                        )
-
-                        if not gc_url:
-                            gc_url = await generate_presigned_get_url(
-                                bucket_name=settings.S3_BUCKET_NAME,
-                                object_key=obj_key,
-                                expire_in_secs=settings.S3_PRESIGNED_URL_GET_EXPIRE_SECS,
-                                redis_client=redis_client,
-                            )
+                    # Other user's profile photo, if any, is the GC photo
+                    gc_photo = photo_keys[member.id]
                     break
 
+        presigned_urls = await resolve_presigned_get_urls(
+            bucket_name=settings.S3_BUCKET_NAME,
+            object_keys=[gc_photo, *photo_keys.values()],
+            expire_in_secs=settings.S3_PRESIGNED_URL_GET_EXPIRE_SECS,
+            redis_client=redis_client,
+        )
+        gc_url = presigned_urls.get(gc_photo) if gc_photo else None
+
         for member in sorted(
             members, key=lambda user: (user.first_name, user.last_name)
         ):
-            url = None
-
-            if member.profile_photo:
-                _, url = await get_cached_presigned_obj(
-                    object_key=member.profile_photo,
-                    redis_client=redis_client,
-                    method=CacheMethod.GET,
-                )
-
-                if not url:
-                    url = await generate_presigned_get_url(
-                        bucket_name=settings.S3_BUCKET_NAME,
-                        object_key=member.profile_photo,
-                        expire_in_secs=settings.S3_PRESIGNED_URL_GET_EXPIRE_SECS,
-                        redis_client=redis_client,
-                    )
-
+            photo_key = photo_keys[member.id]
             setattr(
                 member,
                 "presigned_url",
-                url,
+                presigned_urls.get(photo_key) if photo_key else None,
             )
 
             sorted_member_ids.append(member.id)
@@ -265,7 +247,12 @@ async def create_convo(
             pub_messages.append(
                 (
                     f"{user_id}",
-                    json.dumps({"type": "create_convo", "convo_id": new_convo.id}),
+                    envelope.pack(
+                        "create_convo",
+                        envelope.dumps(
+                            {"type": "create_convo", "convo_id": new_convo.id}
+                        ),
+                    ),
                 )
             )
 
@@ -321,12 +308,15 @@ async def update_convo(
         )
 
     try:
+        old_photo = convo.conversation_photo
         res = await crud.conversation.update(db=db, db_obj=convo, obj_in=request)
+        if request.conversation_photo:
+            res.conversation_photo_thumbnails = False
 
         redis_client: Redis = req.app.state.redis_client
         # signal to all users in convo that the convo name or photo is updated
         if request.conversation_name:
-            json_data = {
+            json_data: dict[str, Any] = {
                 "type": "update_convo_name",
                 "data": {
                     "convo_id": convo_id,
@@ -334,12 +324,14 @@ async def update_convo(
                 },
             }
         elif request.conversation_photo:
-            presigned_url = await generate_presigned_get_url(
-                bucket_name=settings.S3_BUCKET_NAME,
-                object_key=request.conversation_photo,
-                expire_in_secs=settings.S3_PRESIGNED_URL_GET_EXPIRE_SECS,
-                redis_client=redis_client,
-            )
+            presigned_url = (
+                await resolve_presigned_get_urls(
+                    bucket_name=settings.S3_BUCKET_NAME,
+                    object_keys=[request.conversation_photo],
+                    expire_in_secs=settings.S3_PRESIGNED_URL_GET_EXPIRE_SECS,
+                    redis_client=redis_client,
+                )
+            )[request.conversation_photo]
             json_data = {
                 "type": "update_convo_photo",
                 "data": {
@@ -360,14 +352,67 @@ async def update_convo(
         #             json.dumps(json_data),
         #         )
 
-        await redis_client.publish(f"chat_{convo_id}", json.dumps(json_data))
+        await redis_client.publish(
+            f"chat_{convo_id}", envelope.envelope(json_data["type"], json_data["data"])
+        )
 
         await db.commit()
+
+        if request.conversation_photo:
+            await enqueue_thumbnails(
+                redis_client,
+                bucket_name=settings.S3_BUCKET_NAME,
+                object_key=request.conversation_photo,
+            )
+            # photo keys are content addressed, a new photo is a new object
+            if old_photo and old_photo != request.conversation_photo:
+                await delete_photo(
+                    bucket_name=settings.S3_BUCKET_NAME,
+                    object_key=old_photo,
+                    redis_client=redis_client,
+                )
     except IntegrityError as e:
         await db.rollback()
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
 
 
+@router.patch("/{convo_id}/read")
+async def mark_convo_read(
+    db: DatabaseDep,
+    convo_id: int,
+    request: schemas.ConversationReadUpdate,
+    req: Request,
+    current_user: Annotated[models.User, Depends(verify_current_user_w_cookie)],
+) -> dict[str, int]:
+    unread_count = await crud_inbox.mark_read(
+        db=db,
+        user_id=current_user.id,
+        convo_id=convo_id,
+        up_to_message_id=request.up_to_message_id,
+    )
+    if unread_count is None:
+        await db.rollback()
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=f"Conversation w/ id {convo_id} doesn't exist",
+        )
+    await db.commit()
+
+    read_data = {
+        "convo_id": convo_id,
+        "up_to_message_id": request.up_to_message_id,
+        "unread_count": unread_count,
+    }
+
+    # the user's other open clients update their badges
+    redis_client: Redis = req.app.state.redis_client
+    await redis_client.publish(
+        f"{current_user.id}", envelope.envelope("convo_read", read_data)
+    )
+
+    return read_data
+
+
 @router.patch(
     "/{convo_id}/update-members",
 )
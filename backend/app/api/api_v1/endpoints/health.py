@@ -1,9 +1,17 @@
 from fastapi import APIRouter
 from fastapi.responses import JSONResponse
 
+from app.translation.cache import translation_cache
+
 router = APIRouter()
 
 
 @router.get("")
 async def health() -> JSONResponse:
     return JSONResponse({"message": "health check success"})
+
+
+@router.get("/translation-cache")
+async def translation_cache_stats() -> JSONResponse:
+    # per worker process
+    return JSONResponse(translation_cache.stats())
@@ -1,12 +1,12 @@
 from typing import Annotated
 from datetime import timedelta
 
-from fastapi import APIRouter, HTTPException, status, Depends
-from sqlalchemy import select
+from fastapi import APIRouter, HTTPException, Query, Response, status, Depends
 from sqlalchemy.exc import IntegrityError
 
 from app import crud, models, schemas
 from app.api.dependencies import DatabaseDep, verify_current_user_w_cookie
+from app.utils.cursor import encode_cursor, message_cursor_key
 
 router = APIRouter()
 
@@ -19,117 +19,62 @@ async def get_chat_messages(
     db: DatabaseDep,
     current_user: Annotated[models.User, Depends(verify_current_user_w_cookie)],
     conversation_id: int,
-    offset: int,
     limit: int,
+    response: Response,
+    cursor: str | None = None,
+    offset: Annotated[int, Query(deprecated=True)] = 0,
 ) -> list[models.Message]:
+    # the latest `limit` messages, oldest first. The page of older messages is
+    # requested with the X-Next-Cursor of this one
+    try:
+        before = message_cursor_key(cursor) if cursor else None
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+
     try:
         chat_history = []
-        # convo = await crud.conversation.get(db=db, id=conversation_id)
-        # if convo is None:
-        #     raise HTTPException(
-        #         status_code=status.HTTP_404_NOT_FOUND,
-        #         detail=f"Convo w/ id {conversation_id} doesn't exist",
-        #     )
-
-        latest_n_messages = await crud.message.get_most_recent_messages(
-            db=db, convo_id=conversation_id, offset=offset, limit=limit
+
+        # messages with the current user's translation and the sender's name
+        page = await crud.message.get_chat_page(
+            db=db,
+            convo_id=conversation_id,
+            user_id=current_user.id,
+            limit=limit,
+            before=before,
+            offset=offset,
         )
+        if len(page) == limit and page:
+            oldest = page[-1][0]
+            response.headers["X-Next-Cursor"] = encode_cursor(oldest.sent_at, oldest.id)
 
         # Chat History: Grabbing the previous history as it was translated (if there is any history) irrespective of user's current language
+        # NOTE: a translation in the user's previous languages isn't looked for. If implementing need to also change how the LATEST MESSAGE TRANSLATION is gotten in convo.py and crud_user.py
         prev_msg = None
-        for message in reversed(latest_n_messages):
-            # GETTING CHAT HISTORY IN USER'S LANGUAGE
-            # In the current conversation, for each previous message:
-
-            # 1: Is there a translation of it in the user's selected language
-            # YES: Modify Message. Append to chat_history. Proceed to #4
-            # NO: Proceed to #4
-
-            # 2: Did the user send this message?
-            # YES: Append to chat_history. Proceed to #4
-            # NO: Proceed to #4
-
-            # 3: Is there a translation of it in the user's previous languages? (use target_user_id=current_user.id to grab)
-            # YES: Modify Message. Append to chat_history. Proceed to #4
-            # NO: Proceed to #4
-
-            # 4: Inspect next Message in Conversation
-            # NOTE: Has not been implemented yet. If implementing need to also change how the LATEST MESSAGE TRANSLATION is gotten in convo.py and crud_user.py
-
-            if message.sender_id == current_user.id:
-                setattr(message, "display_photo", False)
-                if (
-                    prev_msg
-                    and prev_msg.sender_id == message.sender_id
-                    and (message.sent_at - prev_msg.sent_at) < timedelta(hours=2)
-                ):
-                    setattr(
-                        message,
-                        "sender_name",
-                        None,
-                    )
-                else:
-                    setattr(
-                        message,
-                        "sender_name",
-                        f"{current_user.first_name} {current_user.last_name}",
-                    )
-
-                    # prev msg display photo
-                    if prev_msg:
-                        setattr(chat_history[-1], "display_photo", True)
-
-                chat_history.append(message)
+        for message, translation, first_name, last_name in reversed(page):
+            setattr(message, "display_photo", False)
+            if (
+                prev_msg
+                and prev_msg.sender_id == message.sender_id
+                and (message.sent_at - prev_msg.sent_at) < timedelta(hours=2)
+            ):
+                setattr(message, "sender_name", None)
             else:
-                translation = (
-                    (
-                        await db.execute(
-                            select(models.Translation.translation).filter_by(
-                                message_id=message.id, target_user_id=current_user.id
-                            )
-                        )
-                    )
-                    .scalars()
-                    .first()
-                )
-
-                # Case: there are messages sent before a user was added. Don't add anything but not an error
-                if translation is None:
-                    continue
-
-                setattr(message, "display_photo", False)
-                if (
-                    prev_msg
-                    and prev_msg.sender_id == message.sender_id
-                    and (message.sent_at - prev_msg.sent_at) < timedelta(hours=2)
-                ):
-                    setattr(
-                        message,
-                        "sender_name",
-                        None,
-                    )
+                if message.sender_id == current_user.id:
+                    sender_name = f"{current_user.first_name} {current_user.last_name}"
+                elif first_name is None:
+                    sender_name = "Deleted User"
                 else:
-                    # grab sender's name
-                    sender_user = await crud.user.get(db=db, id=message.sender_id)
-                    set_val = "Deleted User"
-                    if sender_user is not None:
-                        set_val = f"{sender_user.first_name} {sender_user.last_name}"
-                    setattr(
-                        message,
-                        "sender_name",
-                        set_val,
-                    )
-
-                    if prev_msg:
-                        setattr(chat_history[-1], "display_photo", True)
-
-                # temp = jsonable_encoder(message)
-                # msg_modified = {**temp, "original_text": translation}
+                    sender_name = f"{first_name} {last_name}"
+                setattr(message, "sender_name", sender_name)
 
-                setattr(message, "original_text", translation)
+                # prev msg display photo
+                if prev_msg:
+                    setattr(chat_history[-1], "display_photo", True)
 
-                chat_history.append(message)
+            if message.sender_id != current_user.id:
+                setattr(message, "original_text", translation)
 
+            chat_history.append(message)
             prev_msg = message
 
         if prev_msg:
@@ -3,6 +3,7 @@ from fastapi import APIRouter, Depends, HTTPException, status
 from sqlalchemy.exc import IntegrityError
 
 from app import crud, schemas, models
+from app.crud import crud_inbox
 from app.api.dependencies import DatabaseDep, verify_current_user_w_cookie
 
 router = APIRouter()
@@ -23,7 +24,15 @@ async def update_read_status(
                 detail=f"Translation w/ id {translation_id} does not exist",
             )
 
+        delta = translation.is_read - request.is_read
         await crud.translation.update(db=db, db_obj=translation, obj_in=request)
+        if delta:
+            await crud_inbox.add_unread(
+                db=db,
+                user_id=translation.target_user_id,
+                message_id=translation.message_id,
+                delta=delta,
+            )
         await db.commit()
     except IntegrityError as e:
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
@@ -3,7 +3,6 @@ from datetime import datetime
 import secrets
 
 from app.schemas.email_type import CustomEmailStr
-from app.utils.aws import generate_presigned_get_url
 from redis.asyncio import Redis
 from fastapi import (
     APIRouter,
@@ -33,6 +32,9 @@ from app.utils.email import (
 from app.core.security import VerifyType
 from app.exceptions import UserAlreadyExistsException
 from app.core.config import settings
+from app.utils import envelope
+from app.utils.aws import delete_photo
+from app.worker.storage_worker import enqueue_thumbnails
 
 
 router = APIRouter()
@@ -202,18 +204,36 @@ async def update_user(
         if user_update.last_name:
             user_update.last_name = user_update.last_name.title()
 
+        old_photo = user.profile_photo
         await crud.user.update(db=db, db_obj=user, obj_in=user_update)
+        if user_update.profile_photo:
+            user.profile_photo_thumbnails = False
 
         await db.commit()
 
-        # generate new presigned GET and replace it in cache. Necessary so frontend
-        # fetches the new photo instead of using cached one
-        if user.profile_photo:
-            _ = await generate_presigned_get_url(
+        if user_update.profile_photo:
+            await enqueue_thumbnails(
+                request.app.state.redis_client,
                 bucket_name=settings.S3_BUCKET_NAME,
-                object_key=user.profile_photo,
-                expire_in_secs=settings.S3_PRESIGNED_URL_GET_EXPIRE_SECS,
-                redis_client=request.app.state.redis_client,
+                object_key=user_update.profile_photo,
+            )
+            # photo keys are content addressed, a new photo is a new object
+            if old_photo and old_photo != user_update.profile_photo:
+                await delete_photo(
+                    bucket_name=settings.S3_BUCKET_NAME,
+                    object_key=old_photo,
+                    redis_client=request.app.state.redis_client,
+                )
+
+        if user_update.pwd_changed:
+            # closes the user's websockets authenticated with the old password
+            redis_client: Redis = request.app.state.redis_client
+            await redis_client.publish(
+                f"{user.id}",
+                envelope.envelope(
+                    "password_changed",
+                    {"pwd_changed": user_update.pwd_changed.isoformat()},
+                ),
             )
 
         return form_data
@@ -227,11 +247,19 @@ async def update_user(
     status_code=status.HTTP_204_NO_CONTENT,
 )
 async def delete_user(
-    db: DatabaseDep, user: Annotated[models.User, Depends(verify_current_user_w_cookie)]
+    db: DatabaseDep,
+    request: Request,
+    user: Annotated[models.User, Depends(verify_current_user_w_cookie)],
 ) -> None:
     try:
-        await crud.user.delete(db=db, id=user.id)
+        user_id = user.id
+        await crud.user.delete(db=db, id=user_id)
         await db.commit()
+
+        # closes the user's open websockets
+        await request.app.state.redis_client.publish(
+            f"{user_id}", envelope.envelope("user_deleted", {})
+        )
     except IntegrityError as e:
         await db.rollback()
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
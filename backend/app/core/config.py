@@ -1,4 +1,4 @@
-from typing import Any, Annotated
+from typing import Any, Annotated, Literal
 from pydantic import (
     model_validator,
     AnyUrl,
@@ -33,10 +33,135 @@ class Settings(BaseSettings):
     S3_BUCKET_NAME: str
     S3_PRESIGNED_URL_GET_EXPIRE_SECS: int = 18000  # seconds = 5 hrs
     S3_PRESIGNED_URL_POST_EXPIRE_SECS: int = 1800  # seconds = 30 minutes
+    # GET urls are signed as of the start of the current time bucket, so every
+    # request in a bucket gets the same url and browsers/CDNs can cache the
+    # photo. Must be shorter than S3_PRESIGNED_URL_GET_EXPIRE_SECS, a url lives
+    # at least the difference
+    S3_PRESIGNED_URL_TIME_BUCKET_SECS: int = 60 * 60  # 1 hr
+    # hot GET urls are also kept in process, until this long before they
+    # expire from Redis or are regenerated in any process
+    PRESIGNED_URL_LOCAL_MAX_ENTRIES: int = 10000
+    PRESIGNED_URL_LOCAL_MARGIN_SECS: int = 60
+    # "s3", or "memory" for tests and offline development. boto3 blocks, its
+    # calls run on a pool of STORAGE_MAX_THREADS threads
+    STORAGE_BACKEND: Literal["s3", "memory"] = "s3"
+    STORAGE_MAX_THREADS: int = 16
+    # Deletes are queued (Redis stream) and retried by the storage worker. Set
+    # STORAGE_WORKER_IN_PROCESS to False when running it separately
+    # (python -m app.worker.storage_worker)
+    STORAGE_QUEUE_STREAM: str = "storage_jobs"
+    STORAGE_QUEUE_GROUP: str = "storage_workers"
+    STORAGE_QUEUE_DEAD_LETTER_STREAM: str = "storage_jobs:dead"
+    STORAGE_QUEUE_MAXLEN: int = 100000
+    STORAGE_JOB_MAX_ATTEMPTS: int = 5
+    STORAGE_JOB_RETRY_DELAY_SECS: float = 1.0
+    STORAGE_JOB_VISIBILITY_TIMEOUT_SECS: int = 60
+    STORAGE_WORKER_CONCURRENCY: int = 8
+    STORAGE_WORKER_IN_PROCESS: bool = True
+    # Uploaded photos also get square WebP thumbnails of these sizes (px), made
+    # by the storage worker once the photo is saved. Lists show the
+    # PHOTO_THUMBNAIL_LIST_SIZE one
+    PHOTO_THUMBNAIL_SIZES: list[int] = [64, 128, 256]
+    PHOTO_THUMBNAIL_LIST_SIZE: int = 128
 
     # DB Items Fetching Limits
     INITIAL_CONVERSATION_LOAD_LIMIT: int
     CHAT_HISTORY_NUM_PREV_MSGS: int
+    # translation prompt context: rolling window per conversation and language,
+    # at most CHAT_HISTORY_NUM_PREV_MSGS turns and trimmed to this many tokens
+    CHAT_HISTORY_TOKEN_BUDGET: int = 1000
+    CHAT_HISTORY_WINDOW_TTL_SECS: int = 60 * 60 * 24  # 24 hours
+
+    # Translation engines: "gpt" (OPENAI_MODEL), "gpt-fast" (OPENAI_FAST_MODEL)
+    # or "local", a deterministic offline engine for development/load tests.
+    # Routing overrides map conversation or sender ids to an engine name,
+    # e.g. TRANSLATION_ENGINE_BY_CONVO='{"12": "gpt-fast"}'
+    TRANSLATION_ENGINE: str = "gpt"
+    TRANSLATION_ENGINE_BY_CONVO: dict[int, str] = {}
+    TRANSLATION_ENGINE_BY_USER: dict[int, str] = {}
+    LOCAL_TRANSLATION_LATENCY_SECS: float = 0.0
+
+    # Translation fan-out. Distinct target languages of a message are translated
+    # concurrently, bounded per conversation and per OpenAI API key
+    TRANSLATION_MAX_CONCURRENCY_PER_CONVO: int = 8
+    TRANSLATION_MAX_CONCURRENCY_PER_API_KEY: int = 16
+    # "fallback_original": failed languages receive the untranslated text
+    # "abort": the whole message fails if any language fails
+    TRANSLATION_PARTIAL_FAILURE_POLICY: Literal["fallback_original", "abort"] = (
+        "fallback_original"
+    )
+    # identical translations (same text, context, language and API key) requested
+    # while one is already in flight wait for it instead of calling the model again
+    TRANSLATION_COALESCE_ENABLED: bool = True
+
+    # OpenAI
+    OPENAI_MODEL: str = "gpt-4"
+    OPENAI_FAST_MODEL: str = "gpt-4o-mini"
+    # Used for multi-language batch translations, must support structured
+    # outputs. Single language messages, streamed translations and whatever a
+    # batch misses use OPENAI_MODEL, so with different models the same text can
+    # translate differently depending on the path. Set both to one structured
+    # output model (e.g. gpt-4o) to avoid that
+    OPENAI_BATCH_MODEL: str = "gpt-4o"
+    OPENAI_TIMEOUT_SECS: float = 60.0
+    OPENAI_CONNECT_TIMEOUT_SECS: float = 5.0
+    OPENAI_MAX_RETRIES: int = 3
+    OPENAI_RETRY_BASE_DELAY_SECS: float = 0.5
+    OPENAI_RETRY_MAX_DELAY_SECS: float = 8.0
+    # one AsyncOpenAI client (and HTTP connection pool) is kept per API key
+    OPENAI_CLIENT_POOL_SIZE: int = 256
+    OPENAI_CLIENT_IDLE_SECS: int = 600
+    OPENAI_MAX_CONNECTIONS_PER_KEY: int = 100
+    OPENAI_MAX_KEEPALIVE_PER_KEY: int = 20
+
+    # Requests/min and tokens/min budget per API key, shared by every worker in
+    # Redis. Replaced by the limits OpenAI reports in its x-ratelimit-* headers
+    # once a key has been used. Calls over budget wait up to
+    # OPENAI_RATE_LIMIT_MAX_WAIT_SECS for capacity
+    OPENAI_RATE_LIMIT_ENABLED: bool = True
+    OPENAI_DEFAULT_RPM: int = 500
+    OPENAI_DEFAULT_TPM: int = 30000
+    OPENAI_RATE_LIMIT_MAX_WAIT_SECS: float = 20.0
+
+    # Translate all missing languages of a message with one structured
+    # completion, falling back to one call per language. Streaming translates
+    # per language, so batching only applies when streaming is disabled
+    TRANSLATION_BATCH_ENABLED: bool = True
+
+    # Stream translations to recipients as message_delta websocket frames.
+    # Deltas are coalesced and published at most every N seconds per language.
+    # Off by default: it turns batching off, and only clients connected with
+    # ?protocol=2 get the deltas, which the web client doesn't ask for
+    TRANSLATION_STREAMING_ENABLED: bool = False
+    TRANSLATION_STREAM_FLUSH_SECS: float = 0.1
+
+    # Translation cache: in-process LRU in front of Redis. Messages up to
+    # TRANSLATION_CACHE_CONTEXT_FREE_MAX_CHARS long are cached without their
+    # chat history, so common short phrases are shared across conversations
+    TRANSLATION_CACHE_ENABLED: bool = True
+    TRANSLATION_CACHE_LOCAL_MAX_ENTRIES: int = 10000
+    TRANSLATION_CACHE_LOCAL_TTL_SECS: int = 600
+    TRANSLATION_CACHE_TTL_SECS: int = 60 * 60 * 24 * 7  # 7 days
+    TRANSLATION_CACHE_MAX_ENTRIES: int = 500000
+    TRANSLATION_CACHE_CONTEXT_FREE_MAX_CHARS: int = 24
+
+    # Translation job queue (Redis stream). Messages are stored and acked right
+    # away, translation workers pick the jobs up. Set TRANSLATION_WORKER_IN_PROCESS
+    # to False when running workers separately (python -m app.worker.translation_worker)
+    TRANSLATION_QUEUE_STREAM: str = "translation_jobs"
+    TRANSLATION_QUEUE_GROUP: str = "translation_workers"
+    TRANSLATION_QUEUE_DEAD_LETTER_STREAM: str = "translation_jobs:dead"
+    TRANSLATION_QUEUE_MAXLEN: int = 100000
+    TRANSLATION_JOB_MAX_ATTEMPTS: int = 3
+    TRANSLATION_JOB_RETRY_DELAY_SECS: float = 1.0
+    TRANSLATION_JOB_VISIBILITY_TIMEOUT_SECS: int = 300
+    TRANSLATION_WORKER_CONCURRENCY: int = 32
+    TRANSLATION_WORKER_IN_PROCESS: bool = True
+
+    # Websockets share one Redis pubsub connection per process. A websocket with
+    # more undelivered frames than this is closed (1013) so it can't hold up
+    # the others, the client reconnects and reloads
+    WEBSOCKET_MAX_QUEUED_FRAMES: int = 1000
 
     PROJECT_NAME: str = "SpeakeAIsy"
 
@@ -1,4 +1,4 @@
 from .crud_user import user
 from .crud_convo import conversation
 from .crud_message import message
-from .crud_translation import translation
+from .crud_translation import translation, message_translation
@@ -1,3 +1,4 @@
+from app.crud import crud_inbox
 from app.models import group_member_association
 from sqlalchemy import insert, delete
 from sqlalchemy.ext.asyncio import AsyncSession
@@ -11,6 +12,14 @@ async def associate_users_to_convo(
         member_associations,
     )
 
+    user_ids_by_convo: dict[int, list[int]] = {}
+    for association in member_associations:
+        user_ids_by_convo.setdefault(association["conversation_id"], []).append(
+            association["user_id"]
+        )
+    for convo_id, user_ids in user_ids_by_convo.items():
+        await crud_inbox.add_members(db=db, convo_id=convo_id, user_ids=user_ids)
+
 
 async def remove_user_from_convo(
     *, db: AsyncSession, user_id: int, convo_id: int
@@ -21,3 +30,4 @@ async def remove_user_from_convo(
             group_member_association.c.conversation_id == convo_id,
         )
     )
+    await crud_inbox.remove_member(db=db, convo_id=convo_id, user_id=user_id)
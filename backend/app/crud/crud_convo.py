@@ -1,30 +1,26 @@
 import asyncio
-import json
 
+from datetime import datetime
 from typing import Sequence
 from app.core.config import settings
-from app.crud import crud_association
+from app.crud import crud_association, crud_inbox
 from app.schemas.responses import MembersOut
+from app.utils import envelope
 from app.utils.convo import generate_convo_identifier
 from fastapi.encoders import jsonable_encoder
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select
-from sqlalchemy.orm import aliased
+from sqlalchemy import literal, select, tuple_
 from redis.asyncio import Redis
 
-from app.models import Conversation, User, group_member_association
+from app.models import Conversation, User, UserInbox, group_member_association
 from app.schemas import (
     ConversationCreateDB,
     ConversationUpdate,
     Method,
     GetMembersResponse,
 )
-from app.utils.aws import (
-    delete_object,
-    generate_presigned_get_url,
-    get_cached_presigned_obj,
-    CacheMethod,
-)
+from app.storage.thumbnails import display_photo_key
+from app.utils.aws import delete_photo, resolve_presigned_get_urls
 from .base import CRUDBase
 
 
@@ -49,40 +45,44 @@ class CRUDConversation(
         return convo
 
     async def get_user_convos(
-        self, db: AsyncSession, *, user_id: int, offset: int, limit: int
+        self,
+        db: AsyncSession,
+        *,
+        user_id: int,
+        limit: int,
+        after: tuple[datetime, int] | None = None,
+        offset: int = 0,
     ) -> Sequence[Conversation]:
-        # Create an alias for the conversation to use in the subquery.
-        # Necessary bc the query using the subquery also operates on Conversation
-        conversation_alias = aliased(Conversation)
+        """The `limit` conversations of a user with the most recent activity,
+        or the ones after the (last_activity_at, id) `after`, from the user's
+        inbox. Returned in reverse, least recent first, with their
+        `last_activity_at` and `unread_count` set."""
+        # optimized: a range scan of the user's inbox index
+        query = (
+            select(Conversation, UserInbox.last_activity_at, UserInbox.unread_count)
+            .join(UserInbox, UserInbox.conversation_id == Conversation.id)
+            .where(UserInbox.user_id == user_id)
+        )
+        if after is not None:
+            query = query.where(
+                tuple_(UserInbox.last_activity_at, UserInbox.conversation_id)
+                < tuple_(literal(after[0]), literal(after[1]))
+            )
 
-        # Construct the subquery to select the latest 30 conversation IDs for the given user.
-        # optimized
-        subquery = (
-            select(conversation_alias.id)
-            .join(
-                group_member_association,
-                group_member_association.c.conversation_id == conversation_alias.id,
+        rows = await db.execute(
+            query.order_by(
+                UserInbox.last_activity_at.desc(), UserInbox.conversation_id.desc()
             )
-            .where(group_member_association.c.user_id == user_id)
-            .order_by(conversation_alias.latest_message_id.desc())
             .offset(offset)  # start after the `offset`'th item
             .limit(limit)  # only take `limit` number of items
-            .subquery()
         )
 
-        # Return the Conversation objects based on the subquery results.
-        # optimized
-        return (
-            (
-                await db.execute(
-                    select(Conversation)
-                    .join(subquery, Conversation.id == subquery.c.id)
-                    .order_by(Conversation.latest_message_id.asc())
-                )
-            )
-            .scalars()
-            .all()
-        )
+        convos = []
+        for convo, last_activity_at, unread_count in rows:
+            setattr(convo, "last_activity_at", last_activity_at)
+            setattr(convo, "unread_count", unread_count)
+            convos.append(convo)
+        return convos[::-1]
 
     async def create(
         self, db: AsyncSession, *, obj_in: ConversationCreateDB
@@ -125,30 +125,27 @@ class CRUDConversation(
             pub_messages = []
             member_associations = []
 
+            photo_keys = {
+                added_user.id: display_photo_key(
+                    added_user.profile_photo, added_user.profile_photo_thumbnails
+                )
+                for added_user in users
+            }
+            presigned_urls = await resolve_presigned_get_urls(
+                bucket_name=settings.S3_BUCKET_NAME,
+                object_keys=photo_keys.values(),
+                expire_in_secs=settings.S3_PRESIGNED_URL_GET_EXPIRE_SECS,
+                redis_client=redis,
+            )
+
             for added_user in users:
                 sorted_curr_ids.append(added_user.id)
 
-                url = None
-
-                if added_user.profile_photo:
-                    _, url = await get_cached_presigned_obj(
-                        object_key=added_user.profile_photo,
-                        redis_client=redis,
-                        method=CacheMethod.GET,
-                    )
-
-                    if not url:
-                        url = await generate_presigned_get_url(
-                            bucket_name=settings.S3_BUCKET_NAME,
-                            object_key=added_user.profile_photo,
-                            expire_in_secs=settings.S3_PRESIGNED_URL_GET_EXPIRE_SECS,
-                            redis_client=redis,
-                        )
-
+                photo_key = photo_keys[added_user.id]
                 setattr(
                     added_user,
                     "presigned_url",
-                    url,
+                    presigned_urls.get(photo_key) if photo_key else None,
                 )
 
                 members_dict[added_user.id] = MembersOut(**jsonable_encoder(added_user))
@@ -158,14 +155,7 @@ class CRUDConversation(
                 pub_messages.append(
                     (
                         f"{added_user.id}",
-                        json.dumps(
-                            {
-                                "type": "add_self",
-                                "data": {
-                                    "convo_id": convo_id,
-                                },
-                            }
-                        ),
+                        envelope.envelope("add_self", {"convo_id": convo_id}),
                     )
                 )
 
@@ -178,11 +168,8 @@ class CRUDConversation(
             # must go before new users subscribe to chat channel
             await redis.publish(
                 f"chat_{convo_id}",
-                json.dumps(
-                    {
-                        "type": "add_members",
-                        "data": {"convo_id": convo_id, "members": ws_data},
-                    }
+                envelope.envelope(
+                    "add_members", {"convo_id": convo_id, "members": ws_data}
                 ),
             )
 
@@ -220,17 +207,11 @@ class CRUDConversation(
 
             # await crud_association.remove_user_from_convo(db=db, user_id=user.id, convo_id=convo_id)
             convo_members.remove(user)
+            await crud_inbox.remove_member(db=db, convo_id=convo_id, user_id=user.id)
 
             await redis.publish(
                 f"{user.id}",
-                json.dumps(
-                    {
-                        "type": "delete_self",
-                        "data": {
-                            "convo_id": convo_id,
-                        },
-                    }
-                ),
+                envelope.envelope("delete_self", {"convo_id": convo_id}),
             )
 
             sorted_curr_ids.remove(user.id)
@@ -241,38 +222,32 @@ class CRUDConversation(
                 if members_remaining == 1:
                     await redis.publish(
                         f"{convo_members[0].id}",
-                        json.dumps(
-                            {
-                                "type": "delete_self",
-                                "data": {
-                                    "convo_id": convo_id,
-                                },
-                            }
-                        ),
+                        envelope.envelope("delete_self", {"convo_id": convo_id}),
                     )
 
                 # delete convo
                 obj_key = convo.conversation_photo
                 await self.delete(db=db, id=convo_id)
 
-                # delete chat pic from S3 bucket
+                # delete chat pic and its thumbnails from S3 bucket, in the
+                # background
                 if obj_key:
-                    delete_object(
-                        bucket_name=settings.S3_BUCKET_NAME, object_key=obj_key
+                    await delete_photo(
+                        bucket_name=settings.S3_BUCKET_NAME,
+                        object_key=obj_key,
+                        redis_client=redis,
                     )
             else:
                 # must go after removed users unsubscribed from chat channel
                 await redis.publish(
                     f"chat_{convo_id}",
-                    json.dumps(
+                    envelope.envelope(
+                        "delete_members",
                         {
-                            "type": "delete_members",
-                            "data": {
-                                "convo_id": convo_id,
-                                "member_ids": deleted_ids,
-                                "sorted_curr_ids": sorted_curr_ids,
-                            },
-                        }
+                            "convo_id": convo_id,
+                            "member_ids": deleted_ids,
+                            "sorted_curr_ids": sorted_curr_ids,
+                        },
                     ),
                 )
 
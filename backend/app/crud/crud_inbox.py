@@ -0,0 +1,165 @@
+from datetime import datetime
+
+from sqlalchemy import case, delete, func, insert, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.models import Conversation, Message, Translation, UserInbox
+
+SNIPPET_MAX_CHARS = 255
+
+
+async def add_members(*, db: AsyncSession, convo_id: int, user_ids: list[int]) -> None:
+    """Members start with the conversation's latest message, which they have
+    no copy of, and nothing unread"""
+    latest_message_id = (
+        select(Conversation.latest_message_id)
+        .where(Conversation.id == convo_id)
+        .scalar_subquery()
+    )
+    joined_at = datetime.utcnow()
+    await db.execute(
+        insert(UserInbox).values(
+            [
+                {
+                    "user_id": user_id,
+                    "conversation_id": convo_id,
+                    "last_message_id": latest_message_id,
+                    "unread_count": 0,
+                    "last_activity_at": joined_at,
+                }
+                for user_id in user_ids
+            ]
+        )
+    )
+
+
+async def remove_member(*, db: AsyncSession, convo_id: int, user_id: int) -> None:
+    await db.execute(
+        delete(UserInbox).where(
+            UserInbox.user_id == user_id, UserInbox.conversation_id == convo_id
+        )
+    )
+
+
+async def record_message(
+    *, db: AsyncSession, convo_id: int, message_id: int, sent_at: datetime
+) -> None:
+    """A message was sent, the conversation moves to the top of every
+    member's inbox"""
+    await db.execute(
+        update(UserInbox)
+        .where(
+            UserInbox.conversation_id == convo_id,
+            # translation workers may finish out of order
+            func.coalesce(UserInbox.last_message_id, 0) < message_id,
+        )
+        .values(last_message_id=message_id, last_activity_at=sent_at)
+    )
+
+
+async def record_delivery(
+    *,
+    db: AsyncSession,
+    convo_id: int,
+    message_id: int,
+    sender_id: int,
+    member_ids_by_text: dict[str, list[int]],
+) -> None:
+    """A message was translated: its text becomes the snippet of the members
+    it is still the last message of, and it is unread for all but the sender.
+    One statement per distinct text."""
+    for text, member_ids in member_ids_by_text.items():
+        await db.execute(
+            update(UserInbox)
+            .where(
+                UserInbox.conversation_id == convo_id,
+                UserInbox.user_id.in_(member_ids),
+            )
+            .values(
+                last_message_snippet=case(
+                    (
+                        UserInbox.last_message_id == message_id,
+                        text[:SNIPPET_MAX_CHARS],
+                    ),
+                    else_=UserInbox.last_message_snippet,
+                ),
+                unread_count=UserInbox.unread_count
+                + case((UserInbox.user_id == sender_id, 0), else_=1),
+            )
+        )
+
+
+async def record_retraction(
+    *, db: AsyncSession, convo_id: int, message_id: int, previous_id: int | None
+) -> None:
+    """A message that was never delivered was taken back. Its snippet and
+    unread count were never recorded, only its place in the inbox is undone"""
+    previous_sent_at = (
+        select(Message.sent_at).where(Message.id == previous_id).scalar_subquery()
+    )
+    await db.execute(
+        update(UserInbox)
+        .where(
+            UserInbox.conversation_id == convo_id,
+            UserInbox.last_message_id == message_id,
+        )
+        .values(
+            last_message_id=previous_id,
+            last_activity_at=func.coalesce(
+                previous_sent_at, UserInbox.last_activity_at
+            ),
+        )
+    )
+
+
+async def add_unread(
+    *, db: AsyncSession, user_id: int, message_id: int, delta: int
+) -> None:
+    """Messages of a conversation were marked read (negative `delta`) or
+    unread"""
+    convo_id = (
+        select(Message.conversation_id)
+        .where(Message.id == message_id)
+        .scalar_subquery()
+    )
+    await db.execute(
+        update(UserInbox)
+        .where(UserInbox.user_id == user_id, UserInbox.conversation_id == convo_id)
+        .values(unread_count=func.greatest(UserInbox.unread_count + delta, 0))
+    )
+
+
+async def mark_read(
+    *, db: AsyncSession, user_id: int, convo_id: int, up_to_message_id: int
+) -> int | None:
+    """Mark the user's copies of a conversation's messages read up to and
+    including `up_to_message_id`, and take them off the unread count, in one
+    statement. The new unread count, None (and nothing marked) if the user
+    isn't a member"""
+    marked = (
+        update(Translation)
+        .where(
+            # members only, copies kept from before leaving stay as they are
+            UserInbox.user_id == user_id,
+            UserInbox.conversation_id == convo_id,
+            Translation.message_id == Message.id,
+            Message.conversation_id == convo_id,
+            Message.id <= up_to_message_id,
+            Translation.target_user_id == user_id,
+            Translation.is_read == 0,
+        )
+        .values(is_read=1)
+        .returning(Translation.id)
+        .cte("marked")
+    )
+    marked_count = select(func.count()).select_from(marked).scalar_subquery()
+    return (
+        await db.execute(
+            update(UserInbox)
+            .where(UserInbox.user_id == user_id, UserInbox.conversation_id == convo_id)
+            .values(
+                unread_count=func.greatest(UserInbox.unread_count - marked_count, 0)
+            )
+            .returning(UserInbox.unread_count)
+        )
+    ).scalar()
@@ -1,32 +1,183 @@
+from datetime import datetime
 from typing import Sequence
-from sqlalchemy import select
+
+from fastapi.encoders import jsonable_encoder
+from sqlalchemy import (
+    Row,
+    and_,
+    delete,
+    func,
+    insert,
+    literal,
+    or_,
+    select,
+    tuple_,
+    update,
+)
 from sqlalchemy.ext.asyncio import AsyncSession
 
-from app.models import Message
+from app.models import Conversation, Message, MessageTranslation, Translation, User
 from app.schemas import MessageCreate, MessageUpdate
 
+from . import crud_inbox
 from .base import CRUDBase
 
 
 class CRUDMessage(CRUDBase[Message, MessageCreate, MessageUpdate]):
-    async def get_most_recent_messages(
-        self, *, db: AsyncSession, convo_id: int, offset: int, limit: int
-    ) -> Sequence[Message]:
-        latest_n_msgs = (
-            (
-                await db.execute(
-                    select(Message)
-                    .where(Message.conversation_id == convo_id)
-                    .order_by(Message.sent_at.desc())
-                    .offset(offset)
-                    .limit(limit)
-                )
-            )
-            .scalars()
-            .all()
-        )
-
-        return latest_n_msgs
+    async def create_as_latest(
+        self, *, db: AsyncSession, obj_in: MessageCreate
+    ) -> Row[tuple[int, datetime]]:
+        """Insert a message and make it its conversation's latest in one
+        statement, returning its (id, sent_at)"""
+        new_message = (
+            insert(Message)
+            .values(**jsonable_encoder(obj_in), sent_at=datetime.utcnow())
+            .returning(Message.id, Message.sent_at)
+            .cte("new_message")
+        )
+        result = await db.execute(
+            update(Conversation)
+            .where(Conversation.id == obj_in.conversation_id)
+            .values(latest_message_id=new_message.c.id)
+            .returning(new_message.c.id, new_message.c.sent_at)
+        )
+        return result.one()
+
+    async def get_chat_page(
+        self,
+        *,
+        db: AsyncSession,
+        convo_id: int,
+        user_id: int,
+        limit: int,
+        before: tuple[datetime, int] | None = None,
+        offset: int = 0,
+    ) -> Sequence[Row[tuple[Message, str | None, str | None, str | None]]]:
+        """The latest `limit` messages of a conversation `user_id` can see, newest
+        first, as (message, its text in the user's language, sender's first name,
+        sender's last name), in a single query. Only messages before the
+        (sent_at, id) `before` when given. The names are None for deleted users."""
+        query = (
+            select(
+                Message, MessageTranslation.translation, User.first_name, User.last_name
+            )
+            .outerjoin(
+                Translation,
+                and_(
+                    Translation.message_id == Message.id,
+                    Translation.target_user_id == user_id,
+                ),
+            )
+            .outerjoin(
+                MessageTranslation,
+                and_(
+                    MessageTranslation.message_id == Translation.message_id,
+                    MessageTranslation.language == Translation.language,
+                ),
+            )
+            .outerjoin(User, User.id == Message.sender_id)
+            .where(
+                Message.conversation_id == convo_id,
+                # messages sent before the user was added have no copy for them
+                or_(Message.sender_id == user_id, Translation.id.is_not(None)),
+            )
+        )
+        if before is not None:
+            # keyset: stays as fast deep into the history as on the first page
+            query = query.where(
+                tuple_(Message.sent_at, Message.id)
+                < tuple_(literal(before[0]), literal(before[1]))
+            )
+
+        result = await db.execute(
+            query.order_by(Message.sent_at.desc(), Message.id.desc())
+            .offset(offset)
+            .limit(limit)
+        )
+        # the outer joins make the columns nullable, which their types don't say
+        return result.all()  # type: ignore[return-value]
+
+    async def get_history_in_language(
+        self,
+        *,
+        db: AsyncSession,
+        convo_id: int,
+        language: str,
+        limit: int,
+        before_message_id: int | None = None,
+    ) -> list[tuple[int, str]]:
+        """The latest `limit` messages of a conversation as (sender_id, text) in
+        `language`, oldest first, in a single query. Messages that were neither
+        written in nor translated into `language` are left out, and so is
+        `before_message_id` and everything sent after it."""
+        translated_text = (
+            select(MessageTranslation.translation)
+            .where(
+                MessageTranslation.message_id == Message.id,
+                MessageTranslation.language == language,
+            )
+            .scalar_subquery()
+        )
+
+        query = select(
+            Message.sender_id,
+            Message.orig_language,
+            Message.original_text,
+            translated_text,
+        ).where(Message.conversation_id == convo_id)
+        if before_message_id is not None:
+            query = query.where(Message.id < before_message_id)
+
+        rows = (
+            await db.execute(query.order_by(Message.sent_at.desc()).limit(limit))
+        ).all()
+
+        history = []
+        for sender_id, orig_language, original_text, translation in reversed(rows):
+            if orig_language == language:
+                history.append((sender_id, original_text))
+            elif translation is not None:
+                history.append((sender_id, translation))
+
+        return history
+
+    async def retract(self, *, db: AsyncSession, message_id: int) -> None:
+        """Delete a message that could not be delivered and point its
+        conversation's latest message back to the one before it"""
+        await db.execute(
+            delete(Translation).where(Translation.message_id == message_id)
+        )
+        await db.execute(
+            delete(MessageTranslation).where(
+                MessageTranslation.message_id == message_id
+            )
+        )
+        convo_id = (
+            await db.execute(
+                delete(Message)
+                .where(Message.id == message_id)
+                .returning(Message.conversation_id)
+            )
+        ).scalar()
+        if convo_id is None:
+            return
+
+        previous_id = (
+            await db.execute(
+                select(func.max(Message.id)).where(Message.conversation_id == convo_id)
+            )
+        ).scalar()
+        await db.execute(
+            update(Conversation)
+            .where(
+                Conversation.id == convo_id,
+                Conversation.latest_message_id == message_id,
+            )
+            .values(latest_message_id=previous_id)
+        )
+        await crud_inbox.record_retraction(
+            db=db, convo_id=convo_id, message_id=message_id, previous_id=previous_id
+        )
 
 
 message = CRUDMessage(Message)
@@ -1,10 +1,63 @@
-from app.models import Translation
-from app.schemas import TranslationCreate, TranslationUpdate
+from typing import Sequence
+
+from fastapi.encoders import jsonable_encoder
+from sqlalchemy import Row, exists, insert, select
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.models import MessageTranslation, Translation
+from app.schemas import MessageTranslationCreate, TranslationCreate, TranslationUpdate
 from .base import CRUDBase
 
 
 class CRUDTranslation(CRUDBase[Translation, TranslationCreate, TranslationUpdate]):
-    pass
+    async def exists_for_message(self, *, db: AsyncSession, message_id: int) -> bool:
+        return bool(
+            (
+                await db.execute(
+                    select(exists().where(Translation.message_id == message_id))
+                )
+            ).scalar()
+        )
+
+    async def create_many(
+        self, *, db: AsyncSession, objs_in: list[TranslationCreate]
+    ) -> Sequence[Row[tuple[int, int, str]]]:
+        """Insert all the translations in one statement, returning their
+        (id, target_user_id, language) in no particular order"""
+        if not objs_in:
+            return []
+        result = await db.execute(
+            insert(Translation)
+            .values([jsonable_encoder(obj_in) for obj_in in objs_in])
+            .returning(Translation.id, Translation.target_user_id, Translation.language)
+        )
+        return result.all()
+
+
+class CRUDMessageTranslation(
+    CRUDBase[MessageTranslation, MessageTranslationCreate, MessageTranslationCreate]
+):
+    async def create_many(
+        self, *, db: AsyncSession, objs_in: list[MessageTranslationCreate]
+    ) -> bool:
+        """Store a message's text once per language. False if some of the
+        languages were already stored, i.e. the message was already delivered
+        by another worker, in which case the caller should roll back"""
+        if not objs_in:
+            return True
+        stored = (
+            await db.execute(
+                pg_insert(MessageTranslation)
+                .values([jsonable_encoder(obj_in) for obj_in in objs_in])
+                .on_conflict_do_nothing(
+                    constraint="uq_message_translations_message_language"
+                )
+                .returning(MessageTranslation.id)
+            )
+        ).all()
+        return len(stored) == len(objs_in)
 
 
 translation = CRUDTranslation(Translation)
+message_translation = CRUDMessageTranslation(MessageTranslation)
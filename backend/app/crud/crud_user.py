@@ -1,4 +1,4 @@
-from app.utils.convo import convo_name_url_processing
+from app.utils.convo import hydrate_inbox
 from pydantic import EmailStr
 from sqlalchemy import select
 from sqlalchemy.ext.asyncio import AsyncSession
@@ -7,16 +7,12 @@ from redis.asyncio import Redis
 
 from app import crud
 
-from app.models import User, Translation
+from app.models import User
 from app.schemas.user import UserCreate, UserUpdate
 from app.exceptions import UserAlreadyExistsException
 from app.core import security
 from app.core.config import settings
-from app.utils.aws import (
-    generate_presigned_get_url,
-    get_cached_presigned_obj,
-    CacheMethod,
-)
+from app.utils.aws import resolve_presigned_get_urls
 from .base import CRUDBase
 
 
@@ -60,79 +56,22 @@ class CRUDUser(CRUDBase[User, UserCreate, UserUpdate]):
         presigned_url = None
 
         if user.profile_photo:
-            _, presigned_url = await get_cached_presigned_obj(
-                object_key=user.profile_photo,
-                redis_client=redis_client,
-                method=CacheMethod.GET,
-            )
-
-            if not presigned_url:
-                presigned_url = await generate_presigned_get_url(
+            presigned_url = (
+                await resolve_presigned_get_urls(
                     bucket_name=settings.S3_BUCKET_NAME,
-                    object_key=user.profile_photo,
+                    object_keys=[user.profile_photo],
                     expire_in_secs=settings.S3_PRESIGNED_URL_GET_EXPIRE_SECS,
                     redis_client=redis_client,
                 )
+            )[user.profile_photo]
 
-        latest_message_ids = [
-            conversation.latest_message_id
-            for conversation in top_30_convos
-            if conversation.latest_message_id is not None
-        ]
-
-        # Assuming `user.target_language` holds the desired language of the user
-        relevant_translations = await db.execute(
-            select(
-                Translation.message_id,
-                Translation.translation,
-                Translation.id,
-                Translation.is_read,
-            ).where(
-                Translation.message_id.in_(latest_message_ids),
-                Translation.target_user_id == user.id,
-            )
+        await hydrate_inbox(
+            db=db,
+            convos=top_30_convos,
+            curr_user_id=user.id,
+            redis_client=redis_client,
         )
 
-        translations = relevant_translations.all()
-
-        translation_map = {
-            trans.message_id: (trans.translation, trans.id, trans.is_read)
-            for trans in translations
-        }
-
-        for conversation in top_30_convos:
-            if conversation.latest_message_id:
-                val = translation_map.get(conversation.latest_message_id)
-                convo_latest_msg = await crud.message.get(
-                    db=db, id=conversation.latest_message_id
-                )
-                if val:
-                    setattr(
-                        convo_latest_msg,
-                        "relevant_translation",
-                        val[0],
-                    )
-                    setattr(
-                        convo_latest_msg,
-                        "translation_id",
-                        val[1],
-                    )
-                    setattr(
-                        convo_latest_msg,
-                        "is_read",
-                        val[2],
-                    )
-
-                setattr(
-                    conversation,
-                    "latest_message",
-                    convo_latest_msg,
-                )
-
-            await convo_name_url_processing(
-                convo=conversation, curr_user_id=user.id, redis_client=redis_client
-            )
-
         setattr(user, "top_n_convos", top_30_convos)
 
         return user, presigned_url
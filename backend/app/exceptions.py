@@ -8,3 +8,9 @@ class OpenAIAuthenticationException(Exception):
     def __init__(self) -> None:
         self.message = f"Your OpenAI API key is invalid, expired, or revoked. Please generate a new one and update it here for use."
         super().__init__(self.message)
+
+
+class OpenAIRateLimitWaitException(Exception):
+    def __init__(self) -> None:
+        self.message = f"Your OpenAI API key is at its rate limit and no capacity freed up in time to translate this message."
+        super().__init__(self.message)
@@ -1,3 +1,4 @@
+import asyncio
 import redis.asyncio as redis
 
 from fastapi import FastAPI
@@ -11,6 +12,10 @@ from app.handlers import user_already_exists_exception_handler
 from app.api.api_v1.api import api_router
 from app.core.config import settings
 from app.cron.db_cleanup import delete_expired_unverified_users
+from app.translation.client_pool import client_pool
+from app.utils.pubsub import PubSubDispatcher
+from app.worker.storage_worker import run_storage_worker
+from app.worker.translation_worker import run_translation_worker
 from app.logger import setup_logger
 
 
@@ -37,7 +42,33 @@ async def lifespan(app: FastAPI) -> AsyncGenerator[Any, Any]:
         raise e
 
     await delete_expired_unverified_users()
+
+    app.state.pubsub_dispatcher = PubSubDispatcher(
+        app.state.redis_client,
+        max_queued_per_subscriber=settings.WEBSOCKET_MAX_QUEUED_FRAMES,
+    )
+    await app.state.pubsub_dispatcher.start()
+
+    worker_tasks = []
+    if settings.TRANSLATION_WORKER_IN_PROCESS:
+        worker_tasks.append(
+            asyncio.create_task(run_translation_worker(app.state.redis_client))
+        )
+    if settings.STORAGE_WORKER_IN_PROCESS:
+        worker_tasks.append(
+            asyncio.create_task(run_storage_worker(app.state.redis_client))
+        )
+
     yield
+
+    for worker_task in worker_tasks:
+        worker_task.cancel()
+        try:
+            await worker_task
+        except asyncio.CancelledError:
+            pass
+    await app.state.pubsub_dispatcher.stop()
+    await client_pool.aclose()
     await app.state.redis_client.aclose()
 
 
@@ -57,6 +88,8 @@ if settings.BACKEND_CORS_ORIGINS:
             "Authorization",
             "X-Requested-With",
         ],
+        # pagination cursors
+        expose_headers=["X-Next-Cursor"],
         allow_credentials=True,
     )
 
@@ -1,3 +1,11 @@
-from .models import User, Conversation, Message, Translation, group_member_association
+from .models import (
+    User,
+    Conversation,
+    Message,
+    MessageTranslation,
+    Translation,
+    UserInbox,
+    group_member_association,
+)
 
 # SQLAlchemy DB Models
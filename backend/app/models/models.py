@@ -1,6 +1,16 @@
 from datetime import datetime
 from typing import List, Optional
-from sqlalchemy import ForeignKey, String, Text, DateTime, Column, Integer, Table, Index
+from sqlalchemy import (
+    ForeignKey,
+    String,
+    Text,
+    DateTime,
+    Column,
+    Integer,
+    Table,
+    Index,
+    UniqueConstraint,
+)
 from sqlalchemy.orm import DeclarativeBase, Mapped, mapped_column, relationship
 from sqlalchemy.ext.asyncio import AsyncAttrs
 
@@ -30,6 +40,8 @@ class User(Base):
     first_name: Mapped[str] = mapped_column(String(100))
     last_name: Mapped[str] = mapped_column(String(100))
     profile_photo: Mapped[Optional[str]] = mapped_column(String(4096))
+    # set by the storage worker once the photo's thumbnails are stored
+    profile_photo_thumbnails: Mapped[bool] = mapped_column(default=False)
     email: Mapped[str] = mapped_column(
         Text, unique=True, index=True
     )  # serves as username, unique
@@ -72,16 +84,44 @@ class Message(Base):
     translations: Mapped[List["Translation"]] = relationship(
         back_populates="message", cascade="all, delete-orphan"
     )
+    translated_texts: Mapped[List["MessageTranslation"]] = relationship(
+        back_populates="message", cascade="all, delete-orphan"
+    )
+
+    __table_args__ = (
+        # keyset pagination of a conversation's messages, newest first
+        Index(
+            "idx_conversation_id_sent_at_id",
+            conversation_id,
+            sent_at.desc(),
+            id.desc(),
+        ),
+    )
+
+
+# The text of a message in one language, shared by every recipient reading it
+# in that language
+class MessageTranslation(Base):
+    __tablename__ = "message_translations"
+    id: Mapped[int] = mapped_column(primary_key=True)
+    message_id: Mapped[int] = mapped_column(ForeignKey("messages.id"))
+    language: Mapped[str] = mapped_column(String(100))
+    translation: Mapped[str] = mapped_column(Text)
+
+    message: Mapped[Message] = relationship(back_populates="translated_texts")
 
     __table_args__ = (
-        Index("idx_conversation_id_sent_at", conversation_id, sent_at.desc()),
+        UniqueConstraint(
+            "message_id", "language", name="uq_message_translations_message_language"
+        ),
     )
 
 
+# A recipient's copy of a message: which language they got it in and whether
+# they've read it. The text is in MessageTranslation
 class Translation(Base):
     __tablename__ = "translations"
     id: Mapped[int] = mapped_column(primary_key=True)
-    translation: Mapped[str] = mapped_column(Text)
     language: Mapped[str] = mapped_column(String(100))
     target_user_id: Mapped[int] = mapped_column(ForeignKey("users.id"))
     message_id: Mapped[int] = mapped_column(ForeignKey("messages.id"))
@@ -102,10 +142,11 @@ class Conversation(Base):
     id: Mapped[int] = mapped_column(primary_key=True)
     conversation_name: Mapped[Optional[str]] = mapped_column(String(255))
     conversation_photo: Mapped[Optional[str]] = mapped_column(String(255))
+    conversation_photo_thumbnails: Mapped[bool] = mapped_column(default=False)
     is_group_chat: Mapped[bool]
 
     # Column for the latest message
-    latest_message_id: Mapped[int] = mapped_column(nullable=True, index=True)
+    latest_message_id: Mapped[int] = mapped_column(nullable=True)
 
     chat_identifier: Mapped[str] = mapped_column(String(64), index=True)
 
@@ -118,3 +159,32 @@ class Conversation(Base):
     members: Mapped[List[User]] = relationship(
         secondary=group_member_association, back_populates="conversations"
     )
+
+
+# Denormalized conversation list: one row per member of a conversation, kept
+# up to date as messages are sent, delivered and read, so a user's inbox is
+# read from one index range scan
+class UserInbox(Base):
+    __tablename__ = "user_inbox"
+    user_id: Mapped[int] = mapped_column(
+        ForeignKey("users.id", ondelete="CASCADE"), primary_key=True
+    )
+    conversation_id: Mapped[int] = mapped_column(
+        ForeignKey("conversations.id", ondelete="CASCADE"), primary_key=True
+    )
+    last_message_id: Mapped[Optional[int]]
+    # the last message in the user's language, cut to fit
+    last_message_snippet: Mapped[Optional[str]] = mapped_column(String(255))
+    unread_count: Mapped[int] = mapped_column(default=0)
+    last_activity_at: Mapped[datetime] = mapped_column(
+        DateTime, default=datetime.utcnow
+    )
+
+    __table_args__ = (
+        Index(
+            "idx_user_id_last_activity_at_conversation_id",
+            user_id,
+            last_activity_at.desc(),
+            conversation_id.desc(),
+        ),
+    )
@@ -5,9 +5,14 @@ from .conversation import (
     ConversationCreateDB,
     ConversationUpdate,
     ConversationMemberUpdate,
+    ConversationReadUpdate,
     Method,
 )
-from .translation import TranslationCreate, TranslationUpdate
+from .translation import (
+    MessageTranslationCreate,
+    TranslationCreate,
+    TranslationUpdate,
+)
 
 from .token import TokenPayLoad, TokenOut, VerificationPayLoad
 
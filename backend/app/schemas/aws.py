@@ -11,6 +11,13 @@ class S3PreSignedURLPOSTRequest(BaseModel):
     filename: Annotated[str, StringConstraints(strip_whitespace=True, max_length=255)]
     convo_id: int | None = None
     about: Annotated[str, StringConstraints(strip_whitespace=True)]
+    # hex SHA-256 of the file. Part of the object key, so the same photo
+    # always has the same key and a new one never reuses an old key. S3
+    # checks the upload against it
+    content_sha256: (
+        Annotated[str, StringConstraints(to_lower=True, pattern=r"^[0-9a-fA-F]{64}$")]
+        | None
+    ) = None
 
     @field_validator("filename", mode="after")
     @classmethod
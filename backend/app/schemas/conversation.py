@@ -41,3 +41,7 @@ class ConversationMemberUpdate(BaseModel):
     method: Method
     user_ids: list[CustomEmailStr]
     sorted_ids: list[int]
+
+
+class ConversationReadUpdate(BaseModel):
+    up_to_message_id: int
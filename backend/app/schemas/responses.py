@@ -64,6 +64,7 @@ class MessageResponse(BaseModel):
 
     model_config = ConfigDict(from_attributes=True)
 
+    id: int
     conversation_id: int
     sender_id: int
     original_text: str
@@ -119,6 +120,7 @@ class ConversationResponse(BaseModel):
 
     is_group_chat: bool
     presigned_url: str | None
+    unread_count: int = 0
     # messages: list[MessageResponse] = []
 
 
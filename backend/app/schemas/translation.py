@@ -4,8 +4,15 @@ from typing import Annotated
 from pydantic import BaseModel, StringConstraints
 
 
-class TranslationCreate(BaseModel):
+class MessageTranslationCreate(BaseModel):
+    message_id: int
+    language: Annotated[
+        str, StringConstraints(strip_whitespace=True, to_lower=True, max_length=100)
+    ]
     translation: str
+
+
+class TranslationCreate(BaseModel):
     language: Annotated[
         str, StringConstraints(strip_whitespace=True, to_lower=True, max_length=100)
     ]
@@ -0,0 +1,14 @@
+from functools import lru_cache
+
+from app.core.config import settings
+from app.storage.base import IMMUTABLE_CACHE_CONTROL, ObjectStorage
+from app.storage.memory import MemoryStorage
+from app.storage.s3 import S3Storage
+
+
+@lru_cache(maxsize=None)
+def get_storage() -> ObjectStorage:
+    """The process' object store, STORAGE_BACKEND"""
+    if settings.STORAGE_BACKEND == "memory":
+        return MemoryStorage()
+    return S3Storage(max_threads=settings.STORAGE_MAX_THREADS)
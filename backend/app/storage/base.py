@@ -0,0 +1,51 @@
+from datetime import datetime
+from typing import Any, Protocol
+
+
+# objects are never overwritten (content-addressed keys), caches can keep them
+IMMUTABLE_CACHE_CONTROL = "public, max-age=31536000, immutable"
+
+
+class ObjectStorage(Protocol):
+    """What the app needs from an object store. Implementations must not block
+    the event loop"""
+
+    async def presign_get(
+        self,
+        *,
+        bucket_name: str,
+        object_keys: list[str],
+        expire_in_secs: int,
+        signed_at: datetime,
+    ) -> tuple[list[str], datetime]:
+        """Presigned GET urls, in the order of `object_keys`, valid from
+        `signed_at` for `expire_in_secs`, and the time they stop working, which
+        is earlier if the credentials they are signed with expire first. The
+        same arguments give the same urls"""
+        ...
+
+    async def presign_post(
+        self,
+        *,
+        bucket_name: str,
+        object_key: str,
+        fields: dict[str, str],
+        conditions: list[Any],
+        expire_in_secs: int,
+    ) -> dict[str, Any]:
+        """{"url": ..., "fields": {...}} of a browser upload form"""
+        ...
+
+    async def get(self, *, bucket_name: str, object_key: str) -> bytes: ...
+
+    async def put(
+        self,
+        *,
+        bucket_name: str,
+        object_key: str,
+        data: bytes,
+        content_type: str,
+        cache_control: str,
+    ) -> None: ...
+
+    async def delete(self, *, bucket_name: str, object_key: str) -> None: ...
@@ -0,0 +1,62 @@
+from datetime import datetime, timedelta
+from typing import Any
+from urllib.parse import quote
+
+
+class MemoryStorage:
+    """In-process stand-in for S3, for tests and offline development. Urls
+    point nowhere"""
+
+    def __init__(self) -> None:
+        # {(bucket_name, object_key): data}
+        self.objects: dict[tuple[str, str], bytes] = {}
+
+    def _url(self, bucket_name: str, object_key: str) -> str:
+        return f"memory://{bucket_name}/{quote(object_key)}"
+
+    async def presign_get(
+        self,
+        *,
+        bucket_name: str,
+        object_keys: list[str],
+        expire_in_secs: int,
+        signed_at: datetime,
+    ) -> tuple[list[str], datetime]:
+        valid_until = signed_at + timedelta(seconds=expire_in_secs)
+        expires_at = int(valid_until.timestamp())
+        urls = [
+            f"{self._url(bucket_name, object_key)}?expires={expires_at}"
+            for object_key in object_keys
+        ]
+        return urls, valid_until
+
+    async def presign_post(
+        self,
+        *,
+        bucket_name: str,
+        object_key: str,
+        fields: dict[str, str],
+        conditions: list[Any],
+        expire_in_secs: int,
+    ) -> dict[str, Any]:
+        return {
+            "url": f"memory://{bucket_name}",
+            "fields": {**fields, "key": object_key},
+        }
+
+    async def get(self, *, bucket_name: str, object_key: str) -> bytes:
+        return self.objects[(bucket_name, object_key)]
+
+    async def put(
+        self,
+        *,
+        bucket_name: str,
+        object_key: str,
+        data: bytes,
+        content_type: str,
+        cache_control: str,
+    ) -> None:
+        self.objects[(bucket_name, object_key)] = data
+
+    async def delete(self, *, bucket_name: str, object_key: str) -> None:
+        self.objects.pop((bucket_name, object_key), None)
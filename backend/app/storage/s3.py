@@ -0,0 +1,157 @@
+import asyncio
+
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta, timezone
+from functools import partial
+from typing import Any, Callable, TypeVar
+
+import boto3
+import botocore
+
+from botocore.auth import SIGV4_TIMESTAMP, S3SigV4QueryAuth
+from botocore.awsrequest import AWSRequest
+from botocore.config import Config
+from botocore.exceptions import NoCredentialsError
+
+T = TypeVar("T")
+
+
+class _SignedAtQueryAuth(S3SigV4QueryAuth):  # type: ignore
+    """botocore's presigned url signer, signing as of `signed_at` instead of
+    now"""
+
+    def __init__(
+        self,
+        credentials: Any,
+        region_name: str,
+        expires: int,
+        signed_at: datetime,
+    ) -> None:
+        super().__init__(credentials, "s3", region_name, expires=expires)
+        self._timestamp = signed_at.astimezone(timezone.utc).strftime(SIGV4_TIMESTAMP)
+
+    def _modify_request_before_signing(self, request: AWSRequest) -> None:
+        # add_auth has just stamped the request with the current time
+        request.context["timestamp"] = self._timestamp
+        super()._modify_request_before_signing(request)
+
+
+class S3Storage:
+    """boto3 is blocking (credential refreshes and deletes are network calls),
+    so every call runs on a dedicated thread pool. The client is thread safe
+    and shared by the pool"""
+
+    def __init__(self, max_threads: int) -> None:
+        session = boto3.Session()
+        self.client = session.client("s3")
+        # only builds the urls, with the endpoint and addressing style botocore
+        # picks for the bucket, they are signed by _SignedAtQueryAuth
+        self._url_client = session.client(
+            "s3", config=Config(signature_version=botocore.UNSIGNED)
+        )
+        self._credentials = session.get_credentials()
+        self._executor = ThreadPoolExecutor(
+            max_workers=max_threads, thread_name_prefix="s3"
+        )
+
+    async def _run(self, fn: Callable[..., T], *args: Any, **kwargs: Any) -> T:
+        return await asyncio.get_running_loop().run_in_executor(
+            self._executor, partial(fn, *args, **kwargs)
+        )
+
+    def _presign_get(
+        self,
+        bucket_name: str,
+        object_keys: list[str],
+        expire_in_secs: int,
+        signed_at: datetime,
+    ) -> tuple[list[str], datetime]:
+        if self._credentials is None:
+            raise NoCredentialsError()
+        # may refresh temporary credentials, a network call
+        credentials = self._credentials.get_frozen_credentials()
+        auth = _SignedAtQueryAuth(
+            credentials,
+            self._url_client.meta.region_name,
+            expire_in_secs,
+            signed_at,
+        )
+
+        urls = []
+        for object_key in object_keys:
+            request = AWSRequest(
+                method="GET",
+                url=self._url_client.generate_presigned_url(
+                    "get_object", Params={"Bucket": bucket_name, "Key": object_key}
+                ),
+            )
+            auth.add_auth(request)
+            urls.append(request.url)
+
+        valid_until = signed_at + timedelta(seconds=expire_in_secs)
+        # urls signed with temporary credentials stop working when they expire
+        credentials_expire_at: datetime | None = getattr(
+            self._credentials, "_expiry_time", None
+        )
+        if credentials_expire_at is not None:
+            valid_until = min(valid_until, credentials_expire_at)
+        return urls, valid_until
+
+    async def presign_get(
+        self,
+        *,
+        bucket_name: str,
+        object_keys: list[str],
+        expire_in_secs: int,
+        signed_at: datetime,
+    ) -> tuple[list[str], datetime]:
+        # one hop to the pool for the whole batch, signing itself is cheap
+        return await self._run(
+            self._presign_get, bucket_name, object_keys, expire_in_secs, signed_at
+        )
+
+    async def presign_post(
+        self,
+        *,
+        bucket_name: str,
+        object_key: str,
+        fields: dict[str, str],
+        conditions: list[Any],
+        expire_in_secs: int,
+    ) -> dict[str, Any]:
+        return await self._run(
+            self.client.generate_presigned_post,
+            Bucket=bucket_name,
+            Key=object_key,
+            Fields=fields,
+            Conditions=conditions,
+            ExpiresIn=expire_in_secs,
+        )
+
+    def _get(self, bucket_name: str, object_key: str) -> bytes:
+        response = self.client.get_object(Bucket=bucket_name, Key=object_key)
+        return response["Body"].read()  # type: ignore
+
+    async def get(self, *, bucket_name: str, object_key: str) -> bytes:
+        return await self._run(self._get, bucket_name, object_key)
+
+    async def put(
+        self,
+        *,
+        bucket_name: str,
+        object_key: str,
+        data: bytes,
+        content_type: str,
+        cache_control: str,
+    ) -> None:
+        await self._run(
+            self.client.put_object,
+            Bucket=bucket_name,
+            Key=object_key,
+            Body=data,
+            ContentType=content_type,
+            CacheControl=cache_control,
+        )
+
+    async def delete(self, *, bucket_name: str, object_key: str) -> None:
+        await self._run(self.client.delete_object, Bucket=bucket_name, Key=object_key)
@@ -0,0 +1,54 @@
+import asyncio
+import io
+
+from PIL import Image, ImageOps
+
+from app.core.config import settings
+from app.storage.base import IMMUTABLE_CACHE_CONTROL, ObjectStorage
+
+
+def thumbnail_key(object_key: str, size: int) -> str:
+    return f"{object_key}.{size}.webp"
+
+
+def display_photo_key(object_key: str | None, has_thumbnails: bool) -> str | None:
+    """The object lists show for a photo: its thumbnail once it's made"""
+    if object_key and has_thumbnails:
+        return thumbnail_key(object_key, settings.PHOTO_THUMBNAIL_LIST_SIZE)
+    return object_key
+
+
+def make_thumbnails(data: bytes, sizes: list[int]) -> dict[int, bytes]:
+    """{size: square WebP of the image, center cropped}"""
+    with Image.open(io.BytesIO(data)) as image:
+        # phones store rotation in EXIF, browsers apply it
+        image = ImageOps.exif_transpose(image).convert("RGB")
+
+        thumbnails = {}
+        for size in sizes:
+            thumbnail = ImageOps.fit(image, (size, size), Image.Resampling.LANCZOS)
+            out = io.BytesIO()
+            thumbnail.save(out, format="WEBP", quality=80, method=4)
+            thumbnails[size] = out.getvalue()
+
+    return thumbnails
+
+
+async def generate_thumbnails(
+    storage: ObjectStorage, *, bucket_name: str, object_key: str, sizes: list[int]
+) -> None:
+    data = await storage.get(bucket_name=bucket_name, object_key=object_key)
+    # decoding and resizing a 5 MB JPEG takes a while, Pillow releases the GIL
+    thumbnails = await asyncio.to_thread(make_thumbnails, data, sizes)
+    await asyncio.gather(
+        *(
+            storage.put(
+                bucket_name=bucket_name,
+                object_key=thumbnail_key(object_key, size),
+                data=thumbnail,
+                content_type="image/webp",
+                cache_control=IMMUTABLE_CACHE_CONTROL,
+            )
+            for size, thumbnail in thumbnails.items()
+        )
+    )
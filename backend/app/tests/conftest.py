@@ -1,9 +1,11 @@
 import pytest
+import redis.asyncio as redis
 from typing import AsyncGenerator
 from faker import Faker
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from app.api.dependencies import get_db
+from app.core.config import settings
 
 
 # specifies pytest to use asyncio for anyio markers
@@ -26,3 +28,16 @@ def faker() -> Faker:
 async def db() -> AsyncGenerator[AsyncSession, None]:
     async for session in get_db():  # iteratoring over the generator and returning individual elems
         yield session
+
+
+@pytest.fixture
+async def redis_client() -> AsyncGenerator[redis.Redis, None]:
+    client = redis.Redis(
+        host=settings.REDIS_HOST,
+        port=settings.REDIS_PORT,
+        decode_responses=True,
+        ssl=settings.REDIS_SSL,
+        password=settings.REDIS_PASSWORD,
+    )
+    yield client
+    await client.aclose()
@@ -1,12 +1,28 @@
 import pytest
 
+from datetime import datetime
+
 from faker import Faker
+from sqlalchemy import select
 from sqlalchemy.ext.asyncio import AsyncSession
 from fastapi.encoders import jsonable_encoder
 
 from app import crud
-from app.schemas import ConversationCreateDB, ConversationNameUpdate, Method
+from app.crud import crud_association, crud_inbox
+import redis.asyncio as redis
+
+from app.models import Translation, UserInbox
+from app.schemas import (
+    ConversationCreateDB,
+    ConversationNameUpdate,
+    MessageCreate,
+    MessageTranslationCreate,
+    Method,
+    TranslationCreate,
+)
+from app.utils.convo import generate_convo_identifier, hydrate_inbox
 from app.tests.utils.user import create_random_user_stochastic
+from app.tests.utils.utils import random_string
 
 
 @pytest.mark.anyio
@@ -51,6 +67,240 @@ async def test_delete_convo(db: AsyncSession) -> None:
     assert await crud.conversation.get(db=db, id=id) is None
 
 
+@pytest.mark.anyio
+async def test_get_user_convos_keyset(db: AsyncSession, faker: Faker) -> None:
+    user = await create_random_user_stochastic(db=db, faker=faker)
+    await db.flush()
+
+    convos = []
+    for hour in (4, 3, 2, 1):
+        convo = await crud.conversation.create(
+            db=db,
+            obj_in=ConversationCreateDB(
+                conversation_name="keyset",
+                is_group_chat=True,
+                chat_identifier=random_string(64),
+            ),
+        )
+        await db.flush()
+        await crud_association.associate_users_to_convo(
+            db=db,
+            member_associations=[{"user_id": user.id, "conversation_id": convo.id}],
+        )
+        await crud_inbox.record_message(
+            db=db,
+            convo_id=convo.id,
+            message_id=hour,
+            sent_at=datetime(2024, 4, 9, hour),
+        )
+        convos.append(convo)
+    await db.commit()
+
+    # most recent activity first. Pages come reversed
+    first_page = await crud.conversation.get_user_convos(
+        db=db, user_id=user.id, limit=2
+    )
+    assert [convo.id for convo in first_page] == [convos[1].id, convos[0].id]
+    assert first_page[0].unread_count == 0  # type: ignore
+
+    next_page = await crud.conversation.get_user_convos(
+        db=db,
+        user_id=user.id,
+        limit=2,
+        after=(first_page[0].last_activity_at, first_page[0].id),  # type: ignore
+    )
+    assert [convo.id for convo in next_page] == [convos[3].id, convos[2].id]
+
+
+@pytest.mark.anyio
+async def test_hydrate_inbox(
+    db: AsyncSession, faker: Faker, redis_client: redis.Redis
+) -> None:
+    reader = await create_random_user_stochastic(db=db, faker=faker)
+    sender = await create_random_user_stochastic(db=db, faker=faker)
+    direct_convo = await crud.conversation.create(
+        db=db,
+        obj_in=ConversationCreateDB(
+            conversation_name=None,
+            is_group_chat=False,
+            chat_identifier=generate_convo_identifier([reader.id, sender.id]),
+        ),
+    )
+    await db.flush()
+    await crud_association.associate_users_to_convo(
+        db=db,
+        member_associations=[
+            {"user_id": reader.id, "conversation_id": direct_convo.id},
+            {"user_id": sender.id, "conversation_id": direct_convo.id},
+        ],
+    )
+
+    message_id, sent_at = await crud.message.create_as_latest(
+        db=db,
+        obj_in=MessageCreate(
+            conversation_id=direct_convo.id,
+            sender_id=sender.id,
+            original_text="hola",
+            orig_language="spanish",
+        ),
+    )
+    await crud_inbox.record_message(
+        db=db, convo_id=direct_convo.id, message_id=message_id, sent_at=sent_at
+    )
+    await crud.message_translation.create_many(
+        db=db,
+        objs_in=[
+            MessageTranslationCreate(
+                message_id=message_id, language="english", translation="hello"
+            )
+        ],
+    )
+    await crud.translation.create_many(
+        db=db,
+        objs_in=[
+            TranslationCreate(
+                language="english",
+                target_user_id=reader.id,
+                message_id=message_id,
+                is_read=0,
+            )
+        ],
+    )
+    await crud_inbox.record_delivery(
+        db=db,
+        convo_id=direct_convo.id,
+        message_id=message_id,
+        sender_id=sender.id,
+        member_ids_by_text={"hello": [reader.id], "hola": [sender.id]},
+    )
+    await db.commit()
+
+    convos = await crud.conversation.get_user_convos(db=db, user_id=reader.id, limit=5)
+    await hydrate_inbox(
+        db=db, convos=convos, curr_user_id=reader.id, redis_client=redis_client
+    )
+
+    assert convos[-1].conversation_name == f"{sender.first_name} {sender.last_name}"
+    # set by hydrate_inbox
+    latest_message = convos[-1].latest_message  # type: ignore
+    assert latest_message.id == message_id
+    assert latest_message.relevant_translation == "hello"
+    assert latest_message.is_read == 0
+    assert convos[-1].unread_count == 1  # type: ignore
+
+    inbox = await db.get(UserInbox, (reader.id, direct_convo.id))
+    assert inbox
+    assert inbox.last_message_snippet == "hello"
+
+    await crud_inbox.add_unread(
+        db=db, user_id=reader.id, message_id=message_id, delta=-1
+    )
+    await db.commit()
+    await db.refresh(inbox)
+    assert inbox.unread_count == 0
+
+
+@pytest.mark.anyio
+async def test_mark_read(db: AsyncSession, faker: Faker) -> None:
+    reader = await create_random_user_stochastic(db=db, faker=faker)
+    sender = await create_random_user_stochastic(db=db, faker=faker)
+    convo = await crud.conversation.create(
+        db=db,
+        obj_in=ConversationCreateDB(
+            conversation_name="mark read",
+            is_group_chat=True,
+            chat_identifier=random_string(64),
+        ),
+    )
+    await db.flush()
+    await crud_association.associate_users_to_convo(
+        db=db,
+        member_associations=[
+            {"user_id": reader.id, "conversation_id": convo.id},
+            {"user_id": sender.id, "conversation_id": convo.id},
+        ],
+    )
+
+    message_ids = []
+    for text in ("uno", "dos", "tres"):
+        message_id, sent_at = await crud.message.create_as_latest(
+            db=db,
+            obj_in=MessageCreate(
+                conversation_id=convo.id,
+                sender_id=sender.id,
+                original_text=text,
+                orig_language="spanish",
+            ),
+        )
+        await crud_inbox.record_message(
+            db=db, convo_id=convo.id, message_id=message_id, sent_at=sent_at
+        )
+        await crud.translation.create_many(
+            db=db,
+            objs_in=[
+                TranslationCreate(
+                    language="spanish",
+                    target_user_id=reader.id,
+                    message_id=message_id,
+                    is_read=0,
+                )
+            ],
+        )
+        await crud_inbox.record_delivery(
+            db=db,
+            convo_id=convo.id,
+            message_id=message_id,
+            sender_id=sender.id,
+            member_ids_by_text={text: [reader.id, sender.id]},
+        )
+        message_ids.append(message_id)
+    await db.commit()
+
+    unread_count = await crud_inbox.mark_read(
+        db=db, user_id=reader.id, convo_id=convo.id, up_to_message_id=message_ids[1]
+    )
+    await db.commit()
+    assert unread_count == 1
+
+    async def read_states() -> list[tuple[int, int]]:
+        rows = await db.execute(
+            select(Translation.message_id, Translation.is_read)
+            .where(Translation.target_user_id == reader.id)
+            .order_by(Translation.message_id)
+        )
+        return [(message_id, is_read) for message_id, is_read in rows]
+
+    assert await read_states() == [
+        (message_ids[0], 1),
+        (message_ids[1], 1),
+        (message_ids[2], 0),
+    ]
+
+    # already read messages aren't counted twice
+    assert (
+        await crud_inbox.mark_read(
+            db=db,
+            user_id=reader.id,
+            convo_id=convo.id,
+            up_to_message_id=message_ids[1],
+        )
+        == 1
+    )
+
+    # after leaving, the copies the reader kept aren't touched
+    await crud_inbox.remove_member(db=db, convo_id=convo.id, user_id=reader.id)
+    assert (
+        await crud_inbox.mark_read(
+            db=db,
+            user_id=reader.id,
+            convo_id=convo.id,
+            up_to_message_id=message_ids[2],
+        )
+        is None
+    )
+    assert (await read_states())[2] == (message_ids[2], 0)
+
+
 @pytest.mark.anyio
 async def test_update_name(db: AsyncSession) -> None:
     conversation_name = "change conversation name"
@@ -1,10 +1,14 @@
 import pytest
 
+from datetime import datetime
+
 from faker import Faker
 from fastapi.encoders import jsonable_encoder
+from sqlalchemy import update
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from app import crud
+from app.models import Message
 from app.schemas import MessageCreate
 from app.tests.utils.user import create_random_user_stochastic
 from app.tests.utils.convo import create_random_convo
@@ -32,6 +36,100 @@ async def test_create_and_get_message(db: AsyncSession, faker: Faker) -> None:
     assert jsonable_encoder(created_msg) == jsonable_encoder(get_msg)
 
 
+@pytest.mark.anyio
+async def test_create_as_latest(db: AsyncSession, faker: Faker) -> None:
+    random_user = await create_random_user_stochastic(db=db, faker=faker)
+    random_convo = await create_random_convo(db=db)
+    await db.flush()
+
+    msg_schema = MessageCreate(
+        conversation_id=random_convo.id,
+        sender_id=random_user.id,
+        original_text="the latest message",
+        orig_language="english",
+    )
+
+    message_id, sent_at = await crud.message.create_as_latest(db=db, obj_in=msg_schema)
+    await db.commit()
+
+    get_msg = await crud.message.get(db=db, id=message_id)
+    assert get_msg
+    assert get_msg.sent_at == sent_at
+    assert get_msg.original_text == msg_schema.original_text
+
+    await db.refresh(random_convo)
+    assert random_convo.latest_message_id == message_id
+
+
+@pytest.mark.anyio
+async def test_get_chat_page(db: AsyncSession, faker: Faker) -> None:
+    reader = await create_random_user_stochastic(db=db, faker=faker)
+    other_user = await create_random_user_stochastic(db=db, faker=faker)
+    random_convo = await create_random_convo(db=db)
+    await db.flush()
+
+    message_ids = []
+    for text in ("first", "second", "third"):
+        message_id, _ = await crud.message.create_as_latest(
+            db=db,
+            obj_in=MessageCreate(
+                conversation_id=random_convo.id,
+                sender_id=reader.id,
+                original_text=text,
+                orig_language="english",
+            ),
+        )
+        message_ids.append(message_id)
+    # sent before the reader could see it, there's no copy for them
+    await crud.message.create_as_latest(
+        db=db,
+        obj_in=MessageCreate(
+            conversation_id=random_convo.id,
+            sender_id=other_user.id,
+            original_text="not for you",
+            orig_language="english",
+        ),
+    )
+    await db.commit()
+
+    page = await crud.message.get_chat_page(
+        db=db, convo_id=random_convo.id, user_id=reader.id, limit=2
+    )
+    assert [message.id for message, *_ in page] == message_ids[:0:-1]
+    assert page[0].first_name == reader.first_name
+
+    before = await crud.message.get_chat_page(
+        db=db,
+        convo_id=random_convo.id,
+        user_id=reader.id,
+        limit=2,
+        before=(page[-1][0].sent_at, page[-1][0].id),
+    )
+    assert [message.id for message, *_ in before] == message_ids[:1]
+
+    # messages sent in the same instant are told apart by id, none is skipped
+    await db.execute(
+        update(Message)
+        .where(Message.id.in_(message_ids))
+        .values(sent_at=datetime(2024, 4, 9, 12))
+    )
+    await db.commit()
+
+    page = await crud.message.get_chat_page(
+        db=db, convo_id=random_convo.id, user_id=reader.id, limit=2
+    )
+    assert [message.id for message, *_ in page] == message_ids[:0:-1]
+
+    before = await crud.message.get_chat_page(
+        db=db,
+        convo_id=random_convo.id,
+        user_id=reader.id,
+        limit=2,
+        before=(page[-1][0].sent_at, page[-1][0].id),
+    )
+    assert [message.id for message, *_ in before] == message_ids[:1]
+
+
 @pytest.mark.anyio
 async def test_delete_msg(db: AsyncSession, faker: Faker) -> None:
     random_user = await create_random_user_stochastic(db=db, faker=faker)
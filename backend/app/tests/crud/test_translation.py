@@ -3,7 +3,7 @@ import pytest
 from faker import Faker
 
 from app import crud
-from app.schemas import TranslationCreate
+from app.schemas import MessageTranslationCreate, TranslationCreate
 from fastapi.encoders import jsonable_encoder
 from sqlalchemy.ext.asyncio import AsyncSession
 
@@ -20,10 +20,10 @@ async def test_create_get_translation(db: AsyncSession, faker: Faker) -> None:
     await db.flush()
 
     translation_schema = TranslationCreate(
-        translation="me llamo Sam",
         language="spanish",
         target_user_id=target_user.id,
         message_id=sender_msg.id,
+        is_read=0,
     )
 
     created_translation = await crud.translation.create(
@@ -33,7 +33,7 @@ async def test_create_get_translation(db: AsyncSession, faker: Faker) -> None:
 
     get_translation = await crud.translation.get(db=db, id=created_translation.id)
     assert get_translation
-    assert get_translation.translation == created_translation.translation
+    assert get_translation.language == created_translation.language
     assert jsonable_encoder(get_translation) == jsonable_encoder(created_translation)
     assert (
         await get_translation.awaitable_attrs.message
@@ -41,6 +41,86 @@ async def test_create_get_translation(db: AsyncSession, faker: Faker) -> None:
     assert (await get_translation.awaitable_attrs.user).email == target_user.email
 
 
+@pytest.mark.anyio
+async def test_create_many_translations(db: AsyncSession, faker: Faker) -> None:
+    target_users = [
+        await create_random_user_stochastic(db=db, faker=faker) for _ in range(3)
+    ]
+    sender_msg = await create_random_message(
+        db=db, faker=faker, text="good morning", language="english"
+    )
+    await db.flush()
+
+    created = await crud.translation.create_many(
+        db=db,
+        objs_in=[
+            TranslationCreate(
+                language="spanish",
+                target_user_id=target_user.id,
+                message_id=sender_msg.id,
+                is_read=0,
+            )
+            for target_user in target_users
+        ],
+    )
+    await db.commit()
+
+    assert sorted(row.target_user_id for row in created) == sorted(
+        target_user.id for target_user in target_users
+    )
+    for row in created:
+        get_translation = await crud.translation.get(db=db, id=row.id)
+        assert get_translation
+        assert get_translation.target_user_id == row.target_user_id
+        assert get_translation.language == row.language == "spanish"
+
+
+@pytest.mark.anyio
+async def test_text_stored_once_per_language(db: AsyncSession, faker: Faker) -> None:
+    sender_msg = await create_random_message(
+        db=db, faker=faker, text="good night", language="english"
+    )
+    await db.flush()
+
+    assert await crud.message_translation.create_many(
+        db=db,
+        objs_in=[
+            MessageTranslationCreate(
+                message_id=sender_msg.id,
+                language="Spanish",
+                translation="buenas noches",
+            ),
+            MessageTranslationCreate(
+                message_id=sender_msg.id, language="french", translation="bonne nuit"
+            ),
+        ],
+    )
+    await db.commit()
+
+    texts = {
+        text.language: text.translation
+        for text in await sender_msg.awaitable_attrs.translated_texts
+    }
+    assert texts == {"spanish": "buenas noches", "french": "bonne nuit"}
+
+    # a redelivered job storing the message again is told it was already done
+    assert not await crud.message_translation.create_many(
+        db=db,
+        objs_in=[
+            MessageTranslationCreate(
+                message_id=sender_msg.id, language="french", translation="bonsoir"
+            )
+        ],
+    )
+    await db.rollback()
+
+    texts = {
+        text.language: text.translation
+        for text in await sender_msg.awaitable_attrs.translated_texts
+    }
+    assert texts["french"] == "bonne nuit"
+
+
 @pytest.mark.anyio
 async def test_delete_translation(db: AsyncSession, faker: Faker) -> None:
     target_user = await create_random_user_stochastic(db=db, faker=faker)
@@ -50,10 +130,10 @@ async def test_delete_translation(db: AsyncSession, faker: Faker) -> None:
     await db.flush()
 
     translation_schema = TranslationCreate(
-        translation="me llamo Sam",
         language="spanish",
         target_user_id=target_user.id,
         message_id=sender_msg.id,
+        is_read=0,
     )
 
     created_translation = await crud.translation.create(
@@ -0,0 +1,22 @@
+from datetime import datetime
+
+import pytest
+
+from app.utils.cursor import convo_cursor_key, encode_cursor, message_cursor_key
+
+
+def test_cursor_round_trip() -> None:
+    sent_at = datetime(2024, 4, 4, 17, 10, 41, 902315)
+    cursor = encode_cursor(sent_at, 12)
+
+    assert "=" not in cursor
+    assert message_cursor_key(cursor) == (sent_at, 12)
+    assert convo_cursor_key(encode_cursor(sent_at, 3)) == (sent_at, 3)
+
+
+@pytest.mark.parametrize(
+    "cursor", ["", "not a cursor", encode_cursor(12), encode_cursor("yesterday", 1)]
+)
+def test_invalid_cursor_rejected(cursor: str) -> None:
+    with pytest.raises(ValueError):
+        message_cursor_key(cursor)
@@ -0,0 +1,57 @@
+import asyncio
+
+from datetime import datetime, timedelta
+
+import pytest
+
+from app import models
+from app.api.api_v1.endpoints.websocket import ConnectionCache, rlistener
+from app.utils import envelope
+from app.utils.pubsub import Subscriber
+
+
+class FakeWebSocket:
+    def __init__(self) -> None:
+        self.sent: list[str] = []
+        self.close_code: int | None = None
+
+    async def send_text(self, data: str) -> None:
+        self.sent.append(data)
+
+    async def close(self, code: int) -> None:
+        self.close_code = code
+
+
+def _cache(pwd_changed: datetime) -> ConnectionCache:
+    return ConnectionCache(models.User(id=7, pwd_changed=pwd_changed), [1])
+
+
+async def _listen(cache: ConnectionCache, *raws: str) -> FakeWebSocket:
+    websocket = FakeWebSocket()
+    subscriber = Subscriber(max_queued=10)
+    for raw in raws:
+        subscriber._push("7", raw)
+
+    task = asyncio.create_task(rlistener(websocket, None, subscriber, cache, 1))  # type: ignore
+    await asyncio.sleep(0.05)
+    task.cancel()
+    try:
+        await task
+    except asyncio.CancelledError:
+        pass
+    return websocket
+
+
+@pytest.mark.anyio
+async def test_password_change_closes_older_connections() -> None:
+    changed_at = datetime(2024, 1, 1)
+    event = envelope.envelope(
+        "password_changed", {"pwd_changed": changed_at.isoformat()}
+    )
+
+    authed_before = _cache(changed_at - timedelta(minutes=5))
+    assert (await _listen(authed_before, event)).close_code == 1008
+
+    # reconnected with the new password
+    authed_after = _cache(changed_at)
+    assert (await _listen(authed_after, event)).close_code is None
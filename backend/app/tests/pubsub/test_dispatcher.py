@@ -0,0 +1,59 @@
+import asyncio
+import uuid
+
+import pytest
+import redis.asyncio as redis
+
+from app.utils.pubsub import PubSubDispatcher, SubscriberOverflow
+
+
+async def _next(subscriber) -> tuple[str, str]:  # type: ignore
+    return await asyncio.wait_for(subscriber.get(), timeout=2)
+
+
+@pytest.mark.anyio
+async def test_shared_subscriptions_are_refcounted(redis_client: redis.Redis) -> None:
+    channel = f"test_{uuid.uuid4().hex}"
+    dispatcher = PubSubDispatcher(redis_client, max_queued_per_subscriber=10)
+    await dispatcher.start()
+
+    try:
+        async with dispatcher.connect() as first, dispatcher.connect() as second:
+            await dispatcher.subscribe(first, channel)
+            await dispatcher.subscribe(second, channel)
+
+            await redis_client.publish(channel, "hello")
+            assert await _next(first) == (channel, "hello")
+            assert await _next(second) == (channel, "hello")
+
+            # the channel stays subscribed while someone still wants it
+            await dispatcher.unsubscribe(first, channel)
+            await redis_client.publish(channel, "again")
+            assert await _next(second) == (channel, "again")
+            assert first.queue.empty()
+
+        # nobody left, the shared connection unsubscribed
+        assert await redis_client.pubsub_numsub(channel) == [(channel, 0)]
+    finally:
+        await dispatcher.stop()
+
+
+@pytest.mark.anyio
+async def test_slow_subscriber_is_cut_off(redis_client: redis.Redis) -> None:
+    channel = f"test_{uuid.uuid4().hex}"
+    dispatcher = PubSubDispatcher(redis_client, max_queued_per_subscriber=2)
+    await dispatcher.start()
+
+    try:
+        async with dispatcher.connect() as slow, dispatcher.connect() as fast:
+            await dispatcher.subscribe(slow, channel)
+            await dispatcher.subscribe(fast, channel)
+
+            for i in range(3):
+                await redis_client.publish(channel, str(i))
+                assert await _next(fast) == (channel, str(i))
+
+            with pytest.raises(SubscriberOverflow):
+                await slow.get()
+    finally:
+        await dispatcher.stop()
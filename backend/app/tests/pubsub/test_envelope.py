@@ -0,0 +1,41 @@
+import json
+
+from app.utils import envelope
+
+
+def test_envelope_round_trip() -> None:
+    raw = envelope.envelope("message_delta", {"stream_id": "abc", "delta": "ho\tla"})
+
+    msg_type, frame = envelope.unpack(raw)
+    assert msg_type == "message_delta"
+    # clients get the plain websocket frame
+    assert json.loads(frame) == {
+        "type": "message_delta",
+        "data": {"stream_id": "abc", "delta": "ho\tla"},
+    }
+
+
+def test_unpack_bare_json_frame() -> None:
+    frame = json.dumps({"type": "add_self", "data": {"convo_id": 3}})
+    assert envelope.unpack(frame) == ("add_self", frame)
+
+
+def test_splice_matches_full_serialization() -> None:
+    shared = {"original_text": 'say "hi"', "new_presigned": None}
+
+    spliced = envelope.splice(
+        envelope.dumps(shared), translation_id=12, target_user_id=5, note="é"
+    )
+    assert json.loads(spliced) == {
+        **shared,
+        "translation_id": 12,
+        "target_user_id": 5,
+        "note": "é",
+    }
+    assert json.loads(envelope.splice("{}", translation_id=1)) == {"translation_id": 1}
+    assert envelope.splice('{"a":1}') == '{"a":1}'
+
+
+def test_int_keys_serialized_like_json() -> None:
+    members = {"members": {3: {"first_name": "Ana"}}}
+    assert envelope.loads(envelope.dumps(members)) == json.loads(json.dumps(members))
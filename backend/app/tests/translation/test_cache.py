@@ -0,0 +1,60 @@
+from app.translation.cache import make_cache_key
+
+
+def test_cache_key_normalizes_text() -> None:
+    key = make_cache_key(
+        text="see you  tomorrow ",
+        source_language="english",
+        target_language="spanish",
+        chat_history=[],
+        engine="gpt-4",
+    )
+    assert key == make_cache_key(
+        text="see you tomorrow",
+        source_language="English",
+        target_language="spanish",
+        chat_history=[],
+        engine="gpt-4",
+    )
+    assert key != make_cache_key(
+        text="see you tomorrow",
+        source_language="english",
+        target_language="french",
+        chat_history=[],
+        engine="gpt-4",
+    )
+
+
+def test_cache_key_context() -> None:
+    history_a = [(1, "are you coming to the party?")]
+    history_b = [(2, "did you finish the report?")]
+
+    # short messages ignore the chat history
+    assert make_cache_key(
+        text="ok",
+        source_language="english",
+        target_language="spanish",
+        chat_history=history_a,
+        engine="gpt-4",
+    ) == make_cache_key(
+        text="ok",
+        source_language="english",
+        target_language="spanish",
+        chat_history=history_b,
+        engine="gpt-4",
+    )
+
+    long_text = "I'll bring it over to your place later tonight"
+    assert make_cache_key(
+        text=long_text,
+        source_language="english",
+        target_language="spanish",
+        chat_history=history_a,
+        engine="gpt-4",
+    ) != make_cache_key(
+        text=long_text,
+        source_language="english",
+        target_language="spanish",
+        chat_history=history_b,
+        engine="gpt-4",
+    )
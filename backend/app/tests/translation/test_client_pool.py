@@ -0,0 +1,72 @@
+import httpx
+import pytest
+
+import openai
+from openai import AsyncOpenAI
+
+from app.core.config import settings
+from app.translation.client_pool import OpenAIClientPool, with_retries
+
+
+async def _get(pool: OpenAIClientPool, api_key: str) -> AsyncOpenAI:
+    async with pool.lease(api_key) as client:
+        return client
+
+
+@pytest.mark.anyio
+async def test_client_pool_reuses_and_evicts() -> None:
+    pool = OpenAIClientPool(max_clients=2, idle_secs=600)
+
+    client_a = await _get(pool, "sk-a")
+    assert await _get(pool, "sk-a") is client_a
+
+    await _get(pool, "sk-b")
+    await _get(pool, "sk-c")  # pushes out the least recently used key (sk-a)
+
+    assert await _get(pool, "sk-a") is not client_a
+    assert client_a.is_closed()
+
+    await pool.aclose()
+
+
+@pytest.mark.anyio
+async def test_client_pool_closes_leased_client_once_released() -> None:
+    pool = OpenAIClientPool(max_clients=1, idle_secs=0)
+
+    async with pool.lease("sk-a") as client_a:
+        # evicted while a request (e.g. a stream) is still using it
+        await _get(pool, "sk-b")
+        assert not client_a.is_closed()
+
+    assert client_a.is_closed()
+
+    await pool.aclose()
+
+
+@pytest.mark.anyio
+async def test_with_retries(monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.setattr(settings, "OPENAI_RETRY_BASE_DELAY_SECS", 0.001)
+    request = httpx.Request("POST", "https://api.openai.com/v1/chat/completions")
+    calls = 0
+
+    async def flaky() -> str:
+        nonlocal calls
+        calls += 1
+        if calls < 3:
+            raise openai.APIConnectionError(request=request)
+        return "ok"
+
+    assert await with_retries(flaky) == "ok"
+    assert calls == 3
+
+    async def unauthorized() -> str:
+        nonlocal calls
+        calls += 1
+        raise openai.AuthenticationError(
+            "invalid key", response=httpx.Response(401, request=request), body=None
+        )
+
+    calls = 0
+    with pytest.raises(openai.AuthenticationError):
+        await with_retries(unauthorized)
+    assert calls == 1
@@ -0,0 +1,14 @@
+from app.translation.context import estimate_tokens, trim_to_token_budget
+
+
+def test_trim_to_token_budget() -> None:
+    history = [(1, "a" * 400), (2, "b" * 40), (1, "c" * 40)]
+
+    # everything fits
+    assert trim_to_token_budget(history, 1000) == history
+
+    # the oldest turns are dropped first, order is kept
+    budget = estimate_tokens("b" * 40) + estimate_tokens("c" * 40)
+    assert trim_to_token_budget(history, budget) == history[1:]
+
+    assert trim_to_token_budget(history, 0) == []
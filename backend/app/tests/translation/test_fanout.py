@@ -0,0 +1,219 @@
+import asyncio
+from typing import AsyncIterator
+import pytest
+
+import openai
+
+from app.core.config import settings
+from app.translation import fanout
+from app.translation.gpt import parse_batch_response
+
+
+class FakeEngine:
+    name = "fake"
+    version = "1"
+
+    def __init__(self) -> None:
+        self.calls = 0
+        self.batch_calls = 0
+
+    async def translate(
+        self,
+        *,
+        sender_id: int,
+        text_input: str,
+        target_language: str,
+        chat_history: list[tuple[int, str]],
+        api_key: str,
+    ) -> str | None:
+        self.calls += 1
+        await asyncio.sleep(0.2)
+        if target_language == "klingon":
+            raise openai.OpenAIError("unsupported language")
+        return f"[{target_language}] {text_input}"
+
+    async def translate_batch(
+        self,
+        *,
+        sender_id: int,
+        text_input: str,
+        target_languages: list[str],
+        chat_history: list[tuple[int, str]],
+        api_key: str,
+    ) -> dict[str, str]:
+        self.batch_calls += 1
+        if "klingon" in target_languages:
+            raise ValueError("Batch translation is not valid JSON")
+        # pretend the model forgot german
+        return {
+            language: f"[{language}] {text_input}"
+            for language in target_languages
+            if language != "german"
+        }
+
+    async def translate_stream(
+        self,
+        *,
+        sender_id: int,
+        text_input: str,
+        target_language: str,
+        chat_history: list[tuple[int, str]],
+        api_key: str,
+    ) -> AsyncIterator[str]:
+        for token in ["hola", " ", "mundo"]:
+            yield token
+
+
+@pytest.mark.anyio
+async def test_translate_languages_concurrently(
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    monkeypatch.setattr(settings, "TRANSLATION_BATCH_ENABLED", False)
+
+    start = asyncio.get_running_loop().time()
+    translations, failures = await fanout.translate_languages(
+        convo_id=1,
+        sender_id=1,
+        text_input="hello",
+        source_language="english",
+        target_languages=["spanish", "french", "german", "spanish"],
+        chat_history=[],
+        api_key="sk-test",
+        engine=FakeEngine(),
+    )
+    elapsed = asyncio.get_running_loop().time() - start
+
+    assert translations == {
+        "spanish": "[spanish] hello",
+        "french": "[french] hello",
+        "german": "[german] hello",
+    }
+    assert failures == {}
+    # bounded by the slowest translation, not the sum of all of them
+    assert elapsed < 0.5
+
+
+@pytest.mark.anyio
+async def test_translate_languages_partial_failure(
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    monkeypatch.setattr(
+        settings, "TRANSLATION_PARTIAL_FAILURE_POLICY", "fallback_original"
+    )
+
+    translations, failures = await fanout.translate_languages(
+        convo_id=1,
+        sender_id=1,
+        text_input="hello",
+        source_language="english",
+        target_languages=["spanish", "klingon"],
+        chat_history=[],
+        api_key="sk-test",
+        engine=FakeEngine(),
+    )
+
+    assert translations == {"spanish": "[spanish] hello", "klingon": "hello"}
+    assert list(failures) == ["klingon"]
+
+    monkeypatch.setattr(settings, "TRANSLATION_PARTIAL_FAILURE_POLICY", "abort")
+    with pytest.raises(openai.OpenAIError):
+        await fanout.translate_languages(
+            convo_id=1,
+            sender_id=1,
+            text_input="hello",
+            source_language="english",
+            target_languages=["spanish", "klingon"],
+            chat_history=[],
+            api_key="sk-test",
+            engine=FakeEngine(),
+        )
+
+
+@pytest.mark.anyio
+async def test_translate_languages_streaming() -> None:
+    deltas: list[tuple[str, str]] = []
+
+    async def on_delta(language: str, delta: str) -> None:
+        deltas.append((language, delta))
+
+    translations, _ = await fanout.translate_languages(
+        convo_id=1,
+        sender_id=1,
+        text_input="hello world",
+        source_language="english",
+        target_languages=["spanish"],
+        chat_history=[],
+        api_key="sk-test",
+        on_delta=on_delta,
+        engine=FakeEngine(),
+    )
+
+    assert translations == {"spanish": "hola mundo"}
+    assert "".join(delta for _, delta in deltas) == "hola mundo"
+
+
+@pytest.mark.anyio
+async def test_translate_languages_batch(monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.setattr(settings, "TRANSLATION_BATCH_ENABLED", True)
+    engine = FakeEngine()
+
+    translations, failures = await fanout.translate_languages(
+        convo_id=1,
+        sender_id=1,
+        text_input="hello",
+        source_language="english",
+        target_languages=["spanish", "french", "german"],
+        chat_history=[],
+        api_key="sk-test",
+        engine=engine,
+    )
+
+    assert engine.batch_calls == 1
+    # german was missing from the batch answer and got its own call
+    assert translations == {
+        "spanish": "[spanish] hello",
+        "french": "[french] hello",
+        "german": "[german] hello",
+    }
+    assert failures == {}
+
+
+@pytest.mark.anyio
+async def test_identical_requests_coalesced(monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.setattr(settings, "TRANSLATION_BATCH_ENABLED", False)
+    engine = FakeEngine()
+
+    def send(api_key: str):  # type: ignore
+        return fanout.translate_languages(
+            convo_id=1,
+            sender_id=1,
+            text_input="see you soon",
+            source_language="english",
+            target_languages=["spanish"],
+            chat_history=[],
+            api_key=api_key,
+            engine=engine,
+        )
+
+    # a resend while the first is still translating shares its model call
+    first, resent, other_key = await asyncio.gather(
+        send("sk-test"), send("sk-test"), send("sk-other")
+    )
+
+    assert first == resent == other_key
+    assert first[0] == {"spanish": "[spanish] see you soon"}
+    # never shared across API keys, the call is billed to one of them
+    assert engine.calls == 2
+
+
+def test_parse_batch_response() -> None:
+    languages = ["spanish", "french"]
+
+    assert parse_batch_response('{"spanish": "hola", "french": ""}', languages) == {
+        "spanish": "hola"
+    }
+
+    with pytest.raises(ValueError):
+        parse_batch_response("hola", languages)
+    with pytest.raises(ValueError):
+        parse_batch_response('["hola"]', languages)
@@ -0,0 +1,56 @@
+import pytest
+
+from app.core.config import settings
+from app.translation import registry
+from app.translation.local import LocalEngine
+
+
+@pytest.mark.anyio
+async def test_local_engine() -> None:
+    engine = LocalEngine()
+
+    assert (
+        await engine.translate(
+            sender_id=1,
+            text_input="Thanks!",
+            target_language="spanish",
+            chat_history=[],
+            api_key="",
+        )
+        == "gracias!"
+    )
+    assert (
+        await engine.translate(
+            sender_id=1,
+            text_input="how was  the trip?",
+            target_language="korean",
+            chat_history=[],
+            api_key="",
+        )
+        == "[korean] how was the trip?"
+    )
+
+    streamed = [
+        token
+        async for token in engine.translate_stream(
+            sender_id=1,
+            text_input="how was the trip?",
+            target_language="korean",
+            chat_history=[],
+            api_key="",
+        )
+    ]
+    assert "".join(streamed) == "[korean] how was the trip?"
+
+
+def test_engine_routing(monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.setattr(settings, "TRANSLATION_ENGINE", "gpt")
+    monkeypatch.setattr(settings, "TRANSLATION_ENGINE_BY_CONVO", {7: "local"})
+    monkeypatch.setattr(settings, "TRANSLATION_ENGINE_BY_USER", {3: "gpt-fast"})
+
+    assert registry.engine_for(convo_id=7, user_id=3).name == "local"
+    assert registry.engine_for(convo_id=1, user_id=3).name == "gpt-fast"
+    assert registry.engine_for(convo_id=1, user_id=1).name == "gpt"
+
+    with pytest.raises(ValueError):
+        registry.get_engine("does-not-exist")
@@ -0,0 +1,67 @@
+import uuid
+
+import pytest
+import redis.asyncio as redis
+
+from app.core.config import settings
+from app.exceptions import OpenAIRateLimitWaitException
+from app.translation.rate_limit import RateLimiter, _bucket_key
+
+
+@pytest.mark.anyio
+async def test_requests_over_limit_wait_then_give_up(
+    redis_client: redis.Redis, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    monkeypatch.setattr(settings, "OPENAI_RATE_LIMIT_MAX_WAIT_SECS", 1.0)
+    api_key = f"sk-{uuid.uuid4().hex}"
+    # 120 requests/min refills one request every 0.5s
+    limiter = RateLimiter(default_rpm=120, default_tpm=1_000_000)
+    limiter.bind(redis_client)
+
+    try:
+        for _ in range(120):
+            await limiter.acquire(api_key, tokens=10)
+
+        # empty bucket, waits for the next request to refill
+        await limiter.acquire(api_key, tokens=10)
+
+        monkeypatch.setattr(settings, "OPENAI_RATE_LIMIT_MAX_WAIT_SECS", 0.0)
+        with pytest.raises(OpenAIRateLimitWaitException):
+            await limiter.acquire(api_key, tokens=10)
+    finally:
+        await redis_client.delete(_bucket_key(api_key))
+
+
+@pytest.mark.anyio
+async def test_openai_headers_update_limits(
+    redis_client: redis.Redis, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    monkeypatch.setattr(settings, "OPENAI_RATE_LIMIT_MAX_WAIT_SECS", 0.0)
+    api_key = f"sk-{uuid.uuid4().hex}"
+    limiter = RateLimiter(default_rpm=500, default_tpm=1_000_000)
+    limiter.bind(redis_client)
+
+    try:
+        # OpenAI says this key has a much smaller token budget, all but used up
+        await limiter.observe(
+            api_key,
+            {
+                "x-ratelimit-limit-requests": "500",
+                "x-ratelimit-limit-tokens": "10000",
+                "x-ratelimit-remaining-requests": "499",
+                "x-ratelimit-remaining-tokens": "50",
+            },
+        )
+
+        await limiter.acquire(api_key, tokens=40)
+        with pytest.raises(OpenAIRateLimitWaitException):
+            await limiter.acquire(api_key, tokens=2000)
+    finally:
+        await redis_client.delete(_bucket_key(api_key))
+
+
+@pytest.mark.anyio
+async def test_unbound_limiter_does_nothing() -> None:
+    limiter = RateLimiter(default_rpm=1, default_tpm=1)
+    for _ in range(3):
+        await limiter.acquire("sk-test", tokens=100)
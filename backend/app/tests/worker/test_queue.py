@@ -0,0 +1,100 @@
+import uuid
+
+from typing import Any, AsyncGenerator
+
+import pytest
+import redis.asyncio as redis
+
+from app.worker.queue import JobFailed, StreamQueue
+
+
+@pytest.fixture
+async def queue(redis_client: redis.Redis) -> AsyncGenerator[StreamQueue, None]:
+    stream = f"test_jobs:{uuid.uuid4().hex}"
+    queue = StreamQueue(
+        stream=stream,
+        group="test_workers",
+        dead_letter_stream=f"{stream}:dead",
+        max_attempts=2,
+        visibility_timeout_secs=60,
+        retry_delay_secs=0,
+        maxlen=1000,
+    )
+    await queue.ensure_group(redis_client)
+    yield queue
+    await redis_client.delete(queue.stream, queue.dead_letter_stream)
+
+
+async def _read_one(
+    redis_client: redis.Redis, queue: StreamQueue
+) -> tuple[str, dict[str, str]]:
+    response = await redis_client.xreadgroup(
+        queue.group, "tester", {queue.stream: ">"}, count=1
+    )
+    entry: tuple[str, dict[str, str]] = response[0][1][0]
+    return entry
+
+
+@pytest.mark.anyio
+async def test_job_acked_on_success(
+    redis_client: redis.Redis, queue: StreamQueue
+) -> None:
+    handled: list[dict[str, Any]] = []
+
+    async def handler(job: dict[str, Any]) -> None:
+        handled.append(job)
+
+    await queue.enqueue(redis_client, {"message_id": 1})
+    entry_id, fields = await _read_one(redis_client, queue)
+    await queue._process(redis_client, entry_id, fields, 1, handler, None)
+
+    assert handled == [{"message_id": 1}]
+    assert await redis_client.xlen(queue.stream) == 0
+    assert (await redis_client.xpending(queue.stream, queue.group))["pending"] == 0
+
+
+@pytest.mark.anyio
+async def test_failed_job_retried_then_dead_lettered(
+    redis_client: redis.Redis, queue: StreamQueue
+) -> None:
+    failures: list[BaseException] = []
+
+    async def handler(job: dict[str, Any]) -> None:
+        raise RuntimeError("model unavailable")
+
+    async def on_failure(job: dict[str, Any], error: BaseException) -> None:
+        failures.append(error)
+
+    await queue.enqueue(redis_client, {"message_id": 1})
+
+    # first attempt fails, the job is queued again as attempt 2
+    entry_id, fields = await _read_one(redis_client, queue)
+    await queue._process(redis_client, entry_id, fields, 1, handler, on_failure)
+    assert not failures
+
+    entry_id, fields = await _read_one(redis_client, queue)
+    assert fields["attempt"] == "2"
+
+    # out of attempts
+    await queue._process(redis_client, entry_id, fields, 2, handler, on_failure)
+    assert len(failures) == 1
+    assert await redis_client.xlen(queue.stream) == 0
+
+    dead = await redis_client.xrange(queue.dead_letter_stream)
+    assert len(dead) == 1
+    assert dead[0][1]["error"] == "RuntimeError: model unavailable"
+
+
+@pytest.mark.anyio
+async def test_job_failed_is_not_retried(
+    redis_client: redis.Redis, queue: StreamQueue
+) -> None:
+    async def handler(job: dict[str, Any]) -> None:
+        raise JobFailed("invalid API key")
+
+    await queue.enqueue(redis_client, {"message_id": 1})
+    entry_id, fields = await _read_one(redis_client, queue)
+    await queue._process(redis_client, entry_id, fields, 1, handler, None)
+
+    assert await redis_client.xlen(queue.stream) == 0
+    assert await redis_client.xlen(queue.dead_letter_stream) == 1
@@ -0,0 +1,111 @@
+import io
+
+import pytest
+import redis.asyncio as redis
+
+from PIL import Image
+
+from app.core.config import settings
+from app.storage.memory import MemoryStorage
+from app.storage.thumbnails import (
+    display_photo_key,
+    generate_thumbnails,
+    thumbnail_key,
+)
+from app.utils.aws import delete_photo
+from app.worker.storage_worker import (
+    enqueue_delete,
+    handle_storage_job,
+    storage_queue,
+)
+
+
+@pytest.mark.anyio
+async def test_delete_runs_in_background(redis_client: redis.Redis) -> None:
+    storage = MemoryStorage()
+    storage.objects[("bucket", "chat/1/photo.jpg")] = b"jpeg"
+    await storage_queue.ensure_group(redis_client)
+
+    await enqueue_delete(
+        redis_client, bucket_name="bucket", object_key="chat/1/photo.jpg"
+    )
+    # nothing is deleted until a worker takes the job
+    assert ("bucket", "chat/1/photo.jpg") in storage.objects
+
+    response = await redis_client.xreadgroup(
+        storage_queue.group, "tester", {storage_queue.stream: ">"}, count=1
+    )
+    entry_id, fields = response[0][1][0]
+    await storage_queue._process(
+        redis_client,
+        entry_id,
+        fields,
+        1,
+        lambda job: handle_storage_job(storage, job),
+        None,
+    )
+
+    assert not storage.objects
+    assert await redis_client.xlen(storage_queue.stream) == 0
+
+
+@pytest.mark.anyio
+async def test_replaced_photo_deleted_with_thumbnails(
+    redis_client: redis.Redis,
+) -> None:
+    storage = MemoryStorage()
+    object_key = "user/1/abc/profile-pic.jpg"
+    keys = [
+        object_key,
+        *(thumbnail_key(object_key, size) for size in settings.PHOTO_THUMBNAIL_SIZES),
+    ]
+    for key in keys:
+        storage.objects[("bucket", key)] = b"image"
+    await storage_queue.ensure_group(redis_client)
+
+    await delete_photo(
+        bucket_name="bucket", object_key=object_key, redis_client=redis_client
+    )
+
+    response = await redis_client.xreadgroup(
+        storage_queue.group, "tester", {storage_queue.stream: ">"}, count=len(keys)
+    )
+    for entry_id, fields in response[0][1]:
+        await storage_queue._process(
+            redis_client,
+            entry_id,
+            fields,
+            1,
+            lambda job: handle_storage_job(storage, job),
+            None,
+        )
+
+    assert not storage.objects
+
+
+@pytest.mark.anyio
+async def test_thumbnails_generated() -> None:
+    storage = MemoryStorage()
+    photo = io.BytesIO()
+    Image.new("RGB", (800, 600), "red").save(photo, format="JPEG")
+    storage.objects[("bucket", "user/1/abc/profile-pic.jpg")] = photo.getvalue()
+
+    await generate_thumbnails(
+        storage,
+        bucket_name="bucket",
+        object_key="user/1/abc/profile-pic.jpg",
+        sizes=[64, 256],
+    )
+
+    for size in (64, 256):
+        data = storage.objects[
+            ("bucket", thumbnail_key("user/1/abc/profile-pic.jpg", size))
+        ]
+        with Image.open(io.BytesIO(data)) as thumbnail:
+            assert thumbnail.format == "WEBP"
+            assert thumbnail.size == (size, size)
+
+    assert display_photo_key("user/1/abc/profile-pic.jpg", False) == (
+        "user/1/abc/profile-pic.jpg"
+    )
+    assert display_photo_key(None, True) is None
@@ -1 +1,8 @@
+from . import client_pool
+from . import cache
+from . import context
+from . import rate_limit
 from . import gpt
+from . import local
+from . import registry
+from . import fanout
@@ -0,0 +1,44 @@
+from typing import AsyncIterator, Protocol
+
+
+class TranslationEngine(Protocol):
+    """What the send pipeline needs from a translation backend"""
+
+    # registry name, used for routing in Settings
+    name: str
+    # changes whenever the same input could translate differently (e.g. a new
+    # model), so cached translations of an older version aren't reused
+    version: str
+
+    async def translate(
+        self,
+        *,
+        sender_id: int,
+        text_input: str,
+        target_language: str,
+        chat_history: list[tuple[int, str]],
+        api_key: str,
+    ) -> str | None: ...
+
+    def translate_stream(
+        self,
+        *,
+        sender_id: int,
+        text_input: str,
+        target_language: str,
+        chat_history: list[tuple[int, str]],
+        api_key: str,
+    ) -> AsyncIterator[str]: ...
+
+    async def translate_batch(
+        self,
+        *,
+        sender_id: int,
+        text_input: str,
+        target_languages: list[str],
+        chat_history: list[tuple[int, str]],
+        api_key: str,
+    ) -> dict[str, str]:
+        """All target languages in one call. Languages missing from the result
+        are translated one by one by the caller"""
+        ...
@@ -0,0 +1,175 @@
+import hashlib
+import logging
+import time
+import unicodedata
+
+from collections import OrderedDict
+from typing import Any
+
+from redis.asyncio import Redis
+
+from app.core.config import settings
+
+INDEX_KEY = "tcache:index"
+
+
+def normalize_text(text: str) -> str:
+    # case is kept on purpose, "US" and "us" don't translate the same
+    return " ".join(unicodedata.normalize("NFC", text).split())
+
+
+def make_cache_key(
+    *,
+    text: str,
+    source_language: str,
+    target_language: str,
+    chat_history: list[tuple[int, str]],
+    engine: str,
+) -> str:
+    """Content address of a translation.
+
+    Short messages ("ok", "thanks", "see you tomorrow") translate the same way
+    whatever was said before, so their chat history is left out of the key.
+    """
+    normalized = normalize_text(text)
+
+    context_hash = ""
+    if len(normalized) > settings.TRANSLATION_CACHE_CONTEXT_FREE_MAX_CHARS:
+        context = hashlib.sha256()
+        for sender_id, history_text in chat_history:
+            context.update(
+                f"{sender_id}\x1f{normalize_text(history_text)}\x1e".encode()
+            )
+        context_hash = context.hexdigest()
+
+    digest = hashlib.sha256(
+        "\x1f".join(
+            [
+                engine,
+                source_language.lower(),
+                target_language.lower(),
+                context_hash,
+                normalized,
+            ]
+        ).encode()
+    ).hexdigest()
+
+    return f"tcache:{digest}"
+
+
+class TranslationCache:
+    """Two-tier translation cache: an in-process LRU in front of Redis.
+
+    Redis entries expire after `redis_ttl_secs` and the number of entries is
+    bounded by `redis_max_entries` through a sorted set index of insertion
+    times, oldest entries are evicted first.
+    """
+
+    def __init__(
+        self,
+        *,
+        local_max_entries: int,
+        local_ttl_secs: float,
+        redis_ttl_secs: int,
+        redis_max_entries: int,
+    ) -> None:
+        self.local_max_entries = local_max_entries
+        self.local_ttl_secs = local_ttl_secs
+        self.redis_ttl_secs = redis_ttl_secs
+        self.redis_max_entries = redis_max_entries
+        # {cache key: (translation, expires at monotonic time)}
+        self._local: OrderedDict[str, tuple[str, float]] = OrderedDict()
+
+        self.local_hits = 0
+        self.redis_hits = 0
+        self.misses = 0
+
+    def _get_local(self, key: str) -> str | None:
+        entry = self._local.get(key)
+        if entry is None:
+            return None
+        if entry[1] < time.monotonic():
+            del self._local[key]
+            return None
+        self._local.move_to_end(key)
+        return entry[0]
+
+    def _set_local(self, key: str, value: str) -> None:
+        self._local[key] = (value, time.monotonic() + self.local_ttl_secs)
+        self._local.move_to_end(key)
+        while len(self._local) > self.local_max_entries:
+            self._local.popitem(last=False)
+
+    async def get_many(self, redis_client: Redis, keys: list[str]) -> dict[str, str]:
+        found: dict[str, str] = {}
+        remote_keys = []
+        for key in keys:
+            value = self._get_local(key)
+            if value is None:
+                remote_keys.append(key)
+            else:
+                found[key] = value
+        self.local_hits += len(found)
+
+        if remote_keys:
+            try:
+                values = await redis_client.mget(remote_keys)
+            except Exception:
+                # a broken cache must never stop messages from being translated
+                logging.error("Error reading translation cache", exc_info=True)
+                values = [None] * len(remote_keys)
+
+            for key, value in zip(remote_keys, values):
+                if value is None:
+                    self.misses += 1
+                else:
+                    self.redis_hits += 1
+                    found[key] = value
+                    self._set_local(key, value)
+
+        return found
+
+    async def set_many(self, redis_client: Redis, items: dict[str, str]) -> None:
+        if not items:
+            return
+
+        for key, value in items.items():
+            self._set_local(key, value)
+
+        now = time.time()
+        try:
+            async with redis_client.pipeline(transaction=False) as pipe:
+                for key, value in items.items():
+                    pipe.set(key, value, ex=self.redis_ttl_secs)
+                pipe.zadd(INDEX_KEY, {key: now for key in items})
+                pipe.zcard(INDEX_KEY)
+                results = await pipe.execute()
+
+            overflow = results[-1] - self.redis_max_entries
+            if overflow > 0:
+                evicted = await redis_client.zpopmin(INDEX_KEY, overflow)
+                if evicted:
+                    await redis_client.delete(*(key for key, _ in evicted))
+        except Exception:
+            logging.error("Error writing translation cache", exc_info=True)
+
+    def stats(self) -> dict[str, Any]:
+        lookups = self.local_hits + self.redis_hits + self.misses
+        return {
+            "lookups": lookups,
+            "local_hits": self.local_hits,
+            "redis_hits": self.redis_hits,
+            "misses": self.misses,
+            "hit_rate": (
+                (self.local_hits + self.redis_hits) / lookups if lookups else 0.0
+            ),
+            "local_entries": len(self._local),
+        }
+
+
+translation_cache = TranslationCache(
+    local_max_entries=settings.TRANSLATION_CACHE_LOCAL_MAX_ENTRIES,
+    local_ttl_secs=settings.TRANSLATION_CACHE_LOCAL_TTL_SECS,
+    redis_ttl_secs=settings.TRANSLATION_CACHE_TTL_SECS,
+    redis_max_entries=settings.TRANSLATION_CACHE_MAX_ENTRIES,
+)
@@ -0,0 +1,161 @@
+import asyncio
+import hashlib
+import logging
+import random
+import time
+
+from collections import OrderedDict
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Awaitable, Callable, TypeVar
+
+import httpx
+import openai
+from openai import AsyncOpenAI
+
+from app.core.config import settings
+
+T = TypeVar("T")
+
+
+class _PooledClient:
+    def __init__(self, client: AsyncOpenAI) -> None:
+        self.client = client
+        self.last_used = time.monotonic()
+        # requests (or streams) still using the client
+        self.leases = 0
+        # out of the pool, closed once the last lease is released
+        self.retired = False
+
+
+class OpenAIClientPool:
+    """LRU of AsyncOpenAI clients, one per API key.
+
+    Each client owns a pooled httpx connection pool, so requests made with the
+    same key reuse keep-alive connections instead of doing a TLS handshake per
+    translation. Clients unused for `idle_secs` (or pushed out by `max_clients`)
+    are closed, but only once the requests leasing them are done.
+    """
+
+    def __init__(self, max_clients: int, idle_secs: float) -> None:
+        self.max_clients = max_clients
+        self.idle_secs = idle_secs
+        # {sha256(api_key): client}, least recently used first
+        self._clients: OrderedDict[str, _PooledClient] = OrderedDict()
+
+    def _new_client(self, api_key: str) -> AsyncOpenAI:
+        return AsyncOpenAI(
+            api_key=api_key,
+            # retries are done by `with_retries` so they can be jittered
+            max_retries=0,
+            timeout=httpx.Timeout(
+                settings.OPENAI_TIMEOUT_SECS,
+                connect=settings.OPENAI_CONNECT_TIMEOUT_SECS,
+            ),
+            http_client=httpx.AsyncClient(
+                limits=httpx.Limits(
+                    max_connections=settings.OPENAI_MAX_CONNECTIONS_PER_KEY,
+                    max_keepalive_connections=settings.OPENAI_MAX_KEEPALIVE_PER_KEY,
+                ),
+            ),
+        )
+
+    @asynccontextmanager
+    async def lease(self, api_key: str) -> AsyncIterator[AsyncOpenAI]:
+        """The key's client, kept open until the block exits"""
+        key_id = hashlib.sha256(api_key.encode()).hexdigest()
+
+        entry = self._clients.pop(key_id, None) or _PooledClient(
+            self._new_client(api_key)
+        )
+        entry.leases += 1
+        self._clients[key_id] = entry  # most recently used goes last
+        await self._evict()
+
+        try:
+            yield entry.client
+        finally:
+            entry.leases -= 1
+            entry.last_used = time.monotonic()
+            if entry.retired:
+                if not entry.leases:
+                    await self._close(entry.client)
+            elif self._clients.get(key_id) is entry:
+                self._clients.move_to_end(key_id)
+
+    async def _evict(self) -> None:
+        now = time.monotonic()
+        evicted = []
+        while len(self._clients) > self.max_clients:
+            evicted.append(self._clients.popitem(last=False)[1])
+        for key_id, entry in list(self._clients.items()):
+            if entry.leases:
+                continue
+            if now - entry.last_used < self.idle_secs:
+                break  # ordered by last use, everything after is fresher
+            del self._clients[key_id]
+            evicted.append(entry)
+
+        for entry in evicted:
+            entry.retired = True
+            if not entry.leases:
+                await self._close(entry.client)
+
+    async def _close(self, client: AsyncOpenAI) -> None:
+        try:
+            await client.close()
+        except Exception:
+            logging.error("Error closing evicted OpenAI client", exc_info=True)
+
+    async def aclose(self) -> None:
+        clients = [entry.client for entry in self._clients.values()]
+        self._clients.clear()
+        await asyncio.gather(*(self._close(client) for client in clients))
+
+
+client_pool = OpenAIClientPool(
+    max_clients=settings.OPENAI_CLIENT_POOL_SIZE,
+    idle_secs=settings.OPENAI_CLIENT_IDLE_SECS,
+)
+
+
+def _is_retryable(e: openai.OpenAIError) -> bool:
+    if isinstance(e, openai.RateLimitError):
+        # out of credits won't fix itself by waiting
+        return e.code != "insufficient_quota"
+    # APITimeoutError is a subclass of APIConnectionError
+    return isinstance(e, (openai.APIConnectionError, openai.InternalServerError))
+
+
+def _retry_after_secs(e: openai.OpenAIError) -> float | None:
+    if not isinstance(e, openai.APIStatusError):
+        return None
+    try:
+        return float(e.response.headers.get("retry-after", ""))
+    except ValueError:
+        return None
+
+
+async def with_retries(call: Callable[[], Awaitable[T]]) -> T:
+    """Run `call`, retrying transient OpenAI errors with full-jitter exponential
+    backoff (honouring Retry-After when OpenAI sends one)."""
+    attempt = 0
+    while True:
+        try:
+            return await call()
+        except openai.OpenAIError as e:
+            attempt += 1
+            if attempt > settings.OPENAI_MAX_RETRIES or not _is_retryable(e):
+                raise
+
+            delay = random.uniform(
+                0,
+                min(
+                    settings.OPENAI_RETRY_MAX_DELAY_SECS,
+                    settings.OPENAI_RETRY_BASE_DELAY_SECS * 2**attempt,
+                ),
+            )
+            retry_after = _retry_after_secs(e)
+            if retry_after is not None:
+                delay = max(delay, retry_after)
+
+            await asyncio.sleep(delay)
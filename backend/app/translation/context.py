@@ -0,0 +1,118 @@
+import json
+import logging
+
+from redis.asyncio import Redis
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app import crud
+from app.core.config import settings
+
+
+def _window_key(convo_id: int, language: str) -> str:
+    return f"ctx:{convo_id}:{language}"
+
+
+def estimate_tokens(text: str) -> int:
+    # ~4 characters per token for the languages GPT is tuned on, plus the
+    # per-message overhead of the chat format (role, name, separators)
+    return len(text) // 4 + 4
+
+
+def trim_to_token_budget(
+    history: list[tuple[int, str]], budget: int
+) -> list[tuple[int, str]]:
+    """Keep the most recent turns that fit in `budget` tokens, oldest first"""
+    kept: list[tuple[int, str]] = []
+    used = 0
+    for turn in reversed(history):
+        used += estimate_tokens(turn[1])
+        if used > budget:
+            break
+        kept.append(turn)
+    kept.reverse()
+    return kept
+
+
+async def get_chat_history(
+    *,
+    db: AsyncSession,
+    redis_client: Redis | None,
+    convo_id: int,
+    language: str,
+    before_message_id: int | None = None,
+) -> list[tuple[int, str]]:
+    """Recent turns of a conversation in `language` for the translation prompt.
+
+    Each (conversation, language) has a rolling window of at most
+    CHAT_HISTORY_NUM_PREV_MSGS turns in Redis, updated by `append_message` once
+    a message is translated. A missing window is loaded from the DB once and
+    cached, leaving out `before_message_id` (the message being translated,
+    already stored) and anything after it.
+    """
+    history: list[tuple[int, str]] | None = None
+
+    if redis_client is not None:
+        try:
+            window: list[str] = await redis_client.lrange(  # type: ignore[misc]
+                _window_key(convo_id, language), 0, -1
+            )
+            if window:
+                # stored newest first
+                history = [tuple(json.loads(turn)) for turn in reversed(window)]
+        except Exception:
+            logging.error("Error reading chat context window", exc_info=True)
+
+    if history is None:
+        history = await crud.message.get_history_in_language(
+            db=db,
+            convo_id=convo_id,
+            language=language,
+            limit=settings.CHAT_HISTORY_NUM_PREV_MSGS,
+            before_message_id=before_message_id,
+        )
+
+        if redis_client is not None and history:
+            await _seed_window(redis_client, convo_id, language, history)
+
+    return trim_to_token_budget(history, settings.CHAT_HISTORY_TOKEN_BUDGET)
+
+
+async def _seed_window(
+    redis_client: Redis,
+    convo_id: int,
+    language: str,
+    history: list[tuple[int, str]],
+) -> None:
+    key = _window_key(convo_id, language)
+    try:
+        async with redis_client.pipeline(transaction=True) as pipe:
+            pipe.delete(key)
+            pipe.lpush(key, *(json.dumps(turn) for turn in history))
+            pipe.expire(key, settings.CHAT_HISTORY_WINDOW_TTL_SECS)
+            await pipe.execute()
+    except Exception:
+        logging.error("Error seeding chat context window", exc_info=True)
+
+
+async def append_message(
+    *,
+    redis_client: Redis,
+    convo_id: int,
+    sender_id: int,
+    texts_by_language: dict[str, str],
+) -> None:
+    """Push a new message onto the windows of every language it exists in.
+
+    Only windows that already exist are updated (LPUSHX), a cold window is
+    loaded from the DB on its next read so it never starts out incomplete.
+    """
+    try:
+        async with redis_client.pipeline(transaction=False) as pipe:
+            for language, text in texts_by_language.items():
+                key = _window_key(convo_id, language)
+                pipe.lpushx(key, json.dumps((sender_id, text)))
+                pipe.ltrim(key, 0, settings.CHAT_HISTORY_NUM_PREV_MSGS - 1)
+                pipe.expire(key, settings.CHAT_HISTORY_WINDOW_TTL_SECS)
+            await pipe.execute()
+    except Exception:
+        logging.error("Error updating chat context window", exc_info=True)
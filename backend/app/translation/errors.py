@@ -0,0 +1,42 @@
+import openai
+
+from app.exceptions import (
+    OpenAIAuthenticationException,
+    OpenAIRateLimitWaitException,
+)
+
+
+def is_permanent(e: BaseException) -> bool:
+    """Errors that retrying the same translation can't fix"""
+    if isinstance(e, openai.RateLimitError):
+        return e.code == "insufficient_quota"
+    return isinstance(
+        e,
+        (
+            OpenAIAuthenticationException,
+            openai.AuthenticationError,
+            openai.PermissionDeniedError,
+            openai.BadRequestError,
+        ),
+    )
+
+
+def describe_translation_error(e: BaseException) -> str:
+    """The error shown to the sender when their message couldn't be translated"""
+    if isinstance(e, (openai.AuthenticationError, OpenAIAuthenticationException)):
+        return "Your message failed to send because your OpenAI API key is invalid or expired. Please update the key in your user settings. Note, you need to buy OpenAI account credits to use your API keys."
+
+    error_message = "Your message failed to send because an error occurred with the translation service. Note, you need to buy OpenAI account credits to use your API keys."
+
+    if isinstance(e, (openai.RateLimitError, OpenAIRateLimitWaitException)):
+        error_message = "Your message failed to send because your OpenAI rate limit exceeded. Check your OpenAI API usage. Note, you need to buy OpenAI account credits to use your API keys."
+    elif isinstance(e, openai.APIConnectionError):
+        error_message = "Issue connecting to OpenAI services. Please wait a few seconds and try sending your message again. Note, you need to buy OpenAI account credits to use your API keys."
+    elif isinstance(e, (openai.InternalServerError, openai.APIError)):
+        error_message = "A server error occured on OpenAI's side or you didn't buy OpenAI account credits which are needed to use your API keys and the GPT API. Check their status page for any ongoing incidents and your account credits before trying to send your message again."
+    elif isinstance(e, openai.APITimeoutError):
+        error_message = "Your message took too long to translate and OpenAI closed the connection. Wait a few seconds and try sending your message again. If it still doesn't work, try splitting up your message into smaller chunks. Note, you need to buy OpenAI account credits to use your API keys."
+    elif isinstance(e, openai.PermissionDeniedError):
+        error_message = "Your message failed to send because you don't have access to GPT-4. Ensure you are using a valid and correct OpenAI API key. Note, you need to buy OpenAI account credits to use your API keys."
+
+    return error_message
@@ -0,0 +1,379 @@
+import asyncio
+import hashlib
+import logging
+
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Awaitable, Callable, Hashable, Iterable
+
+import openai
+from redis.asyncio import Redis
+
+from app.core.config import settings
+from app.exceptions import OpenAIAuthenticationException
+from app.translation import registry
+from app.translation.base import TranslationEngine
+from app.translation.cache import make_cache_key, translation_cache
+
+# called with (target_language, new text) while a translation streams in
+DeltaCallback = Callable[[str, str], Awaitable[None]]
+
+
+class KeyedSemaphore:
+    """One asyncio.Semaphore per key. A key's semaphore is dropped as soon as no
+    task holds or waits on it, so the map only grows with in-flight keys."""
+
+    def __init__(self, limit: int) -> None:
+        self.limit = limit
+        self._semaphores: dict[Hashable, asyncio.Semaphore] = {}
+        self._users: dict[Hashable, int] = {}
+
+    @asynccontextmanager
+    async def hold(self, key: Hashable) -> AsyncIterator[None]:
+        semaphore = self._semaphores.get(key)
+        if semaphore is None:
+            semaphore = asyncio.Semaphore(self.limit)
+            self._semaphores[key] = semaphore
+        self._users[key] = self._users.get(key, 0) + 1
+
+        try:
+            async with semaphore:
+                yield
+        finally:
+            self._users[key] -= 1
+            if self._users[key] == 0:
+                del self._users[key]
+                del self._semaphores[key]
+
+
+# shared by every websocket on this worker process
+convo_limiter = KeyedSemaphore(settings.TRANSLATION_MAX_CONCURRENCY_PER_CONVO)
+api_key_limiter = KeyedSemaphore(settings.TRANSLATION_MAX_CONCURRENCY_PER_API_KEY)
+
+
+def _api_key_id(api_key: str) -> str:
+    # don't keep raw API keys around as dict keys
+    return hashlib.sha256(api_key.encode()).hexdigest()
+
+
+class _Flight:
+    def __init__(self) -> None:
+        self.future: asyncio.Future[str] = asyncio.get_running_loop().create_future()
+        self.listeners: list[DeltaCallback] = []
+        self.text = ""  # streamed so far, for listeners that join late
+
+
+class RequestCoalescer:
+    """Concurrent calls with the same key share the first one's result (and its
+    stream of deltas) instead of each calling the model."""
+
+    def __init__(self) -> None:
+        self._flights: dict[str, _Flight] = {}
+
+    async def run(
+        self,
+        key: str,
+        language: str,
+        on_delta: DeltaCallback | None,
+        call: Callable[[DeltaCallback | None], Awaitable[str]],
+    ) -> str:
+        flight = self._flights.get(key)
+        if flight is not None:
+            if on_delta is not None:
+                if flight.text:
+                    await on_delta(language, flight.text)
+                flight.listeners.append(on_delta)
+            try:
+                return await asyncio.shield(flight.future)
+            finally:
+                if on_delta in flight.listeners:
+                    flight.listeners.remove(on_delta)
+
+        flight = _Flight()
+        self._flights[key] = flight
+        if on_delta is not None:
+            flight.listeners.append(on_delta)
+
+        async def broadcast(language: str, delta: str) -> None:
+            flight.text += delta
+            for listener in list(flight.listeners):
+                await listener(language, delta)
+
+        try:
+            result = await call(broadcast if on_delta is not None else None)
+        except BaseException as e:
+            flight.future.set_exception(
+                e
+                if isinstance(e, Exception)
+                else RuntimeError("Coalesced translation was cancelled")
+            )
+            flight.future.exception()  # retrieved, even if nobody joined
+            raise
+        else:
+            flight.future.set_result(result)
+            return result
+        finally:
+            del self._flights[key]
+
+
+coalescer = RequestCoalescer()
+
+
+async def _translate_one(
+    *,
+    engine: TranslationEngine,
+    convo_id: int,
+    sender_id: int,
+    text_input: str,
+    target_language: str,
+    chat_history: list[tuple[int, str]],
+    api_key: str,
+    on_delta: DeltaCallback | None,
+) -> str:
+    async with convo_limiter.hold(convo_id):
+        async with api_key_limiter.hold(_api_key_id(api_key)):
+            if on_delta is None:
+                text = await engine.translate(
+                    sender_id=sender_id,
+                    text_input=text_input,
+                    target_language=target_language,
+                    chat_history=chat_history,
+                    api_key=api_key,
+                )
+            else:
+                text = await _stream_one(
+                    engine=engine,
+                    sender_id=sender_id,
+                    text_input=text_input,
+                    target_language=target_language,
+                    chat_history=chat_history,
+                    api_key=api_key,
+                    on_delta=on_delta,
+                )
+
+    if text is None:
+        raise openai.OpenAIError(
+            f"Translation to {target_language} could not be generated"
+        )
+
+    return text
+
+
+async def _stream_one(
+    *,
+    engine: TranslationEngine,
+    sender_id: int,
+    text_input: str,
+    target_language: str,
+    chat_history: list[tuple[int, str]],
+    api_key: str,
+    on_delta: DeltaCallback,
+) -> str | None:
+    loop = asyncio.get_running_loop()
+    parts: list[str] = []
+    pending: list[str] = []
+    last_flush = loop.time()
+
+    async for chunk in engine.translate_stream(
+        sender_id=sender_id,
+        text_input=text_input,
+        target_language=target_language,
+        chat_history=chat_history,
+        api_key=api_key,
+    ):
+        parts.append(chunk)
+        pending.append(chunk)
+
+        # coalesce tokens so recipients get a few frames/sec, not one per token
+        if loop.time() - last_flush >= settings.TRANSLATION_STREAM_FLUSH_SECS:
+            await on_delta(target_language, "".join(pending))
+            pending.clear()
+            last_flush = loop.time()
+
+    if pending:
+        await on_delta(target_language, "".join(pending))
+
+    return "".join(parts) if parts else None
+
+
+async def _translate_batch(
+    *,
+    engine: TranslationEngine,
+    convo_id: int,
+    sender_id: int,
+    text_input: str,
+    target_languages: list[str],
+    chat_history: list[tuple[int, str]],
+    api_key: str,
+) -> dict[str, str]:
+    try:
+        async with convo_limiter.hold(convo_id):
+            async with api_key_limiter.hold(_api_key_id(api_key)):
+                batch = await engine.translate_batch(
+                    sender_id=sender_id,
+                    text_input=text_input,
+                    target_languages=target_languages,
+                    chat_history=chat_history,
+                    api_key=api_key,
+                )
+    except (
+        openai.AuthenticationError,
+        openai.PermissionDeniedError,
+        OpenAIAuthenticationException,
+    ):
+        raise  # one call per language would fail the same way
+    except Exception:
+        logging.error(
+            "Batch translation failed, falling back to one call per language",
+            exc_info=True,
+        )
+        return {}
+
+    return {
+        language: batch[language] for language in target_languages if language in batch
+    }
+
+
+async def translate_languages(
+    *,
+    convo_id: int,
+    sender_id: int,
+    text_input: str,
+    source_language: str,
+    target_languages: Iterable[str],
+    chat_history: list[tuple[int, str]],
+    api_key: str,
+    on_delta: DeltaCallback | None = None,
+    redis_client: Redis | None = None,
+    engine: TranslationEngine | None = None,
+) -> tuple[dict[str, str], dict[str, BaseException]]:
+    """Translate `text_input` into every target language concurrently, with
+    `engine` or the default TRANSLATION_ENGINE.
+
+    If `on_delta` is given the translations are streamed and `on_delta` is
+    awaited with each new piece of text as it arrives. Languages found in the
+    translation cache (when `redis_client` is given) are not sent to the model.
+
+    Returns ({language: translation}, {language: error}). Partial failures are
+    resolved according to `settings.TRANSLATION_PARTIAL_FAILURE_POLICY`:
+
+    * "abort": any failed language raises its error and nothing is kept.
+    * "fallback_original": failed languages get the original text, the rest
+      keep their translations. If every language fails, the first error is
+      raised so the sender is told the message didn't go through.
+    """
+    languages = list(dict.fromkeys(target_languages))  # dedupe, keep order
+    if not languages:
+        return {}, {}
+
+    if engine is None:
+        engine = registry.get_engine(settings.TRANSLATION_ENGINE)
+
+    translations: dict[str, str] = {}
+    cache_keys: dict[str, str] = {}
+    use_cache = settings.TRANSLATION_CACHE_ENABLED and redis_client is not None
+
+    if use_cache:
+        cache_keys = {
+            language: make_cache_key(
+                text=text_input,
+                source_language=source_language,
+                target_language=language,
+                chat_history=chat_history,
+                engine=f"{engine.name}:{engine.version}",
+            )
+            for language in languages
+        }
+        cached = await translation_cache.get_many(
+            redis_client, list(cache_keys.values())  # type: ignore
+        )
+        for language in languages:
+            if cache_keys[language] in cached:
+                translations[language] = cached[cache_keys[language]]
+
+        languages = [language for language in languages if language not in translations]
+
+    if on_delta is None and settings.TRANSLATION_BATCH_ENABLED and len(languages) > 1:
+        batched = await _translate_batch(
+            engine=engine,
+            convo_id=convo_id,
+            sender_id=sender_id,
+            text_input=text_input,
+            target_languages=languages,
+            chat_history=chat_history,
+            api_key=api_key,
+        )
+        translations.update(batched)
+        # whatever the batch didn't answer is translated one language at a time
+        remaining = [language for language in languages if language not in batched]
+    else:
+        remaining = languages
+
+    def translate_one(language: str) -> Awaitable[str]:
+        def call(delta_callback: DeltaCallback | None) -> Awaitable[str]:
+            return _translate_one(
+                engine=engine,
+                convo_id=convo_id,
+                sender_id=sender_id,
+                text_input=text_input,
+                target_language=language,
+                chat_history=chat_history,
+                api_key=api_key,
+                on_delta=delta_callback,
+            )
+
+        if not settings.TRANSLATION_COALESCE_ENABLED:
+            return call(on_delta)
+
+        flight_key = _api_key_id(api_key) + (
+            cache_keys.get(language)
+            or make_cache_key(
+                text=text_input,
+                source_language=source_language,
+                target_language=language,
+                chat_history=chat_history,
+                engine=f"{engine.name}:{engine.version}",
+            )
+        )
+        return coalescer.run(flight_key, language, on_delta, call)
+
+    results = await asyncio.gather(
+        *(translate_one(language) for language in remaining),
+        return_exceptions=True,
+    )
+
+    failures: dict[str, BaseException] = {}
+    for language, result in zip(remaining, results):
+        if isinstance(result, BaseException):
+            failures[language] = result
+        else:
+            translations[language] = result
+
+    if use_cache:
+        # only fresh model output is cached, never the fallback to the original text
+        await translation_cache.set_many(
+            redis_client,  # type: ignore
+            {
+                cache_keys[language]: translations[language]
+                for language in languages
+                if language in translations
+            },
+        )
+
+    if not failures:
+        return translations, failures
+
+    for error in failures.values():
+        if not isinstance(error, Exception):  # e.g. cancellation, never swallow
+            raise error
+
+    if settings.TRANSLATION_PARTIAL_FAILURE_POLICY == "abort" or not translations:
+        raise next(iter(failures.values()))
+
+    for language, error in failures.items():
+        logging.error(
+            f"Translation to {language} failed in convo {convo_id}, delivering original text",
+            exc_info=error,
+        )
+        translations[language] = text_input
+
+    return translations, failures
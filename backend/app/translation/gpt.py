@@ -1,15 +1,23 @@
-from app.exceptions import OpenAIAuthenticationException
+import json
+
+from typing import Any, AsyncIterator
+
 import openai
+from openai import AsyncOpenAI
 
+from app.exceptions import OpenAIAuthenticationException
+from app.core.config import settings
+from app.translation.client_pool import client_pool, with_retries
+from app.translation.rate_limit import estimate_request_tokens, rate_limiter
 
-async def translate(
+
+def build_prompt(
     *,
     sender_id: int,
     text_input: str,
     target_language: str,
     chat_history: list[tuple[int, str]],
-    api_key: str,
-) -> str | None:
+) -> list[dict[str, Any]]:
     # User {message.sender_id}: {translation.text}
     # User ....
 
@@ -31,29 +39,266 @@ async def translate(
             "role": "user",
             "name": f"User_{sender_id}",
             "content": f"""Translate the following text sent by user {sender_id} into {target_language}. Ensure the punctuation remains EXACTLY the SAME as in the ORIGINAL TEXT. DO NOT ADD EXTRA QUOTES to the translation if there were no quotes in the original input.
-            
+
             {text_input}""",
         }
     )
 
-    # prompt = """You're given the chat history here
-    # """
+    return PROMPT_MSGS
 
-    # prompt += (
-    #     f"\nUser {sender_id} sent '{text_input}'. Translate it to {target_language}.\n"
-    # )
 
-    # print(f"In GPT Translation Function. This is the prompt: {PROMPT_MSGS}")
+def build_batch_prompt(
+    *,
+    sender_id: int,
+    text_input: str,
+    target_languages: list[str],
+    chat_history: list[tuple[int, str]],
+) -> list[dict[str, Any]]:
+    # same system prompt and chat history as the single language prompt, sent once
+    # for all target languages instead of once per language
+    PROMPT_MSGS = build_prompt(
+        sender_id=sender_id,
+        text_input=text_input,
+        target_language="",
+        chat_history=chat_history,
+    )[:-1]
+
+    PROMPT_MSGS.append(
+        {
+            "role": "user",
+            "name": f"User_{sender_id}",
+            "content": f"""Translate the following text sent by user {sender_id} into each of these languages: {json.dumps(target_languages, ensure_ascii=False)}. Respond with a JSON object that maps each language, spelled exactly as given, to its translation. Ensure the punctuation remains EXACTLY the SAME as in the ORIGINAL TEXT. DO NOT ADD EXTRA QUOTES to the translation if there were no quotes in the original input.
+
+            {text_input}""",
+        }
+    )
+
+    return PROMPT_MSGS
+
+
+def batch_response_format(target_languages: list[str]) -> dict[str, Any]:
+    # structured output: the model can only answer with exactly these keys
+    return {
+        "type": "json_schema",
+        "json_schema": {
+            "name": "translations",
+            "strict": True,
+            "schema": {
+                "type": "object",
+                "properties": {
+                    language: {"type": "string"} for language in target_languages
+                },
+                "required": target_languages,
+                "additionalProperties": False,
+            },
+        },
+    }
+
+
+def parse_batch_response(
+    content: str | None, target_languages: list[str]
+) -> dict[str, str]:
+    """Raises ValueError if the completion isn't the JSON object we asked for.
+    Languages missing from an otherwise valid answer are left out."""
+    try:
+        parsed = json.loads(content or "")
+    except json.JSONDecodeError as e:
+        raise ValueError(f"Batch translation is not valid JSON: {e}")
+
+    if not isinstance(parsed, dict):
+        raise ValueError("Batch translation is not a JSON object")
+
+    return {
+        language: parsed[language]
+        for language in target_languages
+        if isinstance(parsed.get(language), str) and parsed[language].strip()
+    }
+
+
+async def _create_completion(
+    *, client: AsyncOpenAI, api_key: str, expected_output_chars: int, **params: Any
+) -> Any:
+    """chat.completions.create through the API key's rate limiter, with retries.
+    Every attempt waits for capacity and reports OpenAI's rate limit headers."""
+    tokens = estimate_request_tokens(params["messages"], expected_output_chars)
+
+    async def attempt() -> Any:
+        await rate_limiter.acquire(api_key, tokens)
+        try:
+            raw = await client.chat.completions.with_raw_response.create(**params)
+        except openai.APIStatusError as e:
+            await rate_limiter.observe(api_key, e.response.headers)
+            raise
+        await rate_limiter.observe(api_key, raw.headers)
+        return raw.parse()
+
+    return await with_retries(attempt)
+
+
+async def translate(
+    *,
+    sender_id: int,
+    text_input: str,
+    target_language: str,
+    chat_history: list[tuple[int, str]],
+    api_key: str,
+    model: str | None = None,
+) -> str | None:
+    PROMPT_MSGS = build_prompt(
+        sender_id=sender_id,
+        text_input=text_input,
+        target_language=target_language,
+        chat_history=chat_history,
+    )
 
     # whitespace will already be stripped. The strippping is necessary
     if not api_key:
         raise OpenAIAuthenticationException()
 
-    openai.api_key = api_key
+    # one pooled AsyncOpenAI client per key, no global openai.api_key
+    async with client_pool.lease(api_key) as client:
+        response = await _create_completion(
+            client=client,
+            api_key=api_key,
+            expected_output_chars=len(text_input),
+            model=model or settings.OPENAI_MODEL,
+            messages=PROMPT_MSGS,
+        )
+
+    content: str | None = response.choices[0].message.content
+    return content
+
+
+async def translate_stream(
+    *,
+    sender_id: int,
+    text_input: str,
+    target_language: str,
+    chat_history: list[tuple[int, str]],
+    api_key: str,
+    model: str | None = None,
+) -> AsyncIterator[str]:
+    """Same as `translate` but yields the translation as the tokens arrive"""
+    PROMPT_MSGS = build_prompt(
+        sender_id=sender_id,
+        text_input=text_input,
+        target_language=target_language,
+        chat_history=chat_history,
+    )
+
+    if not api_key:
+        raise OpenAIAuthenticationException()
+
+    # the client stays leased until the stream is read to the end
+    async with client_pool.lease(api_key) as client:
+        # only opening the stream is retried. Once tokens have been handed out,
+        # retrying would duplicate them
+        stream = await _create_completion(
+            client=client,
+            api_key=api_key,
+            expected_output_chars=len(text_input),
+            model=model or settings.OPENAI_MODEL,
+            messages=PROMPT_MSGS,
+            stream=True,
+        )
+
+        async for chunk in stream:
+            if chunk.choices and chunk.choices[0].delta.content:
+                yield chunk.choices[0].delta.content
+
 
-    response = openai.chat.completions.create(
-        model="gpt-4",
-        messages=PROMPT_MSGS,  # type: ignore
+async def translate_batch(
+    *,
+    sender_id: int,
+    text_input: str,
+    target_languages: list[str],
+    chat_history: list[tuple[int, str]],
+    api_key: str,
+    model: str | None = None,
+) -> dict[str, str]:
+    """Translate into all `target_languages` with a single completion"""
+    PROMPT_MSGS = build_batch_prompt(
+        sender_id=sender_id,
+        text_input=text_input,
+        target_languages=target_languages,
+        chat_history=chat_history,
     )
 
-    return response.choices[0].message.content
+    if not api_key:
+        raise OpenAIAuthenticationException()
+
+    async with client_pool.lease(api_key) as client:
+        response = await _create_completion(
+            client=client,
+            api_key=api_key,
+            # every language plus the JSON around them
+            expected_output_chars=(len(text_input) + 32) * len(target_languages),
+            model=model or settings.OPENAI_BATCH_MODEL,
+            messages=PROMPT_MSGS,
+            response_format=batch_response_format(target_languages),
+        )
+
+    return parse_batch_response(response.choices[0].message.content, target_languages)
+
+
+class GPTEngine:
+    def __init__(self, name: str, model: str, batch_model: str) -> None:
+        self.name = name
+        self.model = model
+        # batching needs a model that supports structured outputs
+        self.batch_model = batch_model
+        self.version = f"{model}+{batch_model}"
+
+    async def translate(
+        self,
+        *,
+        sender_id: int,
+        text_input: str,
+        target_language: str,
+        chat_history: list[tuple[int, str]],
+        api_key: str,
+    ) -> str | None:
+        return await translate(
+            sender_id=sender_id,
+            text_input=text_input,
+            target_language=target_language,
+            chat_history=chat_history,
+            api_key=api_key,
+            model=self.model,
+        )
+
+    def translate_stream(
+        self,
+        *,
+        sender_id: int,
+        text_input: str,
+        target_language: str,
+        chat_history: list[tuple[int, str]],
+        api_key: str,
+    ) -> AsyncIterator[str]:
+        return translate_stream(
+            sender_id=sender_id,
+            text_input=text_input,
+            target_language=target_language,
+            chat_history=chat_history,
+            api_key=api_key,
+            model=self.model,
+        )
+
+    async def translate_batch(
+        self,
+        *,
+        sender_id: int,
+        text_input: str,
+        target_languages: list[str],
+        chat_history: list[tuple[int, str]],
+        api_key: str,
+    ) -> dict[str, str]:
+        return await translate_batch(
+            sender_id=sender_id,
+            text_input=text_input,
+            target_languages=target_languages,
+            chat_history=chat_history,
+            api_key=api_key,
+            model=self.batch_model,
+        )
@@ -0,0 +1,112 @@
+import asyncio
+from typing import AsyncIterator
+
+from app.translation.cache import normalize_text
+
+# a handful of common chat phrases so load tests see some "real" translations
+PHRASEBOOK: dict[str, dict[str, str]] = {
+    "spanish": {
+        "hello": "hola",
+        "hi": "hola",
+        "ok": "vale",
+        "thanks": "gracias",
+        "thank you": "gracias",
+        "yes": "sí",
+        "no": "no",
+        "good morning": "buenos días",
+        "good night": "buenas noches",
+        "see you tomorrow": "hasta mañana",
+    },
+    "french": {
+        "hello": "bonjour",
+        "hi": "salut",
+        "ok": "d'accord",
+        "thanks": "merci",
+        "thank you": "merci",
+        "yes": "oui",
+        "no": "non",
+        "good morning": "bonjour",
+        "good night": "bonne nuit",
+        "see you tomorrow": "à demain",
+    },
+    "german": {
+        "hello": "hallo",
+        "hi": "hallo",
+        "ok": "okay",
+        "thanks": "danke",
+        "thank you": "danke",
+        "yes": "ja",
+        "no": "nein",
+        "good morning": "guten Morgen",
+        "good night": "gute Nacht",
+        "see you tomorrow": "bis morgen",
+    },
+}
+
+
+class LocalEngine:
+    """Deterministic offline engine for development and load testing.
+
+    Known phrases come from a small phrasebook, anything else is echoed back
+    tagged with the target language, e.g. "[spanish] how are you?". No network,
+    no API key, no cost. `latency_secs` simulates model latency so benchmarks of
+    the send pipeline stay realistic.
+    """
+
+    def __init__(self, name: str = "local", latency_secs: float = 0.0) -> None:
+        self.name = name
+        self.version = "1"
+        self.latency_secs = latency_secs
+
+    def _translate(self, text_input: str, target_language: str) -> str:
+        phrases = PHRASEBOOK.get(target_language.lower(), {})
+        normalized = normalize_text(text_input)
+        phrase = phrases.get(normalized.lower().rstrip("!.?"))
+        if phrase is None:
+            return f"[{target_language}] {normalized}"
+        # keep trailing punctuation as is, same as the GPT prompt asks for
+        return phrase + normalized[len(normalized.rstrip("!.?")) :]
+
+    async def translate(
+        self,
+        *,
+        sender_id: int,
+        text_input: str,
+        target_language: str,
+        chat_history: list[tuple[int, str]],
+        api_key: str,
+    ) -> str | None:
+        if self.latency_secs:
+            await asyncio.sleep(self.latency_secs)
+        return self._translate(text_input, target_language)
+
+    async def translate_batch(
+        self,
+        *,
+        sender_id: int,
+        text_input: str,
+        target_languages: list[str],
+        chat_history: list[tuple[int, str]],
+        api_key: str,
+    ) -> dict[str, str]:
+        if self.latency_secs:
+            await asyncio.sleep(self.latency_secs)
+        return {
+            language: self._translate(text_input, language)
+            for language in target_languages
+        }
+
+    async def translate_stream(
+        self,
+        *,
+        sender_id: int,
+        text_input: str,
+        target_language: str,
+        chat_history: list[tuple[int, str]],
+        api_key: str,
+    ) -> AsyncIterator[str]:
+        words = self._translate(text_input, target_language).split(" ")
+        for i, word in enumerate(words):
+            if self.latency_secs:
+                await asyncio.sleep(self.latency_secs / len(words))
+            yield word if i == 0 else f" {word}"
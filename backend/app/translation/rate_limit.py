@@ -0,0 +1,164 @@
+import asyncio
+import hashlib
+import logging
+import random
+import re
+
+from typing import Any, Mapping
+
+from redis.asyncio import Redis
+
+from app.core.config import settings
+from app.exceptions import OpenAIRateLimitWaitException
+from app.translation.context import estimate_tokens
+
+# Both buckets refill continuously at their per-minute limit. Time comes from
+# the Redis server so every worker agrees on it.
+_REFILL = """
+local now_t = redis.call('TIME')
+local now = now_t[1] * 1000 + math.floor(now_t[2] / 1000)
+local state = redis.call('HMGET', KEYS[1], 'r', 't', 'ts', 'rpm', 'tpm')
+local rpm = tonumber(state[4]) or tonumber(ARGV[1])
+local tpm = tonumber(state[5]) or tonumber(ARGV[2])
+local r = tonumber(state[1]) or rpm
+local t = tonumber(state[2]) or tpm
+local elapsed = math.max(0, now - (tonumber(state[3]) or now))
+r = math.min(rpm, r + elapsed * rpm / 60000)
+t = math.min(tpm, t + elapsed * tpm / 60000)
+"""
+
+# ARGV: default rpm, default tpm, requests wanted, tokens wanted
+# returns 0 when granted, otherwise the milliseconds to wait before trying again
+ACQUIRE_SCRIPT = (
+    _REFILL
+    + """
+local want_r = tonumber(ARGV[3])
+-- a request bigger than the whole bucket would otherwise wait forever
+local want_t = math.min(tonumber(ARGV[4]), tpm)
+local wait = 0
+if r < want_r then wait = math.max(wait, (want_r - r) * 60000 / rpm) end
+if t < want_t then wait = math.max(wait, (want_t - t) * 60000 / tpm) end
+if wait == 0 then
+    r = r - want_r
+    t = t - want_t
+end
+redis.call('HSET', KEYS[1], 'r', tostring(r), 't', tostring(t), 'ts', now)
+redis.call('PEXPIRE', KEYS[1], 600000)
+return math.ceil(wait)
+"""
+)
+
+# ARGV: default rpm, default tpm, limit requests, limit tokens,
+#       remaining requests, remaining tokens ("" when OpenAI didn't say)
+OBSERVE_SCRIPT = (
+    _REFILL
+    + """
+if ARGV[3] ~= '' then rpm = tonumber(ARGV[3]) end
+if ARGV[4] ~= '' then tpm = tonumber(ARGV[4]) end
+-- OpenAI's count is the truth, but it can't see requests other workers
+-- have already been granted, so only ever lower ours to it
+if ARGV[5] ~= '' then r = math.min(r, tonumber(ARGV[5])) end
+if ARGV[6] ~= '' then t = math.min(t, tonumber(ARGV[6])) end
+redis.call('HSET', KEYS[1], 'r', tostring(r), 't', tostring(t), 'ts', now,
+    'rpm', rpm, 'tpm', tpm)
+redis.call('PEXPIRE', KEYS[1], 600000)
+return 0
+"""
+)
+
+
+def _bucket_key(api_key: str) -> str:
+    return f"ratelimit:{hashlib.sha256(api_key.encode()).hexdigest()}"
+
+
+def _header_int(headers: Mapping[str, str], name: str) -> str:
+    match = re.match(r"\s*(\d+)", headers.get(name) or "")
+    return match.group(1) if match else ""
+
+
+def estimate_request_tokens(
+    messages: list[dict[str, Any]], expected_output_chars: int
+) -> int:
+    """What a completion will count against the tokens/min limit: the prompt
+    plus the answer, which is about as long as the text being translated"""
+    return sum(estimate_tokens(str(message["content"])) for message in messages) + (
+        expected_output_chars // 4 + 4
+    )
+
+
+class RateLimiter:
+    """Token buckets for requests/min and tokens/min per OpenAI API key, in
+    Redis so every worker shares them.
+
+    Requests over the limit wait for the buckets to refill for at most
+    OPENAI_RATE_LIMIT_MAX_WAIT_SECS. The limits and remaining quota OpenAI
+    reports in its x-ratelimit-* headers replace the configured defaults.
+    Does nothing until `bind` gives it a Redis client.
+    """
+
+    def __init__(self, default_rpm: int, default_tpm: int) -> None:
+        self.default_rpm = default_rpm
+        self.default_tpm = default_tpm
+        self.redis_client: Redis | None = None
+        self._acquire: Any = None
+        self._observe: Any = None
+
+    def bind(self, redis_client: Redis) -> None:
+        self.redis_client = redis_client
+        self._acquire = redis_client.register_script(ACQUIRE_SCRIPT)
+        self._observe = redis_client.register_script(OBSERVE_SCRIPT)
+
+    async def acquire(self, api_key: str, tokens: int) -> None:
+        if self.redis_client is None or not settings.OPENAI_RATE_LIMIT_ENABLED:
+            return
+
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + settings.OPENAI_RATE_LIMIT_MAX_WAIT_SECS
+        key = _bucket_key(api_key)
+
+        while True:
+            try:
+                wait_ms = await self._acquire(
+                    keys=[key],
+                    args=[self.default_rpm, self.default_tpm, 1, tokens],
+                )
+            except Exception:
+                # without Redis, OpenAI's own 429s and our retries still apply
+                logging.error("Error acquiring OpenAI rate limit", exc_info=True)
+                return
+
+            if wait_ms <= 0:
+                return
+
+            # a little jitter so waiting workers don't all retry at the same instant
+            wait = wait_ms / 1000 * random.uniform(1, 1.2)
+            if loop.time() + wait > deadline:
+                raise OpenAIRateLimitWaitException()
+            await asyncio.sleep(wait)
+
+    async def observe(self, api_key: str, headers: Mapping[str, str]) -> None:
+        if self.redis_client is None or not settings.OPENAI_RATE_LIMIT_ENABLED:
+            return
+
+        args = [
+            _header_int(headers, "x-ratelimit-limit-requests"),
+            _header_int(headers, "x-ratelimit-limit-tokens"),
+            _header_int(headers, "x-ratelimit-remaining-requests"),
+            _header_int(headers, "x-ratelimit-remaining-tokens"),
+        ]
+        if not any(args):
+            return
+
+        try:
+            await self._observe(
+                keys=[_bucket_key(api_key)],
+                args=[self.default_rpm, self.default_tpm, *args],
+            )
+        except Exception:
+            logging.error("Error updating OpenAI rate limit", exc_info=True)
+
+
+rate_limiter = RateLimiter(
+    default_rpm=settings.OPENAI_DEFAULT_RPM,
+    default_tpm=settings.OPENAI_DEFAULT_TPM,
+)
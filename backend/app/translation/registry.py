@@ -0,0 +1,56 @@
+from app.core.config import settings
+from app.translation.base import TranslationEngine
+from app.translation.gpt import GPTEngine
+from app.translation.local import LocalEngine
+
+_engines: dict[str, TranslationEngine] = {}
+
+
+def register_engine(engine: TranslationEngine) -> None:
+    _engines[engine.name] = engine
+
+
+def get_engine(name: str) -> TranslationEngine:
+    try:
+        return _engines[name]
+    except KeyError:
+        raise ValueError(
+            f"Unknown translation engine '{name}'. Registered engines: {', '.join(_engines)}"
+        )
+
+
+def engine_for(*, convo_id: int, user_id: int) -> TranslationEngine:
+    """Routing: a conversation override wins over a sender override, which wins
+    over the default TRANSLATION_ENGINE"""
+    name = settings.TRANSLATION_ENGINE_BY_CONVO.get(
+        convo_id,
+        settings.TRANSLATION_ENGINE_BY_USER.get(user_id, settings.TRANSLATION_ENGINE),
+    )
+    return get_engine(name)
+
+
+register_engine(
+    GPTEngine(
+        name="gpt",
+        model=settings.OPENAI_MODEL,
+        batch_model=settings.OPENAI_BATCH_MODEL,
+    )
+)
+register_engine(
+    GPTEngine(
+        name="gpt-fast",
+        model=settings.OPENAI_FAST_MODEL,
+        batch_model=settings.OPENAI_FAST_MODEL,
+    )
+)
+register_engine(
+    LocalEngine(name="local", latency_secs=settings.LOCAL_TRANSLATION_LATENCY_SECS)
+)
+
+# fail at startup rather than on the first message
+for _name in {
+    settings.TRANSLATION_ENGINE,
+    *settings.TRANSLATION_ENGINE_BY_CONVO.values(),
+    *settings.TRANSLATION_ENGINE_BY_USER.values(),
+}:
+    get_engine(_name)
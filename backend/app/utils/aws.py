@@ -1,16 +1,83 @@
-import boto3
+import time
 
+from collections import OrderedDict
+from datetime import datetime, timezone
 from enum import Enum
-from typing import Any
+from typing import Any, Iterable
 
 from redis.asyncio import Redis
 
+from app.core.config import settings
+from app.storage import get_storage
+from app.storage.thumbnails import thumbnail_key
+from app.worker.storage_worker import enqueue_delete
+
 
 class CacheMethod(str, Enum):
     GET = "GET"
     POST = "POST"
 
 
+class PresignedUrlCache:
+    """In-process LRU of presigned GET urls in front of the Redis cache.
+
+    Entries expire `margin_secs` before their Redis copy. Photo keys are
+    content addressed, a changed photo has a new key, so a cached url never
+    goes stale before then.
+    """
+
+    def __init__(self, max_entries: int, margin_secs: float) -> None:
+        self.max_entries = max_entries
+        self.margin_secs = margin_secs
+        # {object key: (url, expires at monotonic time)}
+        self._local: OrderedDict[str, tuple[str, float]] = OrderedDict()
+
+    def get(self, object_key: str) -> str | None:
+        entry = self._local.get(object_key)
+        if entry is None:
+            return None
+        if entry[1] < time.monotonic():
+            del self._local[object_key]
+            return None
+        self._local.move_to_end(object_key)
+        return entry[0]
+
+    def set(self, object_key: str, url: str, ttl_secs: float) -> None:
+        ttl_secs -= self.margin_secs
+        if ttl_secs <= 0:
+            self._local.pop(object_key, None)
+            return
+        self._local[object_key] = (url, time.monotonic() + ttl_secs)
+        self._local.move_to_end(object_key)
+        while len(self._local) > self.max_entries:
+            self._local.popitem(last=False)
+
+    def clear(self) -> None:
+        self._local.clear()
+
+
+url_cache = PresignedUrlCache(
+    max_entries=settings.PRESIGNED_URL_LOCAL_MAX_ENTRIES,
+    margin_secs=settings.PRESIGNED_URL_LOCAL_MARGIN_SECS,
+)
+
+
+def _signing_window() -> tuple[datetime, int]:
+    """(time urls are signed as of, secs until the next one) of the current
+    time bucket"""
+    now = time.time()
+    start = now - now % settings.S3_PRESIGNED_URL_TIME_BUCKET_SECS
+    return (
+        datetime.fromtimestamp(start, timezone.utc),
+        max(int(start + settings.S3_PRESIGNED_URL_TIME_BUCKET_SECS - now), 1),
+    )
+
+
+def _cache_ttl_secs(ttl_secs: int, valid_until: datetime) -> int:
+    """`ttl_secs`, cut short if the urls stop working before then"""
+    return max(min(ttl_secs, int(valid_until.timestamp() - time.time())), 1)
+
+
 async def get_cached_presigned_obj(
     object_key: str, redis_client: Redis, method: CacheMethod
 ) -> tuple[str, Any]:
@@ -20,32 +87,75 @@ async def get_cached_presigned_obj(
     return cache_key, cached_obj
 
 
-async def generate_presigned_get_url(
-    bucket_name: str, object_key: str, expire_in_secs: int, redis_client: Redis
-) -> str:
-    # cache -> {cache_key: GET url}
-    cache_key = f"{object_key}:GET"
-
-    session = boto3.Session()
-    s3_client = session.client("s3")
-
-    url = s3_client.generate_presigned_url(
-        "get_object",
-        Params={
-            "Bucket": bucket_name,
-            "Key": object_key,
-        },
-        ExpiresIn=expire_in_secs,
-    )
-
-    await redis_client.set(cache_key, url, ex=(expire_in_secs - 2))
-
-    # presigned url
-    return url  # type: ignore
-
-
-def delete_object(bucket_name: str, object_key: str) -> None:
-    session = boto3.Session()
-    s3_client = session.client("s3")
-
-    s3_client.delete_object(Bucket=bucket_name, Key=object_key)
+async def resolve_presigned_get_urls(
+    bucket_name: str,
+    object_keys: Iterable[str | None],
+    expire_in_secs: int,
+    redis_client: Redis,
+) -> dict[str, str]:
+    """Presigned GET urls of many objects, {object_key: url}. Urls cached in
+    process cost nothing, the others are read from Redis in one round trip and
+    the rest are signed and cached in one pipeline"""
+    urls = {}
+    remote_keys = []
+    for object_key in dict.fromkeys(key for key in object_keys if key):
+        url = url_cache.get(object_key)
+        if url is None:
+            remote_keys.append(object_key)
+        else:
+            urls[object_key] = url
+    if not remote_keys:
+        return urls
+
+    # the url with its remaining lifetime, so the local copy dies first
+    async with redis_client.pipeline(transaction=False) as pipe:
+        for object_key in remote_keys:
+            pipe.get(f"{object_key}:{CacheMethod.GET.value}")
+            pipe.pttl(f"{object_key}:{CacheMethod.GET.value}")
+        results = await pipe.execute()
+
+    missing_keys = []
+    for object_key, cached_url, ttl_ms in zip(remote_keys, results[::2], results[1::2]):
+        if cached_url:
+            urls[object_key] = cached_url
+            url_cache.set(object_key, cached_url, ttl_ms / 1000)
+        else:
+            missing_keys.append(object_key)
+
+    if missing_keys:
+        # cached until the next time bucket, when everyone switches urls
+        signed_at, ttl_secs = _signing_window()
+        signed_urls, valid_until = await get_storage().presign_get(
+            bucket_name=bucket_name,
+            object_keys=missing_keys,
+            expire_in_secs=expire_in_secs,
+            signed_at=signed_at,
+        )
+        ttl_secs = _cache_ttl_secs(ttl_secs, valid_until)
+        async with redis_client.pipeline(transaction=False) as pipe:
+            for object_key, url in zip(missing_keys, signed_urls):
+                urls[object_key] = url
+                url_cache.set(object_key, url, ttl_secs)
+                pipe.set(
+                    f"{object_key}:{CacheMethod.GET.value}",
+                    url,
+                    ex=ttl_secs,
+                )
+            await pipe.execute()
+
+    return urls
+
+
+async def delete_object(bucket_name: str, object_key: str, redis_client: Redis) -> None:
+    await enqueue_delete(redis_client, bucket_name=bucket_name, object_key=object_key)
+
+
+async def delete_photo(bucket_name: str, object_key: str, redis_client: Redis) -> None:
+    """Delete a photo and its thumbnails, in the background"""
+    for key in [
+        object_key,
+        *(thumbnail_key(object_key, size) for size in settings.PHOTO_THUMBNAIL_SIZES),
+    ]:
+        await delete_object(
+            bucket_name=bucket_name, object_key=key, redis_client=redis_client
+        )
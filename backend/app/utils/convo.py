@@ -1,16 +1,22 @@
 import hashlib
 
+from typing import Sequence
+
 from redis.asyncio import Redis
-from sqlalchemy import select
+from sqlalchemy import and_, select
 from sqlalchemy.ext.asyncio import AsyncSession
 
-from app.models import Conversation, Translation, Message
-from app.core.config import settings
-from app.utils.aws import (
-    generate_presigned_get_url,
-    get_cached_presigned_obj,
-    CacheMethod,
+from app.models import (
+    Conversation,
+    MessageTranslation,
+    Translation,
+    Message,
+    User,
+    group_member_association,
 )
+from app.core.config import settings
+from app.storage.thumbnails import display_photo_key
+from app.utils.aws import resolve_presigned_get_urls
 
 
 def generate_convo_identifier(user_ids: list[int]) -> str:
@@ -20,16 +26,30 @@ def generate_convo_identifier(user_ids: list[int]) -> str:
     return hash_object.hexdigest()
 
 
+def _convo_photo_key(convo: Conversation, other_user: User | None) -> str | None:
+    """A direct message shows the other member's photo"""
+    if other_user is not None:
+        return display_photo_key(
+            other_user.profile_photo, other_user.profile_photo_thumbnails
+        )
+    return display_photo_key(
+        convo.conversation_photo, convo.conversation_photo_thumbnails
+    )
+
+
 async def convo_name_url_processing(
-    convo: Conversation, curr_user_id: int, redis_client: Redis
+    convo: Conversation,
+    curr_user_id: int,
+    redis_client: Redis,
+    other_user: User | None = None,
+    presigned_urls: dict[str, str] | None = None,
 ) -> None:
-    presigned_url = None
-
     if not convo.is_group_chat:
         # guaranteed to have only 2 members
-        for member in await convo.awaitable_attrs.members:
-            if member.id != curr_user_id:
-                other_user = member
+        if other_user is None:
+            for member in await convo.awaitable_attrs.members:
+                if member.id != curr_user_id:
+                    other_user = member
 
         setattr(
             convo,
@@ -37,37 +57,18 @@ async def convo_name_url_processing(
             f"{other_user.first_name} {other_user.last_name}",  # type: ignore
         )
 
-        obj_key = other_user.profile_photo  # type: ignore
-        if obj_key:
-            _, presigned_url = await get_cached_presigned_obj(
-                object_key=obj_key,
-                redis_client=redis_client,
-                method=CacheMethod.GET,
-            )
-
-            if not presigned_url:
-                presigned_url = await generate_presigned_get_url(
-                    bucket_name=settings.S3_BUCKET_NAME,
-                    object_key=obj_key,
-                    expire_in_secs=settings.S3_PRESIGNED_URL_GET_EXPIRE_SECS,
-                    redis_client=redis_client,
-                )
-    elif convo.conversation_photo:
-        obj_key = convo.conversation_photo
-
-        _, presigned_url = await get_cached_presigned_obj(
-            object_key=obj_key,
-            redis_client=redis_client,
-            method=CacheMethod.GET,
-        )
+    obj_key = _convo_photo_key(convo, other_user)
 
-        if not presigned_url:
-            presigned_url = await generate_presigned_get_url(
+    presigned_url = None
+    if obj_key:
+        if presigned_urls is None:
+            presigned_urls = await resolve_presigned_get_urls(
                 bucket_name=settings.S3_BUCKET_NAME,
-                object_key=obj_key,
+                object_keys=[obj_key],
                 expire_in_secs=settings.S3_PRESIGNED_URL_GET_EXPIRE_SECS,
                 redis_client=redis_client,
             )
+        presigned_url = presigned_urls.get(obj_key)
 
     setattr(
         convo,
@@ -82,10 +83,18 @@ async def convo_latest_msg_processing(
     translation = (
         await db.execute(
             select(
-                Translation.translation,
+                MessageTranslation.translation,
                 Translation.id,
                 Translation.is_read,
-            ).where(
+            )
+            .join(
+                MessageTranslation,
+                and_(
+                    MessageTranslation.message_id == Translation.message_id,
+                    MessageTranslation.language == Translation.language,
+                ),
+            )
+            .where(
                 Translation.message_id == convo.latest_message_id,
                 Translation.target_user_id == curr_user_id,
             )
@@ -114,3 +123,87 @@ async def convo_latest_msg_processing(
         "latest_message",
         convo_latest_msg,
     )
+
+
+async def hydrate_inbox(
+    db: AsyncSession,
+    convos: Sequence[Conversation],
+    curr_user_id: int,
+    redis_client: Redis,
+) -> None:
+    """convo_latest_msg_processing and convo_name_url_processing for a whole
+    page of conversations, in two queries and one Redis round trip however
+    long the page is"""
+    # 1) latest messages with the user's translation and read flag
+    latest_messages = {}
+    latest_message_ids = [
+        convo.latest_message_id for convo in convos if convo.latest_message_id
+    ]
+    if latest_message_ids:
+        rows = await db.execute(
+            select(
+                Message,
+                MessageTranslation.translation,
+                Translation.id,
+                Translation.is_read,
+            )
+            .outerjoin(
+                Translation,
+                and_(
+                    Translation.message_id == Message.id,
+                    Translation.target_user_id == curr_user_id,
+                ),
+            )
+            .outerjoin(
+                MessageTranslation,
+                and_(
+                    MessageTranslation.message_id == Translation.message_id,
+                    MessageTranslation.language == Translation.language,
+                ),
+            )
+            .where(Message.id.in_(latest_message_ids))
+        )
+        for message, translation, translation_id, is_read in rows:
+            if translation_id is not None:
+                setattr(message, "relevant_translation", translation)
+                setattr(message, "translation_id", translation_id)
+                setattr(message, "is_read", is_read)
+            latest_messages[message.id] = message
+
+    # 2) the other member of each direct message, who names it
+    other_users = {}
+    direct_convo_ids = [convo.id for convo in convos if not convo.is_group_chat]
+    if direct_convo_ids:
+        rows = await db.execute(
+            select(group_member_association.c.conversation_id, User)
+            .join(User, User.id == group_member_association.c.user_id)
+            .where(
+                group_member_association.c.conversation_id.in_(direct_convo_ids),
+                group_member_association.c.user_id != curr_user_id,
+            )
+        )
+        other_users = {convo_id: user for convo_id, user in rows}
+
+    # 3) every photo url in one round trip
+    presigned_urls = await resolve_presigned_get_urls(
+        bucket_name=settings.S3_BUCKET_NAME,
+        object_keys=[
+            _convo_photo_key(convo, other_users.get(convo.id)) for convo in convos
+        ],
+        expire_in_secs=settings.S3_PRESIGNED_URL_GET_EXPIRE_SECS,
+        redis_client=redis_client,
+    )
+
+    for convo in convos:
+        if convo.latest_message_id:
+            setattr(
+                convo, "latest_message", latest_messages.get(convo.latest_message_id)
+            )
+
+        await convo_name_url_processing(
+            convo=convo,
+            curr_user_id=curr_user_id,
+            redis_client=redis_client,
+            other_user=other_users.get(convo.id),
+            presigned_urls=presigned_urls,
+        )
@@ -0,0 +1,51 @@
+import base64
+import binascii
+
+from datetime import datetime
+from typing import Any
+
+from app.utils import envelope
+
+# Opaque pagination cursors: the sort key of the last row of a page, which
+# the next page starts after. Clients pass them back untouched
+
+
+def encode_cursor(*key: Any) -> str:
+    values = [
+        value.isoformat() if isinstance(value, datetime) else value for value in key
+    ]
+    return (
+        base64.urlsafe_b64encode(envelope.dumps(values).encode()).decode().rstrip("=")
+    )
+
+
+def decode_cursor(cursor: str) -> list[Any]:
+    """The sort key of a cursor, raises ValueError if it isn't one of ours"""
+    try:
+        key = envelope.loads(
+            base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        )
+    except (binascii.Error, ValueError) as e:
+        raise ValueError("Invalid cursor") from e
+    if not isinstance(key, list):
+        raise ValueError("Invalid cursor")
+    return key
+
+
+def message_cursor_key(cursor: str) -> tuple[datetime, int]:
+    """(sent_at, id) of the message a page of messages ends at"""
+    try:
+        sent_at, message_id = decode_cursor(cursor)
+        return datetime.fromisoformat(sent_at), int(message_id)
+    except (TypeError, ValueError) as e:
+        raise ValueError("Invalid cursor") from e
+
+
+def convo_cursor_key(cursor: str) -> tuple[datetime, int]:
+    """(last_activity_at, id) of the conversation a page of conversations
+    ends at"""
+    try:
+        last_activity_at, convo_id = decode_cursor(cursor)
+        return datetime.fromisoformat(last_activity_at), int(convo_id)
+    except (TypeError, ValueError) as e:
+        raise ValueError("Invalid cursor") from e
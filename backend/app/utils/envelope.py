@@ -0,0 +1,59 @@
+import json
+import re
+
+from typing import Any, Callable
+
+try:
+    import orjson
+
+    def dumps(obj: Any) -> str:
+        # int keys, e.g. members by id, are allowed by the stdlib json too
+        return orjson.dumps(obj, option=orjson.OPT_NON_STR_KEYS).decode()
+
+    loads: Callable[[str | bytes], Any] = orjson.loads
+except ImportError:  # pragma: no cover
+
+    def dumps(obj: Any) -> str:
+        return json.dumps(obj, ensure_ascii=False, separators=(",", ":"))
+
+    loads = json.loads
+
+
+# Frames published to Redis are "<type>\t<websocket frame JSON>". Subscribers
+# route on the type without parsing the JSON and forward the frame untouched
+_ENVELOPE = re.compile(r"([a-z_]+)\t")
+
+
+def frame(type: str, data: Any) -> str:
+    """The JSON websocket frame clients receive"""
+    return dumps({"type": type, "data": data})
+
+
+def pack(type: str, frame: str) -> str:
+    return f"{type}\t{frame}"
+
+
+def envelope(type: str, data: Any) -> str:
+    return pack(type, frame(type, data))
+
+
+def unpack(raw: str) -> tuple[str, str]:
+    """(type, websocket frame) of a published message"""
+    match = _ENVELOPE.match(raw)
+    if match:
+        return match.group(1), raw[match.end() :]
+    # bare JSON frame, e.g. from a worker that's still on the old format
+    return loads(raw)["type"], raw
+
+
+def splice(obj: str, **fields: Any) -> str:
+    """Add `fields` to a serialized JSON object without parsing it again, so a
+    payload shared by many recipients is only serialized once"""
+    # keyword names never need escaping, and ids are by far the common value
+    extra = ",".join(
+        f'"{key}":{value if type(value) is int else dumps(value)}'
+        for key, value in fields.items()
+    )
+    if not extra:
+        return obj
+    return f"{obj[:-1]},{extra}}}" if obj != "{}" else f"{{{extra}}}"
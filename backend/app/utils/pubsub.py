@@ -0,0 +1,153 @@
+import asyncio
+import logging
+
+from contextlib import asynccontextmanager
+from typing import AsyncIterator
+
+from redis.asyncio import Redis
+from redis.asyncio.client import PubSub
+
+# always subscribed so the shared connection never drops out of pubsub mode
+# while no websocket is connected
+_KEEPALIVE_CHANNEL = "__pubsub_dispatcher__"
+
+
+class SubscriberOverflow(Exception):
+    """The subscriber fell too far behind and was cut off"""
+
+
+class Subscriber:
+    """One websocket connection's view of the shared pubsub connection"""
+
+    def __init__(self, max_queued: int) -> None:
+        # (channel, data)
+        self.queue: asyncio.Queue[tuple[str, str]] = asyncio.Queue(max_queued)
+        self.channels: set[str] = set()
+        self.overflowed = False
+
+    async def get(self) -> tuple[str, str]:
+        if self.overflowed:
+            raise SubscriberOverflow()
+        return await self.queue.get()
+
+    def _push(self, channel: str, data: str) -> None:
+        if self.overflowed:
+            return
+        try:
+            self.queue.put_nowait((channel, data))
+        except asyncio.QueueFull:
+            # a slow client must not make the others wait or grow memory
+            # without bound, it gets disconnected and reloads on reconnect
+            self.overflowed = True
+
+
+class PubSubDispatcher:
+    """A single Redis pubsub connection shared by every websocket of a process.
+
+    Channels are subscribed in Redis while at least one subscriber wants them
+    (reference counted). One reader task blocks on the connection and pushes
+    each message into the bounded queue of every subscriber of its channel.
+    """
+
+    def __init__(self, redis_client: Redis, max_queued_per_subscriber: int) -> None:
+        self.redis_client = redis_client
+        self.max_queued_per_subscriber = max_queued_per_subscriber
+        self._subscribers: dict[str, set[Subscriber]] = {}
+        self._pubsub: PubSub | None = None
+        self._reader_task: asyncio.Task[None] | None = None
+        self._lock = asyncio.Lock()
+
+    async def start(self) -> None:
+        self._pubsub = self.redis_client.pubsub()
+        await self._pubsub.subscribe(_KEEPALIVE_CHANNEL)
+        self._reader_task = asyncio.create_task(self._reader())
+
+    async def stop(self) -> None:
+        if self._reader_task is not None:
+            self._reader_task.cancel()
+            try:
+                await self._reader_task
+            except asyncio.CancelledError:
+                pass
+        if self._pubsub is not None:
+            await self._pubsub.aclose()  # type: ignore
+
+    @asynccontextmanager
+    async def connect(self) -> AsyncIterator[Subscriber]:
+        subscriber = Subscriber(self.max_queued_per_subscriber)
+        try:
+            yield subscriber
+        finally:
+            await self.unsubscribe(subscriber, *list(subscriber.channels))
+
+    async def subscribe(self, subscriber: Subscriber, *channels: str) -> None:
+        async with self._lock:
+            new_channels = []
+            for channel in channels:
+                if channel in subscriber.channels:
+                    continue
+                subscriber.channels.add(channel)
+                if channel not in self._subscribers:
+                    self._subscribers[channel] = set()
+                    new_channels.append(channel)
+                self._subscribers[channel].add(subscriber)
+
+            if new_channels:
+                try:
+                    await self._pubsub.subscribe(*new_channels)  # type: ignore
+                except Exception:
+                    # the reader reconnects and subscribes to what's wanted then
+                    logging.error("Error updating shared pubsub", exc_info=True)
+
+    async def unsubscribe(self, subscriber: Subscriber, *channels: str) -> None:
+        async with self._lock:
+            unused_channels = []
+            for channel in channels:
+                if channel not in subscriber.channels:
+                    continue
+                subscriber.channels.discard(channel)
+                self._subscribers[channel].discard(subscriber)
+                if not self._subscribers[channel]:
+                    del self._subscribers[channel]
+                    unused_channels.append(channel)
+
+            if unused_channels:
+                try:
+                    await self._pubsub.unsubscribe(*unused_channels)  # type: ignore
+                except Exception:
+                    # the reader reconnects and subscribes to what's wanted then
+                    logging.error("Error updating shared pubsub", exc_info=True)
+
+    def _dispatch(self, channel: str, data: str) -> None:
+        for subscriber in self._subscribers.get(channel, ()):
+            subscriber._push(channel, data)
+
+    async def _reader(self) -> None:
+        while True:
+            try:
+                message = await self._pubsub.get_message(  # type: ignore
+                    ignore_subscribe_messages=True, timeout=None
+                )
+                if message is not None and message["type"] == "message":
+                    self._dispatch(message["channel"], message["data"])
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                logging.error("Error reading shared pubsub connection", exc_info=True)
+                await asyncio.sleep(1)
+                await self._reconnect()
+
+    async def _reconnect(self) -> None:
+        # messages published while disconnected are lost, as with any pubsub
+        async with self._lock:
+            try:
+                await self._pubsub.aclose()  # type: ignore
+            except Exception:
+                pass
+            self._pubsub = self.redis_client.pubsub()
+            try:
+                await self._pubsub.subscribe(
+                    _KEEPALIVE_CHANNEL, *self._subscribers.keys()
+                )
+            except Exception:
+                logging.error("Error resubscribing shared pubsub", exc_info=True)
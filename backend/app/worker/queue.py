@@ -0,0 +1,248 @@
+import asyncio
+import json
+import logging
+import random
+
+from typing import Any, Awaitable, Callable
+
+from redis.asyncio import Redis
+from redis.exceptions import ResponseError
+
+JobHandler = Callable[[dict[str, Any]], Awaitable[None]]
+# called once a job is given up on, with the job and the error that ended it
+FailureHandler = Callable[[dict[str, Any], BaseException], Awaitable[None]]
+
+
+class JobFailed(Exception):
+    """Raised by a job handler when retrying the job can't help"""
+
+
+class StreamQueue:
+    """At-least-once job queue on a Redis stream read through a consumer group.
+
+    A job is acked only after it succeeded, was re-enqueued for another attempt
+    or was moved to the dead-letter stream, so a worker dying mid-job leaves it
+    pending. Jobs pending for longer than `visibility_timeout_secs` are claimed
+    by the next worker that looks (XAUTOCLAIM) and count as a failed attempt.
+    """
+
+    def __init__(
+        self,
+        *,
+        stream: str,
+        group: str,
+        dead_letter_stream: str,
+        max_attempts: int,
+        visibility_timeout_secs: int,
+        retry_delay_secs: float,
+        maxlen: int,
+    ) -> None:
+        self.stream = stream
+        self.group = group
+        self.dead_letter_stream = dead_letter_stream
+        self.max_attempts = max_attempts
+        self.visibility_timeout_secs = visibility_timeout_secs
+        self.retry_delay_secs = retry_delay_secs
+        self.maxlen = maxlen
+
+    async def ensure_group(self, redis_client: Redis) -> None:
+        try:
+            await redis_client.xgroup_create(
+                self.stream, self.group, id="0", mkstream=True
+            )
+        except ResponseError as e:
+            if "BUSYGROUP" not in str(e):  # already created by another worker
+                raise
+
+    async def enqueue(
+        self, redis_client: Redis, job: dict[str, Any], attempt: int = 1
+    ) -> str:
+        entry_id: str = await redis_client.xadd(
+            self.stream,
+            {"job": json.dumps(job), "attempt": attempt},
+            maxlen=self.maxlen,
+            approximate=True,
+        )
+        return entry_id
+
+    async def _ack(self, redis_client: Redis, entry_id: str) -> None:
+        async with redis_client.pipeline(transaction=True) as pipe:
+            pipe.xack(self.stream, self.group, entry_id)
+            pipe.xdel(self.stream, entry_id)
+            await pipe.execute()
+
+    async def _dead_letter(
+        self,
+        redis_client: Redis,
+        job: dict[str, Any],
+        attempt: int,
+        error: BaseException,
+    ) -> None:
+        await redis_client.xadd(
+            self.dead_letter_stream,
+            {
+                "job": json.dumps(job),
+                "attempt": attempt,
+                "error": f"{type(error).__name__}: {error}",
+            },
+            maxlen=self.maxlen,
+            approximate=True,
+        )
+
+    async def _process(
+        self,
+        redis_client: Redis,
+        entry_id: str,
+        fields: dict[str, str],
+        attempt: int,
+        handler: JobHandler,
+        on_failure: FailureHandler | None,
+    ) -> None:
+        try:
+            job = json.loads(fields["job"])
+        except (KeyError, ValueError):
+            logging.error(f"Dropping malformed job {entry_id} from {self.stream}")
+            await self._ack(redis_client, entry_id)
+            return
+
+        try:
+            await handler(job)
+        except Exception as e:
+            if isinstance(e, JobFailed) or attempt >= self.max_attempts:
+                logging.error(
+                    f"Job {entry_id} failed after {attempt} attempt(s), moving it to {self.dead_letter_stream}",
+                    exc_info=e,
+                )
+                await self._dead_letter(redis_client, job, attempt, e)
+                if on_failure is not None:
+                    try:
+                        await on_failure(job, e)
+                    except Exception:
+                        logging.error("Error in job failure handler", exc_info=True)
+            else:
+                logging.warning(
+                    f"Job {entry_id} failed on attempt {attempt}, retrying",
+                    exc_info=e,
+                )
+                await asyncio.sleep(
+                    random.uniform(0, self.retry_delay_secs * 2**attempt)
+                )
+                await self.enqueue(redis_client, job, attempt + 1)
+
+        await self._ack(redis_client, entry_id)
+
+    async def _claim_stale(
+        self, redis_client: Redis, consumer: str, count: int
+    ) -> list[tuple[str, dict[str, str], int]]:
+        claimed = await redis_client.xautoclaim(
+            self.stream,
+            self.group,
+            consumer,
+            min_idle_time=self.visibility_timeout_secs * 1000,
+            start_id="0-0",
+            count=count,
+        )
+
+        entries = []
+        for entry_id, fields in claimed[1]:
+            if fields is None:  # trimmed from the stream while pending
+                await self._ack(redis_client, entry_id)
+                continue
+            # every earlier delivery of a stale entry died without acking it
+            pending = await redis_client.xpending_range(
+                self.stream, self.group, min=entry_id, max=entry_id, count=1
+            )
+            deliveries = pending[0]["times_delivered"] if pending else 1
+            entries.append(
+                (entry_id, fields, int(fields.get("attempt", 1)) + deliveries - 1)
+            )
+
+        return entries
+
+    async def run(
+        self,
+        redis_client: Redis,
+        *,
+        consumer: str,
+        handler: JobHandler,
+        on_failure: FailureHandler | None = None,
+        concurrency: int = 1,
+        block_ms: int = 5000,
+    ) -> None:
+        """Consume jobs until cancelled, running up to `concurrency` at a time.
+        Jobs in progress when cancelled stay pending and are claimed later."""
+        await self.ensure_group(redis_client)
+
+        loop = asyncio.get_running_loop()
+        slots = asyncio.Semaphore(concurrency)
+        tasks: set[asyncio.Task[None]] = set()
+        in_flight: set[str] = set()
+        last_claim = 0.0
+
+        async def process(entry_id: str, fields: dict[str, str], attempt: int) -> None:
+            try:
+                await self._process(
+                    redis_client, entry_id, fields, attempt, handler, on_failure
+                )
+            except Exception:
+                # left pending, it will be claimed again
+                logging.error(f"Error processing job {entry_id}", exc_info=True)
+            finally:
+                in_flight.discard(entry_id)
+                slots.release()
+
+        try:
+            while True:
+                await slots.acquire()
+                free = 1
+                while not slots.locked() and free < concurrency:
+                    await slots.acquire()
+                    free += 1
+
+                try:
+                    entries: list[tuple[str, dict[str, str], int]] = []
+                    if loop.time() - last_claim >= self.visibility_timeout_secs / 2:
+                        last_claim = loop.time()
+                        entries = [
+                            entry
+                            for entry in await self._claim_stale(
+                                redis_client, consumer, free
+                            )
+                            # still running here, just slow
+                            if entry[0] not in in_flight
+                        ]
+
+                    if not entries:
+                        response = await redis_client.xreadgroup(
+                            self.group,
+                            consumer,
+                            {self.stream: ">"},
+                            count=free,
+                            block=block_ms,
+                        )
+                        for _, stream_entries in response or []:
+                            for entry_id, fields in stream_entries:
+                                entries.append(
+                                    (entry_id, fields, int(fields.get("attempt", 1)))
+                                )
+                except asyncio.CancelledError:
+                    raise
+                except Exception:
+                    logging.error(
+                        f"Error reading jobs from {self.stream}", exc_info=True
+                    )
+                    entries = []
+                    await asyncio.sleep(1)
+
+                for _ in range(free - len(entries)):
+                    slots.release()
+
+                for entry_id, fields, attempt in entries:
+                    in_flight.add(entry_id)
+                    task = asyncio.create_task(process(entry_id, fields, attempt))
+                    tasks.add(task)
+                    task.add_done_callback(tasks.discard)
+        finally:
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
@@ -0,0 +1,119 @@
+import asyncio
+import os
+import socket
+
+from typing import Any
+
+import redis.asyncio as redis
+from redis.asyncio import Redis
+
+from PIL import UnidentifiedImageError
+from sqlalchemy import update
+
+from app.core.config import settings
+from app.models import Conversation, User
+from app.storage import ObjectStorage, get_storage
+from app.storage.thumbnails import generate_thumbnails
+from app.worker.queue import JobFailed, StreamQueue
+
+storage_queue = StreamQueue(
+    stream=settings.STORAGE_QUEUE_STREAM,
+    group=settings.STORAGE_QUEUE_GROUP,
+    dead_letter_stream=settings.STORAGE_QUEUE_DEAD_LETTER_STREAM,
+    max_attempts=settings.STORAGE_JOB_MAX_ATTEMPTS,
+    visibility_timeout_secs=settings.STORAGE_JOB_VISIBILITY_TIMEOUT_SECS,
+    retry_delay_secs=settings.STORAGE_JOB_RETRY_DELAY_SECS,
+    maxlen=settings.STORAGE_QUEUE_MAXLEN,
+)
+
+
+async def enqueue_delete(
+    redis_client: Redis, *, bucket_name: str, object_key: str
+) -> None:
+    """Delete an object in the background, retrying until it's gone"""
+    await storage_queue.enqueue(
+        redis_client,
+        {"action": "delete", "bucket_name": bucket_name, "object_key": object_key},
+    )
+
+
+async def enqueue_thumbnails(
+    redis_client: Redis, *, bucket_name: str, object_key: str
+) -> None:
+    """Make the thumbnails of a newly saved photo in the background"""
+    await storage_queue.enqueue(
+        redis_client,
+        {"action": "thumbnails", "bucket_name": bucket_name, "object_key": object_key},
+    )
+
+
+async def _mark_thumbnails_ready(object_key: str) -> None:
+    # the crud modules enqueue deletes from here, a top level import is circular
+    from app.api.dependencies import get_db
+
+    # only where the photo wasn't replaced in the meantime
+    async for db in get_db():
+        await db.execute(
+            update(User)
+            .where(User.profile_photo == object_key)
+            .values(profile_photo_thumbnails=True)
+        )
+        await db.execute(
+            update(Conversation)
+            .where(Conversation.conversation_photo == object_key)
+            .values(conversation_photo_thumbnails=True)
+        )
+        await db.commit()
+
+
+async def handle_storage_job(storage: ObjectStorage, job: dict[str, Any]) -> None:
+    if job["action"] == "thumbnails":
+        try:
+            await generate_thumbnails(
+                storage,
+                bucket_name=job["bucket_name"],
+                object_key=job["object_key"],
+                sizes=settings.PHOTO_THUMBNAIL_SIZES,
+            )
+        except UnidentifiedImageError as e:
+            # not an image, lists keep showing the original
+            raise JobFailed(f"{job['object_key']} is not an image") from e
+        await _mark_thumbnails_ready(job["object_key"])
+    elif job["action"] == "delete":
+        # deleting a missing object succeeds, retries are safe
+        await storage.delete(
+            bucket_name=job["bucket_name"], object_key=job["object_key"]
+        )
+    else:
+        raise ValueError(f"Unknown storage job action '{job['action']}'")
+
+
+async def run_storage_worker(redis_client: Redis) -> None:
+    storage = get_storage()
+    await storage_queue.run(
+        redis_client,
+        consumer=f"{socket.gethostname()}-{os.getpid()}",
+        handler=lambda job: handle_storage_job(storage, job),
+        concurrency=settings.STORAGE_WORKER_CONCURRENCY,
+    )
+
+
+async def main() -> None:
+    redis_client = redis.Redis(
+        host=settings.REDIS_HOST,
+        port=settings.REDIS_PORT,
+        decode_responses=True,
+        ssl=settings.REDIS_SSL,
+        password=settings.REDIS_PASSWORD,
+    )
+    try:
+        await run_storage_worker(redis_client)
+    finally:
+        await redis_client.aclose()
+
+
+if __name__ == "__main__":
+    from app.logger import setup_logger
+
+    setup_logger()
+    asyncio.run(main())
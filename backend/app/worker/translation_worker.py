@@ -0,0 +1,366 @@
+import asyncio
+import logging
+import os
+import socket
+
+from typing import Any
+
+import redis.asyncio as redis
+from redis.asyncio import Redis
+
+from app import crud, models, schemas
+from app.crud import crud_inbox
+from app import translation
+from app.api.dependencies import get_db
+from app.core.config import settings
+from app.translation.errors import describe_translation_error, is_permanent
+from app.utils import envelope
+from app.utils.aws import resolve_presigned_get_urls
+from app.worker.queue import JobFailed, StreamQueue
+
+translation_queue = StreamQueue(
+    stream=settings.TRANSLATION_QUEUE_STREAM,
+    group=settings.TRANSLATION_QUEUE_GROUP,
+    dead_letter_stream=settings.TRANSLATION_QUEUE_DEAD_LETTER_STREAM,
+    max_attempts=settings.TRANSLATION_JOB_MAX_ATTEMPTS,
+    visibility_timeout_secs=settings.TRANSLATION_JOB_VISIBILITY_TIMEOUT_SECS,
+    retry_delay_secs=settings.TRANSLATION_JOB_RETRY_DELAY_SECS,
+    maxlen=settings.TRANSLATION_QUEUE_MAXLEN,
+)
+
+PUBLISH_MAX_RETRIES = 3
+PUBLISH_RETRY_DELAY_SECS = 2
+
+
+async def enqueue_translation(
+    redis_client: Redis,
+    *,
+    message_id: int,
+    stream_id: str,
+    client_message: dict[str, Any],
+) -> None:
+    """Queue the translation and delivery of a stored message.
+
+    `client_message` is the frame the sender's client sent, recipients get it
+    back with the translated text like before the queue existed.
+    """
+    await translation_queue.enqueue(
+        redis_client,
+        {
+            "message_id": message_id,
+            "stream_id": stream_id,
+            "client_message": client_message,
+        },
+    )
+
+
+async def _publish(redis_client: Redis, frames: list[tuple[str, str]]) -> None:
+    for attempt in range(PUBLISH_MAX_RETRIES):
+        try:
+            async with redis_client.pipeline(transaction=False) as pipe:
+                for channel, frame in frames:
+                    pipe.publish(channel, frame)
+                await pipe.execute()
+            return
+        except Exception:
+            logging.error(
+                f"Error during message publishing, attempt {attempt + 1}",
+                exc_info=True,
+            )
+            await asyncio.sleep(PUBLISH_RETRY_DELAY_SECS)
+
+
+async def _notify_sender(redis_client: Redis, sender_id: int, error: str) -> None:
+    await _publish(redis_client, [(f"{sender_id}", envelope.envelope("error", error))])
+
+
+async def _sender_presigned_url(
+    redis_client: Redis, profile_photo: str | None
+) -> str | None:
+    # Ignore errors bc not being able to get presigned URL
+    # shouldn't cancel sending message
+    try:
+        if profile_photo:
+            return (
+                await resolve_presigned_get_urls(
+                    bucket_name=settings.S3_BUCKET_NAME,
+                    object_keys=[profile_photo],
+                    expire_in_secs=settings.S3_PRESIGNED_URL_GET_EXPIRE_SECS,
+                    redis_client=redis_client,
+                )
+            )[profile_photo]
+    except Exception:
+        logging.error(
+            "Exception in getting presigned object from Redis cache or generating presigned URL",
+            exc_info=True,
+        )
+    return None
+
+
+async def handle_translation_job(redis_client: Redis, job: dict[str, Any]) -> None:
+    message_id = job["message_id"]
+    stream_id = job["stream_id"]
+
+    message: models.Message | None = None
+    sender: models.User | None = None
+
+    # 1) load everything the translation needs, then give the connection back
+    #    to the pool. No DB connection is held while the model runs
+    async for db in get_db():
+        message = await crud.message.get(db=db, id=message_id)
+        if message is None:
+            return  # deleted since it was sent
+
+        if await crud.translation.exists_for_message(db=db, message_id=message_id):
+            return  # redelivered job that already got through
+
+        sender = await crud.user.get(db=db, id=message.sender_id)
+        if sender is None:
+            raise JobFailed(f"Sender of message {message_id} doesn't exist")
+
+        members = await crud.conversation.get_members(
+            db=db, conversation_id=message.conversation_id
+        )
+        # websockets authorize from a cache, it may not have seen the sender
+        # leave the conversation yet
+        if all(member.id != message.sender_id for member in members):
+            raise JobFailed(f"Sender of message {message_id} left the conversation")
+
+        # Previous turns in the sender's language, from the rolling context window
+        chat_history = await translation.context.get_chat_history(
+            db=db,
+            redis_client=redis_client,
+            convo_id=message.conversation_id,
+            language=message.orig_language,
+            before_message_id=message.id,
+        )
+
+    if message is None or sender is None:
+        raise JobFailed(f"Message {message_id} could not be loaded")
+
+    convo_id = message.conversation_id
+    sender_id = message.sender_id
+
+    recipients_by_language: dict[str, list[int]] = {}
+    for member in members:
+        if member.id != sender_id:
+            recipients_by_language.setdefault(member.target_language, []).append(
+                member.id
+            )
+
+    async def publish_delta(language: str, delta: str) -> None:
+        if not recipients_by_language.get(language):
+            return
+
+        # serialized once for every recipient of the language
+        frame = envelope.envelope(
+            "message_delta",
+            {
+                "stream_id": stream_id,
+                "conversation_id": convo_id,
+                "sender_id": sender_id,
+                "language": language,
+                "delta": delta,
+            },
+        )
+        # a lost delta is harmless, the final message frame has the full text
+        try:
+            async with redis_client.pipeline(transaction=False) as pipe:
+                for recipient_id in recipients_by_language[language]:
+                    pipe.publish(f"{recipient_id}", frame)
+                await pipe.execute()
+        except Exception:
+            logging.error("Error publishing message delta", exc_info=True)
+
+    # 2) translate each distinct target language once, all languages concurrently
+    try:
+        translated, failed_translations = await translation.fanout.translate_languages(
+            convo_id=convo_id,
+            sender_id=sender_id,
+            text_input=message.original_text,
+            source_language=message.orig_language,
+            target_languages=(
+                member.target_language
+                for member in members
+                if member.target_language != message.orig_language
+            ),
+            chat_history=chat_history,
+            api_key=sender.api_key,
+            on_delta=(
+                publish_delta if settings.TRANSLATION_STREAMING_ENABLED else None
+            ),
+            redis_client=redis_client,
+            engine=translation.registry.engine_for(
+                convo_id=convo_id, user_id=sender_id
+            ),
+        )
+    except Exception as e:
+        if is_permanent(e):
+            raise JobFailed(str(e)) from e
+        raise
+
+    seen_translations = {message.orig_language: message.original_text, **translated}
+
+    # 3) store the translations in a short transaction of their own
+    async for db in get_db():
+        # each language's text is stored once, recipients only get a read state
+        if not await crud.message_translation.create_many(
+            db=db,
+            objs_in=[
+                schemas.MessageTranslationCreate(
+                    message_id=message_id,
+                    language=language,
+                    translation=seen_translations[language],
+                )
+                for language in {member.target_language for member in members}
+            ],
+        ):
+            # a redelivered job raced the one that got through
+            await db.rollback()
+            return
+        created_translations = await crud.translation.create_many(
+            db=db,
+            objs_in=[
+                schemas.TranslationCreate(
+                    language=member.target_language,
+                    target_user_id=member.id,
+                    message_id=message_id,
+                    is_read=int(member.id == sender_id),
+                )
+                for member in members
+            ],
+        )
+        member_ids_by_text: dict[str, list[int]] = {}
+        for member in members:
+            member_ids_by_text.setdefault(
+                seen_translations[member.target_language], []
+            ).append(member.id)
+        await crud_inbox.record_delivery(
+            db=db,
+            convo_id=convo_id,
+            message_id=message_id,
+            sender_id=sender_id,
+            member_ids_by_text=member_ids_by_text,
+        )
+        await db.commit()
+
+    await translation.context.append_message(
+        redis_client=redis_client,
+        convo_id=convo_id,
+        sender_id=sender_id,
+        texts_by_language=seen_translations,
+    )
+
+    if failed_translations:
+        await _notify_sender(
+            redis_client,
+            sender_id,
+            f"Your message was sent, but it couldn't be translated into {', '.join(lang.title() for lang in failed_translations)}. Members using those languages received your original text.",
+        )
+
+    # 4) deliver to every member but the sender
+    formatted_sent_at = message.sent_at.isoformat() + (
+        "Z" if message.sent_at.utcoffset() is None else ""
+    )
+    new_url = await _sender_presigned_url(redis_client, sender.profile_photo)
+
+    # everything but the recipient's own ids is the same for a language, so it
+    # is serialized once per language and the ids are spliced in per recipient
+    client_message = {
+        key: value
+        for key, value in job["client_message"].items()
+        if key not in ("translation_id", "target_user_id")
+    }
+    shared_by_language = {
+        language: envelope.dumps(
+            {
+                **client_message,
+                "sent_at": formatted_sent_at,
+                "original_text": seen_translations[language],
+                "new_presigned": new_url,
+                "stream_id": stream_id,
+            }
+        )
+        for language in recipients_by_language
+    }
+
+    await _publish(
+        redis_client,
+        [
+            (
+                f"{created.target_user_id}",
+                envelope.pack(
+                    "message",
+                    '{"type":"message","data":'
+                    + envelope.splice(
+                        shared_by_language[created.language],
+                        translation_id=created.id,
+                        target_user_id=created.target_user_id,
+                    )
+                    + "}",
+                ),
+            )
+            for created in created_translations
+            if created.target_user_id != sender_id
+        ],
+    )
+
+
+async def handle_failed_translation(
+    redis_client: Redis, job: dict[str, Any], error: BaseException
+) -> None:
+    """The message can't be delivered, take it back and tell the sender why"""
+    async for db in get_db():
+        message = await crud.message.get(db=db, id=job["message_id"])
+        if message is None:
+            return
+        sender_id = message.sender_id
+
+        await crud.message.retract(db=db, message_id=message.id)
+        await db.commit()
+
+    await _notify_sender(
+        redis_client,
+        sender_id,
+        describe_translation_error(
+            error.__cause__
+            if isinstance(error, JobFailed) and error.__cause__
+            else error
+        ),
+    )
+
+
+async def run_translation_worker(redis_client: Redis) -> None:
+    # model calls made by this worker share the API keys' rate limits in Redis
+    translation.rate_limit.rate_limiter.bind(redis_client)
+    await translation_queue.run(
+        redis_client,
+        consumer=f"{socket.gethostname()}-{os.getpid()}",
+        handler=lambda job: handle_translation_job(redis_client, job),
+        on_failure=lambda job, error: handle_failed_translation(
+            redis_client, job, error
+        ),
+        concurrency=settings.TRANSLATION_WORKER_CONCURRENCY,
+    )
+
+
+async def main() -> None:
+    redis_client = redis.Redis(
+        host=settings.REDIS_HOST,
+        port=settings.REDIS_PORT,
+        decode_responses=True,
+        ssl=settings.REDIS_SSL,
+        password=settings.REDIS_PASSWORD,
+    )
+    try:
+        await run_translation_worker(redis_client)
+    finally:
+        await translation.client_pool.client_pool.aclose()
+        await redis_client.aclose()
+
+
+if __name__ == "__main__":
+    from app.logger import setup_logger
+
+    setup_logger()
+    asyncio.run(main())
@@ -0,0 +1,81 @@
+"""Per-message CPU cost of publishing a translated message to its recipients
+and routing it in the websocket listeners, old format vs envelope.
+
+    cd backend && python scripts/bench_envelope.py [recipients] [languages]
+"""
+
+import json
+import sys
+import timeit
+
+from app.utils import envelope
+
+RECIPIENTS = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+LANGUAGES = int(sys.argv[2]) if len(sys.argv) > 2 else 4
+
+client_message = {
+    "conversation_id": 42,
+    "sender_id": 7,
+    "orig_language": "english",
+    "original_text": "Are we still meeting tomorrow at the usual place? " * 3,
+    "sender_name": "Sam Liang",
+    "is_group_chat": True,
+}
+recipients = [
+    (translation_id, user_id, f"language_{user_id % LANGUAGES}")
+    for translation_id, user_id in enumerate(range(RECIPIENTS), start=1000)
+]
+texts = {f"language_{i}": client_message["original_text"] for i in range(LANGUAGES)}
+
+
+def old_format() -> None:
+    # one json.dumps per recipient, one json.loads per listener
+    for translation_id, user_id, language in recipients:
+        frame = json.dumps(
+            {
+                "type": "message",
+                "data": {
+                    **client_message,
+                    "sent_at": "2024-01-01T00:00:00Z",
+                    "original_text": texts[language],
+                    "translation_id": translation_id,
+                    "target_user_id": user_id,
+                    "new_presigned": None,
+                    "stream_id": "0" * 32,
+                },
+            }
+        )
+        json.loads(frame)["type"]
+
+
+def new_format() -> None:
+    # one serialization per language, ids spliced in, routed on the header
+    shared = {
+        language: envelope.dumps(
+            {
+                **client_message,
+                "sent_at": "2024-01-01T00:00:00Z",
+                "original_text": text,
+                "new_presigned": None,
+                "stream_id": "0" * 32,
+            }
+        )
+        for language, text in texts.items()
+    }
+    for translation_id, user_id, language in recipients:
+        raw = envelope.pack(
+            "message",
+            '{"type":"message","data":'
+            + envelope.splice(
+                shared[language], translation_id=translation_id, target_user_id=user_id
+            )
+            + "}",
+        )
+        envelope.unpack(raw)
+
+
+if __name__ == "__main__":
+    print(f"{RECIPIENTS} recipients, {LANGUAGES} languages, per message:")
+    for name, fn in [("json, per recipient", old_format), ("envelope", new_format)]:
+        runs, total = timeit.Timer(fn).autorange()
+        print(f"  {name:20} {total / runs * 1e6:9.1f} us")